@@ -0,0 +1,32 @@
+"""
+Rebuilds the attendance rollup tables (attendance_daily,
+attendance_department_daily) from the raw attendance logs.
+
+New logs keep the rollups current on their own; run this once after
+upgrading, or after editing attendance rows by hand:
+
+    cd backend && python -m app.backfill_rollups
+"""
+from . import crud, models
+from .database import SessionLocal, engine
+
+
+def main():
+    # Creates the rollup tables on databases that predate them
+    models.Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        print("[INFO] Rebuilding attendance rollups...")
+        daily, departments = crud.rebuild_attendance_rollups(db)
+        print(f"[SUCCESS] {daily} daily user row(s), {departments} department-day row(s).")
+    except Exception as e:
+        db.rollback()
+        print(f"[ERROR] Backfill failed: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,52 @@
-from sqlalchemy.orm import Session
-from . import models, schemas
+from sqlalchemy import select, insert, update, exists, bindparam, and_, or_, func, true, case, text, DateTime
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+from datetime import datetime
+from . import models, schemas, events
+from .cache import TTLCache
+import os
 import pickle
+import threading
 import numpy as np
 
-def get_user(db: Session, user_id: int):
-    return db.query(models.User).filter(models.User.id == user_id).first()
+def get_user(db: Session, user_id: int, for_update: bool = False):
+    query = db.query(models.User).filter(models.User.id == user_id)
+    if for_update:
+        # Row lock until commit/rollback (a no-op on SQLite)
+        query = query.with_for_update()
+    return query.first()
 
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.User).offset(skip).limit(limit).all()
+def get_users(db: Session, skip: int = 0, limit: int = 100, after_id: int = None, include_encodings: bool = False):
+    """
+    One page of users ordered by id. Pass the last id seen as `after_id` for
+    keyset pagination (`skip` is only used without it). Encodings are fetched
+    with one extra IN query for the whole page instead of one per user.
+    """
+    query = db.query(models.User)
+    if include_encodings:
+        query = query.options(selectinload(models.User.encodings))
+    query = query.order_by(models.User.id)
+    if after_id is not None:
+        query = query.filter(models.User.id > after_id)
+    else:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
+def iter_users(db: Session, after_id: int = None, include_encodings: bool = False, batch_size: int = 1000):
+    """
+    Streams all users ordered by id, `batch_size` rows at a time (one IN query
+    per batch for encodings). Yielded objects are not kept by the session, so
+    memory stays flat for any table size.
+    """
+    stmt = select(models.User).order_by(models.User.id)
+    if include_encodings:
+        stmt = stmt.options(selectinload(models.User.encodings))
+    if after_id is not None:
+        stmt = stmt.where(models.User.id > after_id)
+    return db.execute(stmt.execution_options(yield_per=batch_size)).scalars()
 
 
 def create_user(db: Session, user: schemas.UserCreate, encoding_bytes: bytes):
@@ -33,7 +69,10 @@ def create_user(db: Session, user: schemas.UserCreate, encoding_bytes: bytes):
         encoding=encoding_bytes
     )
     db.add(db_encoding)
+    db.flush()
+    _record_encoding_change(db, "add", encoding_id=db_encoding.id, user_id=db_user.id)
     db.commit()
+    _counter_totals.clear()
     
     return db_user
 
@@ -43,21 +82,518 @@ def add_face_to_user(db: Session, user_id: int, encoding_bytes: bytes):
         encoding=encoding_bytes
     )
     db.add(db_encoding)
+    db.flush()
+    _record_encoding_change(db, "add", encoding_id=db_encoding.id, user_id=user_id)
     db.commit()
     return db_encoding
 
-def create_attendance(db: Session, user_id: int, screenshot_path: str = None):
-    db_attendance = models.AttendanceLog(
-        user_id=user_id,
-        screenshot_path=screenshot_path
+def bulk_create_users(db: Session, entries: list):
+    """
+    Inserts many users with one face encoding each in a single transaction.
+    `entries` are (schemas.UserCreate, encoding_bytes) pairs.
+    """
+    db_users = [
+        models.User(
+            name=user.name,
+            department=user.department,
+            email=user.email,
+            roll_number=user.roll_number,
+            role=user.role,
+            profile_image_url=user.profile_image_url
+        )
+        for user, _ in entries
+    ]
+    db.add_all(db_users)
+    db.flush()
+
+    db_encodings = [
+        models.FaceEncoding(user_id=db_user.id, encoding=encoding_bytes)
+        for db_user, (_, encoding_bytes) in zip(db_users, entries)
+    ]
+    db.add_all(db_encodings)
+    db.flush()
+
+    _lock_encoding_feed(db)
+    db.add_all([
+        models.EncodingChange(op="add", encoding_id=db_encoding.id, user_id=db_encoding.user_id)
+        for db_encoding in db_encodings
+    ])
+    db.commit()
+    _counter_totals.clear()
+    return db_users
+
+def update_user(db: Session, user: models.User, name: str = None, department: str = None):
+    """Updates the given fields. Renames go on the change feed so kiosks relabel their gallery."""
+    if name and name != user.name:
+        user.name = name
+        _record_encoding_change(db, "rename", user_id=user.id)
+    if department:
+        user.department = department
+    db.commit()
+    db.refresh(user)
+    return user
+
+def get_existing_identities(db: Session, emails, roll_numbers):
+    """Returns (emails, roll numbers) among the given ones that are already registered."""
+    found_emails, found_rolls = set(), set()
+    if emails:
+        rows = db.query(models.User.email).filter(models.User.email.in_(set(emails))).all()
+        found_emails = {row[0] for row in rows}
+    if roll_numbers:
+        rows = db.query(models.User.roll_number).filter(models.User.roll_number.in_(set(roll_numbers))).all()
+        found_rolls = {row[0] for row in rows}
+    return found_emails, found_rolls
+
+def delete_user(db: Session, user: models.User):
+    # Tombstone every encoding so synced clients drop them from their gallery
+    for face in user.encodings:
+        _record_encoding_change(db, "remove", encoding_id=face.id, user_id=user.id)
+    # The user's daily rows go with the cascade; take them out of department counts
+    # in one UPDATE (a user has at most one daily row per department-day)
+    daily, per_department = models.DailyAttendance, models.DepartmentDailyAttendance
+    db.execute(
+        update(per_department)
+        .where(exists().where(
+            daily.user_id == user.id,
+            daily.department == per_department.department,
+            daily.day == per_department.day
+        ))
+        .values(present=per_department.present - 1)
+        .execution_options(synchronize_session=False)
+    )
+    # Department-days nobody else attended no longer count as working days
+    db.query(models.DepartmentDailyAttendance).filter(models.DepartmentDailyAttendance.present <= 0).delete()
+    db.delete(user)
+    db.commit()
+    _counter_totals.clear()
+
+def reset_all(db: Session):
+    """Deletes all users, encodings and logs. Clients see a single 'reset' change."""
+    db.query(models.DepartmentDailyAttendance).delete()
+    db.query(models.DailyAttendance).delete()
+    db.query(models.AttendanceLog).delete()
+    db.query(models.FaceEncoding).delete()
+    db.query(models.User).delete()
+    _record_encoding_change(db, "reset")
+    db.commit()
+    _counter_totals.clear()
+
+
+# --- Encoding Change Feed ---
+# Arbitrary key for the Postgres advisory lock that orders the feed
+ENCODING_FEED_LOCK = 7304212
+
+def _lock_encoding_feed(db: Session):
+    """
+    Change ids are the sync cursor, so they must become visible in id order.
+    Postgres hands out sequence values at insert time, and a transaction that
+    took id N could commit after one that took N+1, which a client that has
+    already read N+1 would never see. Holding this lock from before the insert
+    until commit makes writers take ids in commit order. (SQLite already
+    serializes writers for the whole transaction.)
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ENCODING_FEED_LOCK})
+
+def _record_encoding_change(db: Session, op: str, encoding_id: int = None, user_id: int = None):
+    _lock_encoding_feed(db)
+    db.add(models.EncodingChange(op=op, encoding_id=encoding_id, user_id=user_id))
+
+def get_encoding_changes(db: Session, since: int = 0, limit: int = 500):
+    """
+    Returns (change, FaceEncoding or None, user name or None) tuples after cursor `since`.
+    'add' changes for encodings that were deleted later come back with no encoding
+    (and 'rename' changes of deleted users with no name); their 'remove'
+    tombstone follows further down the feed.
+    """
+    return (
+        db.query(models.EncodingChange, models.FaceEncoding, models.User.name)
+        .outerjoin(models.FaceEncoding, models.FaceEncoding.id == models.EncodingChange.encoding_id)
+        .outerjoin(models.User, models.User.id == models.EncodingChange.user_id)
+        .filter(models.EncodingChange.id > since)
+        .order_by(models.EncodingChange.id)
+        .limit(limit)
+        .all()
+    )
+
+def get_latest_encoding_cursor(db: Session):
+    latest = db.query(models.EncodingChange.id).order_by(models.EncodingChange.id.desc()).first()
+    return latest[0] if latest else 0
+
+def create_attendance(db: Session, user_id: int, screenshot_path: str = None, timestamp=None, device_id: str = None):
+    return _commit_attendance(db, [{
+        "user_id": user_id,
+        "screenshot_path": screenshot_path,
+        "timestamp": timestamp or datetime.utcnow(),
+        "device_id": device_id
+    }])[0]
+
+def create_attendance_batch(db: Session, events: list):
+    """
+    Bulk insert of attendance rows in one INSERT statement and one commit.
+    `events` are dicts with user_id, timestamp and (optionally) device_id.
+    """
+    return _commit_attendance(db, [
+        {"user_id": event["user_id"], "timestamp": event["timestamp"], "device_id": event.get("device_id")}
+        for event in events
+    ])
+
+def _commit_attendance(db: Session, rows: list):
+    """
+    Inserts log rows (one multi-row INSERT ... RETURNING id) and updates the
+    rollups in the same transaction. Returns the new logs as schemas.Attendance,
+    built before the commit, so reading them back costs no refresh query.
+    """
+    table = models.AttendanceLog.__table__
+    for attempt in range(2):
+        # Each attempt inserts afresh (keys from a rolled-back one may be taken by now).
+        # One statement numbers its rows in VALUES order, so sorted ids line up with `rows`
+        # (sort_by_parameter_order would make SQLite fall back to one INSERT per row)
+        ids = sorted(db.execute(insert(table).returning(table.c.id), rows).scalars().all())
+        logs = [schemas.Attendance(id=log_id, **row) for log_id, row in zip(ids, rows)]
+        _apply_attendance_rollups(db, logs)
+        try:
+            db.commit()
+            break
+        except IntegrityError:
+            # A concurrent request created the same rollup row first; re-read and retry once
+            db.rollback()
+            if attempt:
+                raise
+    _count_new_logs(len(logs))
+    _publish_attendance(db, logs)
+    return logs
+
+def _publish_attendance(db: Session, db_logs: list):
+    """Pushes committed logs (with their user, as the dashboards join it) to open event streams."""
+    if not events.broker.has_subscribers or not db_logs:
+        return
+    users = {
+        row.id: {"name": row.name, "department": row.department, "role": row.role.value, "profile_image_url": row.profile_image_url}
+        for row in db.query(models.User.id, models.User.name, models.User.department, models.User.role, models.User.profile_image_url)
+        .filter(models.User.id.in_({log.user_id for log in db_logs}))
+    }
+    logs = []
+    for log in db_logs:
+        data = log.model_dump(mode="json")
+        data["users"] = users.get(log.user_id)
+        logs.append(data)
+    events.broker.publish({"type": "attendance.created", "logs": logs, "counters": get_live_counters(db)})
+
+# Campus-wide totals for the live counters. Reloaded every COUNTER_TOTALS_SECONDS
+# (other workers' writes show up then) and bumped by this process's own commits.
+COUNTER_TOTALS_SECONDS = int(os.environ.get("COUNTER_TOTALS_SECONDS", "60"))
+_counter_totals = TTLCache(maxsize=1, ttl=COUNTER_TOTALS_SECONDS)
+_counter_totals_lock = threading.Lock()
+
+def _campus_totals(db: Session):
+    totals = _counter_totals.get("campus")
+    if totals is None:
+        totals = {
+            "logs": db.query(func.coalesce(func.sum(models.DailyAttendance.events), 0)).scalar(),
+            "users": db.query(func.count(models.User.id)).scalar()
+        }
+        _counter_totals.set("campus", totals)
+    return totals
+
+def _count_new_logs(count: int):
+    with _counter_totals_lock:
+        totals = _counter_totals.get("campus")
+        if totals is not None:
+            totals["logs"] += count # In place, so the entry still expires on schedule
+
+def get_live_counters(db: Session, day=None, user_id: int = None):
+    """
+    Dashboard counters read from the rollups (no count over the attendance table).
+    Today's figures sum only today's rollup rows; the all-time totals are cached.
+    With `user_id`, only that user's attendance is counted and the user total is left out.
+    """
+    day = day or datetime.utcnow().date()
+    if user_id is not None:
+        today = models.DailyAttendance.day == day
+        present, events_today, logs = db.query(
+            func.coalesce(func.sum(case((today, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((today, models.DailyAttendance.events), else_=0)), 0),
+            func.coalesce(func.sum(models.DailyAttendance.events), 0)
+        ).filter(models.DailyAttendance.user_id == user_id).one()
+        return {"day": day.isoformat(), "logs": logs, "present_today": present, "events_today": events_today}
+
+    present, events_today = db.query(
+        func.count(models.DailyAttendance.id),
+        func.coalesce(func.sum(models.DailyAttendance.events), 0)
+    ).filter(models.DailyAttendance.day == day).one()
+    totals = _campus_totals(db)
+    return {
+        "day": day.isoformat(),
+        "logs": totals["logs"],
+        "present_today": present,
+        "events_today": events_today,
+        "users": totals["users"]
+    }
+
+
+# --- Attendance Rollups ---
+def _apply_attendance_rollups(db: Session, db_logs: list):
+    """
+    Folds new logs into attendance_daily / attendance_department_daily with
+    one read per table, however many logs there are. New rows are inserted and
+    existing rows bumped with SQL-side increments (one executemany each per
+    table), so concurrent requests never overwrite each other's counts; two
+    requests creating the same row hit the unique constraint and
+    _commit_attendance retries.
+    """
+    # 1. Aggregate the new logs per (user, day)
+    per_day = {}
+    for log in db_logs:
+        key = (log.user_id, log.timestamp.date())
+        first, last, count = per_day.get(key, (log.timestamp, log.timestamp, 0))
+        per_day[key] = (min(first, log.timestamp), max(last, log.timestamp), count + 1)
+
+    user_ids = {user_id for user_id, _ in per_day}
+    days = {day for _, day in per_day}
+    departments = dict(db.query(models.User.id, models.User.department).filter(models.User.id.in_(user_ids)).all())
+    existing = set(
+        db.query(models.DailyAttendance.user_id, models.DailyAttendance.day).filter(
+            models.DailyAttendance.user_id.in_(user_ids),
+            models.DailyAttendance.day.in_(days)
+        ).all()
     )
-    db.add(db_attendance)
+
+    # 2. Update or create the daily rows; count users new to a department-day
+    created, updates, newly_present = [], [], {}
+    for (user_id, day), (first, last, count) in per_day.items():
+        if (user_id, day) in existing:
+            updates.append({"b_user_id": user_id, "b_day": day, "b_first": first, "b_last": last, "b_count": count})
+            continue
+        department = departments.get(user_id)
+        created.append({
+            "user_id": user_id, "day": day, "department": department,
+            "first_seen": first, "last_seen": last, "events": count
+        })
+        if department is not None:
+            newly_present[(department, day)] = newly_present.get((department, day), 0) + 1
+
+    if created:
+        db.execute(insert(models.DailyAttendance), created)
+
+    if updates:
+        daily = models.DailyAttendance.__table__
+        first, last = bindparam("b_first", type_=DateTime), bindparam("b_last", type_=DateTime)
+        db.execute(
+            update(daily)
+            .where(daily.c.user_id == bindparam("b_user_id"), daily.c.day == bindparam("b_day"))
+            .values(
+                first_seen=case((daily.c.first_seen > first, first), else_=daily.c.first_seen),
+                last_seen=case((daily.c.last_seen < last, last), else_=daily.c.last_seen),
+                events=daily.c.events + bindparam("b_count")
+            ),
+            updates
+        )
+
+    if not newly_present:
+        return
+
+    # 3. Bump the department counters
+    existing = set(
+        db.query(models.DepartmentDailyAttendance.department, models.DepartmentDailyAttendance.day).filter(
+            models.DepartmentDailyAttendance.department.in_({d for d, _ in newly_present}),
+            models.DepartmentDailyAttendance.day.in_({day for _, day in newly_present})
+        ).all()
+    )
+    created, updates = [], []
+    for (department, day), count in newly_present.items():
+        if (department, day) in existing:
+            updates.append({"b_department": department, "b_day": day, "b_count": count})
+        else:
+            created.append({"department": department, "day": day, "present": count})
+
+    if created:
+        db.execute(insert(models.DepartmentDailyAttendance), created)
+
+    if updates:
+        per_department = models.DepartmentDailyAttendance.__table__
+        db.execute(
+            update(per_department)
+            .where(per_department.c.department == bindparam("b_department"), per_department.c.day == bindparam("b_day"))
+            .values(present=per_department.c.present + bindparam("b_count")),
+            updates
+        )
+
+def rebuild_attendance_rollups(db: Session):
+    """Recomputes both rollup tables from the raw logs. Returns (daily rows, department rows)."""
+    db.query(models.DepartmentDailyAttendance).delete()
+    db.query(models.DailyAttendance).delete()
+
+    day = func.date(models.AttendanceLog.timestamp)
+    daily = (
+        select(
+            models.AttendanceLog.user_id,
+            day,
+            models.User.department,
+            func.min(models.AttendanceLog.timestamp),
+            func.max(models.AttendanceLog.timestamp),
+            func.count(models.AttendanceLog.id)
+        )
+        .join(models.User, models.User.id == models.AttendanceLog.user_id)
+        .group_by(models.AttendanceLog.user_id, day, models.User.department)
+    )
+    db.execute(models.DailyAttendance.__table__.insert().from_select(
+        ["user_id", "day", "department", "first_seen", "last_seen", "events"], daily
+    ))
+
+    per_department = (
+        select(models.DailyAttendance.department, models.DailyAttendance.day, func.count(models.DailyAttendance.id))
+        .filter(models.DailyAttendance.department.isnot(None))
+        .group_by(models.DailyAttendance.department, models.DailyAttendance.day)
+    )
+    db.execute(models.DepartmentDailyAttendance.__table__.insert().from_select(
+        ["department", "day", "present"], per_department
+    ))
     db.commit()
-    db.refresh(db_attendance)
-    return db_attendance
+    _counter_totals.clear()
+    return db.query(models.DailyAttendance).count(), db.query(models.DepartmentDailyAttendance).count()
+
+def _in_range(column, start, end):
+    conditions = []
+    if start is not None:
+        conditions.append(column >= start)
+    if end is not None:
+        conditions.append(column <= end)
+    return and_(*conditions) if conditions else true()
+
+def count_department_days(db: Session, department: str = None, start=None, end=None):
+    """Days on which attendance was taken: for one department, or for any if None."""
+    query = db.query(func.count(func.distinct(models.DepartmentDailyAttendance.day)))
+    if department is not None:
+        query = query.filter(models.DepartmentDailyAttendance.department == department)
+    return query.filter(_in_range(models.DepartmentDailyAttendance.day, start, end)).scalar() or 0
+
+def get_user_daily_attendance(db: Session, user_id: int, start=None, end=None):
+    return (
+        db.query(models.DailyAttendance)
+        .filter(models.DailyAttendance.user_id == user_id, _in_range(models.DailyAttendance.day, start, end))
+        .order_by(models.DailyAttendance.day)
+        .all()
+    )
 
-def get_attendance_logs(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.AttendanceLog).offset(skip).limit(limit).all()
+def get_department_daily_counts(db: Session, department: str = None, start=None, end=None):
+    """Returns (DepartmentDailyAttendance rows, {department: enrolled users})."""
+    query = db.query(models.DepartmentDailyAttendance).filter(_in_range(models.DepartmentDailyAttendance.day, start, end))
+    enrolled = db.query(models.User.department, func.count(models.User.id)).filter(models.User.department.isnot(None))
+    if department is not None:
+        query = query.filter(models.DepartmentDailyAttendance.department == department)
+        enrolled = enrolled.filter(models.User.department == department)
+    rows = query.order_by(models.DepartmentDailyAttendance.day, models.DepartmentDailyAttendance.department).all()
+    return rows, dict(enrolled.group_by(models.User.department).all())
+
+def get_department_student_days(db: Session, department: str, start=None, end=None):
+    """(User, days present) for every user in `department`, including those never present."""
+    days_present = func.count(models.DailyAttendance.id)
+    return (
+        db.query(models.User, days_present)
+        .outerjoin(models.DailyAttendance, and_(
+            models.DailyAttendance.user_id == models.User.id,
+            _in_range(models.DailyAttendance.day, start, end)
+        ))
+        .filter(models.User.department == department)
+        .group_by(models.User.id)
+        .order_by(models.User.roll_number, models.User.name)
+        .all()
+    )
+
+def get_existing_user_ids(db: Session, user_ids, for_update: bool = False):
+    """
+    Returns the subset of `user_ids` that exist, in one query. With `for_update`
+    their rows stay locked until commit/rollback, taken in id order so that
+    overlapping batches cannot deadlock.
+    """
+    if not user_ids:
+        return set()
+    query = db.query(models.User.id).filter(models.User.id.in_(set(user_ids)))
+    if for_update:
+        query = query.order_by(models.User.id).with_for_update()
+    return {row[0] for row in query.all()}
+
+def set_screenshot_path(db: Session, log_ids, url: str, thumbnail_url: str = None):
+    db.query(models.AttendanceLog).filter(models.AttendanceLog.id.in_(list(log_ids))).update(
+        {models.AttendanceLog.screenshot_path: url, models.AttendanceLog.thumbnail_path: thumbnail_url},
+        synchronize_session=False
+    )
+    db.commit()
+
+    if events.broker.has_subscribers:
+        rows = db.query(models.AttendanceLog.id, models.AttendanceLog.user_id).filter(models.AttendanceLog.id.in_(list(log_ids)))
+        events.broker.publish({
+            "type": "attendance.evidence",
+            "logs": [
+                {"id": row.id, "user_id": row.user_id, "screenshot_path": url, "thumbnail_path": thumbnail_url}
+                for row in rows
+            ]
+        })
+
+def set_profile_image_url(db: Session, user_id: int, url: str):
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {models.User.profile_image_url: url}, synchronize_session=False
+    )
+    db.commit()
+
+def get_attendance_log(db: Session, log_id: int):
+    return db.query(models.AttendanceLog).filter(models.AttendanceLog.id == log_id).first()
+
+def get_attendance_in_window(db: Session, user_ids, start: datetime, end: datetime):
+    """Logs of `user_ids` with start <= timestamp <= end, in one (user_id, timestamp) index scan."""
+    return (
+        db.query(models.AttendanceLog)
+        .filter(
+            models.AttendanceLog.user_id.in_(set(user_ids)),
+            models.AttendanceLog.timestamp >= start,
+            models.AttendanceLog.timestamp <= end
+        )
+        .order_by(models.AttendanceLog.timestamp)
+        .all()
+    )
+
+def get_attendance_logs(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    start: datetime = None,
+    end: datetime = None,
+    user_id: int = None,
+    department: str = None,
+    status: str = None,
+    device_id: str = None,
+    before: tuple = None
+):
+    """
+    Attendance logs, newest first, filtered by time range [start, end), user,
+    department, status and device. `before` is a (timestamp, id) keyset cursor:
+    the last row of the previous page (`skip` is only used without it).
+    """
+    query = db.query(models.AttendanceLog)
+    if department is not None:
+        query = query.join(models.User, models.User.id == models.AttendanceLog.user_id).filter(models.User.department == department)
+    if user_id is not None:
+        query = query.filter(models.AttendanceLog.user_id == user_id)
+    if start is not None:
+        query = query.filter(models.AttendanceLog.timestamp >= start)
+    if end is not None:
+        query = query.filter(models.AttendanceLog.timestamp < end)
+    if status is not None:
+        query = query.filter(models.AttendanceLog.status == status)
+    if device_id is not None:
+        query = query.filter(models.AttendanceLog.device_id == device_id)
+
+    query = query.order_by(models.AttendanceLog.timestamp.desc(), models.AttendanceLog.id.desc())
+    if before is not None:
+        before_ts, before_id = before
+        query = query.filter(or_(
+            models.AttendanceLog.timestamp < before_ts,
+            and_(models.AttendanceLog.timestamp == before_ts, models.AttendanceLog.id < before_id)
+        ))
+    else:
+        query = query.offset(skip)
+    return query.limit(limit).all()
 
 
 # --- Announcement CRUD ---
@@ -0,0 +1,71 @@
+"""
+Storage/transport format for face encodings.
+
+An encoding is stored as 128 little-endian float32 values (512 bytes, no
+framing), so it can be read back with np.frombuffer instead of unpickled.
+Rows written before this format are pickled float64 arrays; they are still
+readable here (numpy types only) until the migration converts them.
+
+No relative imports: the migration script loads this module directly.
+"""
+import io
+import pickle
+
+import numpy as np
+
+ENCODING_DIM = 128
+ENCODING_DTYPE = np.dtype("<f4")
+ENCODING_NBYTES = ENCODING_DIM * ENCODING_DTYPE.itemsize # 512
+
+# Record layout of GET /encodings/export; clients read it with np.frombuffer
+EXPORT_DTYPE = np.dtype([
+    ("id", "<i8"),
+    ("user_id", "<i8"),
+    ("encoding", ENCODING_DTYPE, (ENCODING_DIM,)),
+])
+
+
+def encode(encoding) -> bytes:
+    """Serializes a 128-d encoding to the raw float32 format."""
+    vec = np.asarray(encoding, dtype=ENCODING_DTYPE)
+    if vec.shape != (ENCODING_DIM,):
+        raise ValueError(f"Expected a {ENCODING_DIM}-d encoding, got shape {vec.shape}")
+    return vec.tobytes()
+
+
+def is_legacy(data: bytes) -> bool:
+    return len(data) != ENCODING_NBYTES
+
+
+def decode(data) -> np.ndarray:
+    """Reads an encoding in either format as a float32 array."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    if not is_legacy(data):
+        return np.frombuffer(data, dtype=ENCODING_DTYPE)
+    return np.asarray(_LegacyUnpickler(io.BytesIO(data)).load(), dtype=ENCODING_DTYPE).reshape(ENCODING_DIM)
+
+
+def to_raw(data) -> bytes:
+    """Returns stored encoding bytes in the raw float32 format, converting legacy rows."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    if not is_legacy(data):
+        return bytes(data)
+    return encode(decode(data))
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    """Only lets legacy rows rebuild numpy arrays, nothing else."""
+
+    _ALLOWED = {
+        ("numpy", "ndarray"),
+        ("numpy", "dtype"),
+        ("numpy.core.multiarray", "_reconstruct"),
+        ("numpy._core.multiarray", "_reconstruct"),
+    }
+
+    def find_class(self, module, name):
+        if (module, name) not in self._ALLOWED:
+            raise pickle.UnpicklingError(f"Refusing to load {module}.{name} from an encoding")
+        return super().find_class(module, name)
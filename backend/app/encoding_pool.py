@@ -0,0 +1,87 @@
+"""
+Process pool for CPU-bound face encoding.
+
+dlib detection + encoding takes hundreds of ms per image and holds the GIL,
+so running it inside an `async def` handler freezes the whole event loop.
+Handlers instead `await encoding_pool.encode(image_bytes)`; each worker
+process loads the dlib models once at start-up and keeps them warm.
+When more than `queue_limit` images are waiting, `PoolOverloaded` is raised
+so the API can answer 503 instead of queueing without bound.
+
+This module must stay importable on its own (no app imports): spawned
+workers re-import it.
+"""
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+ENCODING_WORKERS = int(os.environ.get("ENCODING_WORKERS", os.cpu_count() or 1))
+ENCODING_QUEUE_LIMIT = int(os.environ.get("ENCODING_QUEUE_LIMIT", ENCODING_WORKERS * 4))
+
+
+class PoolOverloaded(Exception):
+    pass
+
+
+class UnreadableImage(Exception):
+    pass
+
+
+def _warm_worker():
+    # Importing face_recognition loads the dlib models; one tiny call finishes warm-up
+    import face_recognition
+    face_recognition.face_locations(np.zeros((8, 8, 3), dtype=np.uint8))
+
+
+def encode_image(image_bytes: bytes):
+    """Decodes an image and returns all 128-d encodings found in it (runs in a worker)."""
+    import face_recognition
+    try:
+        image = face_recognition.load_image_file(io.BytesIO(image_bytes))
+    except Exception as e:
+        raise UnreadableImage(str(e))
+    return face_recognition.face_encodings(image)
+
+
+class EncodingPool:
+    def __init__(self, workers: int = ENCODING_WORKERS, queue_limit: int = ENCODING_QUEUE_LIMIT):
+        self.workers = max(1, workers)
+        self.queue_limit = max(1, queue_limit)
+        self.in_flight = 0
+        self._executor = None
+
+    def _get_executor(self):
+        # Started lazily so importing the app (tests, scripts) doesn't spawn processes
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+            )
+        return self._executor
+
+    async def run(self, fn, *args):
+        """Runs `fn(*args)` in a worker, enforcing the queue-depth limit."""
+        if self.in_flight >= self.queue_limit:
+            raise PoolOverloaded(f"{self.in_flight} encoding jobs already queued")
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.in_flight -= 1
+
+    async def encode(self, image_bytes: bytes):
+        return await self.run(encode_image, image_bytes)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+encoding_pool = EncodingPool()
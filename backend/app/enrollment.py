@@ -0,0 +1,259 @@
+"""
+Bulk enrollment jobs: a CSV roster plus photos (ZIP and/or loose files).
+
+Rows are encoded in parallel through the encoding process pool and written
+in chunks with one bulk insert per chunk. Job state lives in memory of the
+API process, so status is only visible from the worker that accepted the job.
+"""
+import asyncio
+import csv
+import io
+import os
+import uuid
+import zipfile
+from collections import OrderedDict
+from datetime import datetime
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from . import crud, models, schemas, encoding_format
+from .encoding_pool import encoding_pool, PoolOverloaded, UnreadableImage
+from .gallery import face_gallery
+
+INSERT_CHUNK_SIZE = 100
+MAX_TRACKED_JOBS = 50
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Upload limits. A photo has the same cap as a single enrollment upload; the
+# total bounds the loose files plus the archive, both as uploaded and unpacked.
+MAX_PHOTO_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 10 * 1024 * 1024))
+MAX_ROSTER_BYTES = int(os.environ.get("MAX_ROSTER_BYTES", 5 * 1024 * 1024))
+MAX_ENROLLMENT_BYTES = int(os.environ.get("MAX_ENROLLMENT_BYTES", 1024 * 1024 * 1024))
+MAX_ARCHIVE_ENTRIES = int(os.environ.get("MAX_ARCHIVE_ENTRIES", 10000))
+
+
+class PhotoTooLarge(Exception):
+    pass
+
+
+class EnrollmentJob:
+    def __init__(self, total: int):
+        self.id = uuid.uuid4().hex
+        self.status = "queued" # queued -> running -> completed / failed
+        self.total = total
+        self.processed = 0
+        self.succeeded = 0
+        self.errors = []
+        self.created_at = datetime.utcnow()
+        self.finished_at = None
+
+    def fail_row(self, row: int, entry: dict, detail: str):
+        self.errors.append({
+            "row": row,
+            "roll_number": entry.get("roll_number"),
+            "email": entry.get("email"),
+            "detail": detail
+        })
+        self.processed += 1
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "processed": self.processed,
+            "succeeded": self.succeeded,
+            "failed": len(self.errors),
+            "errors": self.errors,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+# job_id -> EnrollmentJob, oldest first
+_jobs = OrderedDict()
+
+def register_job(job: EnrollmentJob):
+    _jobs[job.id] = job
+    while len(_jobs) > MAX_TRACKED_JOBS:
+        _jobs.popitem(last=False)
+
+def get_job(job_id: str):
+    return _jobs.get(job_id)
+
+
+# --- Input parsing ---
+def parse_roster(data: bytes):
+    """
+    Reads the roster CSV. Columns: name (required), email, roll_number,
+    department, role, photo (file name; defaults to <roll_number>.<ext>).
+    """
+    text = data.decode("utf-8-sig")
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or "name" not in [f.strip().lower() for f in reader.fieldnames]:
+        raise ValueError("Roster CSV must have a header row with at least a 'name' column")
+
+    rows = []
+    for raw in reader:
+        entry = {(k or "").strip().lower(): (v or "").strip() for k, v in raw.items()}
+        rows.append({k: (v or None) for k, v in entry.items()})
+    return rows
+
+
+class PhotoSource:
+    """
+    Looks up roster photos by file name in a ZIP (read lazily) and/or loose uploads.
+    Raises ValueError for an archive with more than MAX_ARCHIVE_ENTRIES entries
+    or that would unpack to more than `max_unpacked_bytes`.
+    """
+
+    def __init__(self, archive_path: str = None, files: dict = None, max_unpacked_bytes: int = MAX_ENROLLMENT_BYTES):
+        self.archive_path = archive_path
+        self.files = {os.path.basename(k).lower(): v for k, v in (files or {}).items()}
+        self._zip = zipfile.ZipFile(archive_path) if archive_path else None
+        self._zip_names = {}
+        if self._zip:
+            infos = self._zip.infolist()
+            if len(infos) > MAX_ARCHIVE_ENTRIES:
+                self.close()
+                raise ValueError(f"Archive has more than {MAX_ARCHIVE_ENTRIES} entries")
+            if sum(info.file_size for info in infos) > max_unpacked_bytes:
+                self.close()
+                raise ValueError(f"Archive unpacks to more than {max_unpacked_bytes // (1024 * 1024)} MB")
+            for info in infos:
+                if not info.is_dir():
+                    self._zip_names[os.path.basename(info.filename).lower()] = info
+
+    def find(self, entry: dict):
+        candidates = []
+        if entry.get("photo"):
+            candidates.append(os.path.basename(entry["photo"]).lower())
+        elif entry.get("roll_number"):
+            candidates.extend(f"{entry['roll_number']}{ext}".lower() for ext in PHOTO_EXTENSIONS)
+
+        for name in candidates:
+            if name in self.files:
+                return self.files[name]
+            if name in self._zip_names:
+                return self._read_entry(self._zip_names[name])
+        return None
+
+    def _read_entry(self, info: zipfile.ZipInfo):
+        # Check the declared size first, then never read past the cap in case it lies
+        if info.file_size > MAX_PHOTO_BYTES:
+            raise PhotoTooLarge()
+        with self._zip.open(info) as f:
+            data = f.read(MAX_PHOTO_BYTES + 1)
+        if len(data) > MAX_PHOTO_BYTES:
+            raise PhotoTooLarge()
+        return data
+
+    def close(self):
+        if self._zip:
+            self._zip.close()
+        if self.archive_path and os.path.exists(self.archive_path):
+            os.remove(self.archive_path)
+
+
+# --- Processing ---
+def _validate_rows(db: Session, job: EnrollmentJob, rows: list):
+    """Role, required fields and uniqueness (within the roster and against the DB)."""
+    existing_emails, existing_rolls = crud.get_existing_identities(
+        db,
+        emails=[r["email"] for r in rows if r.get("email")],
+        roll_numbers=[r["roll_number"] for r in rows if r.get("roll_number")]
+    )
+
+    valid = []
+    for i, entry in enumerate(rows, start=1):
+        if not entry.get("name"):
+            job.fail_row(i, entry, "Missing name")
+            continue
+        try:
+            entry["role"] = models.UserRole(entry.get("role") or "student")
+        except ValueError:
+            job.fail_row(i, entry, f"Invalid role '{entry.get('role')}'")
+            continue
+        if entry.get("email") and entry["email"] in existing_emails:
+            job.fail_row(i, entry, "Email already registered")
+            continue
+        if entry.get("roll_number") and entry["roll_number"] in existing_rolls:
+            job.fail_row(i, entry, "Roll number already registered")
+            continue
+        if entry.get("email"):
+            existing_emails.add(entry["email"])
+        if entry.get("roll_number"):
+            existing_rolls.add(entry["roll_number"])
+        valid.append((i, entry))
+    return valid
+
+
+async def _encode_row(photos: PhotoSource, entry: dict, limiter: asyncio.Semaphore):
+    """Returns (encoding_bytes, None) or (None, error detail)."""
+    try:
+        image_bytes = await run_in_threadpool(photos.find, entry)
+    except PhotoTooLarge:
+        return None, f"Photo larger than {MAX_PHOTO_BYTES // (1024 * 1024)} MB"
+    if image_bytes is None:
+        return None, "Photo not found"
+
+    async with limiter:
+        while True:
+            try:
+                encodings = await encoding_pool.encode(image_bytes)
+                break
+            except PoolOverloaded:
+                # Interactive enrollments share the pool; wait for room
+                await asyncio.sleep(0.5)
+            except UnreadableImage:
+                return None, "Could not read photo"
+
+    if len(encodings) == 0:
+        return None, "No face found in photo"
+    if len(encodings) > 1:
+        return None, "Multiple faces found in photo"
+    return encoding_format.encode(encodings[0]), None
+
+
+async def run_job(job: EnrollmentJob, session_factory, rows: list, photos: PhotoSource):
+    job.status = "running"
+    db = session_factory()
+    try:
+        valid = await run_in_threadpool(_validate_rows, db, job, rows)
+        # Leave room in the pool's queue for interactive requests
+        limiter = asyncio.Semaphore(max(1, min(encoding_pool.workers * 2, encoding_pool.queue_limit - 1)))
+
+        for start in range(0, len(valid), INSERT_CHUNK_SIZE):
+            chunk = valid[start:start + INSERT_CHUNK_SIZE]
+            results = await asyncio.gather(*[_encode_row(photos, entry, limiter) for _, entry in chunk])
+
+            to_insert = []
+            for (row, entry), (encoding_bytes, error) in zip(chunk, results):
+                if error:
+                    job.fail_row(row, entry, error)
+                    continue
+                user = schemas.UserCreate(
+                    name=entry["name"],
+                    email=entry.get("email"),
+                    department=entry.get("department"),
+                    roll_number=entry.get("roll_number"),
+                    role=entry["role"]
+                )
+                to_insert.append((user, encoding_bytes))
+
+            if to_insert:
+                await run_in_threadpool(crud.bulk_create_users, db, to_insert)
+                face_gallery.invalidate()
+                job.succeeded += len(to_insert)
+                job.processed += len(to_insert)
+
+        job.status = "completed"
+    except Exception as e:
+        await run_in_threadpool(db.rollback)
+        job.status = "failed"
+        job.errors.append({"row": 0, "roll_number": None, "email": None, "detail": f"Job aborted: {e}"})
+    finally:
+        job.finished_at = datetime.utcnow()
+        photos.close()
+        db.close()
@@ -0,0 +1,86 @@
+"""
+In-process pub/sub for live dashboards (GET /events/attendance).
+
+crud publishes after each attendance commit; every open stream has its own
+bounded buffer that drops the oldest events when the client falls behind, so a
+slow dashboard never holds up a write. Like the caches, this is per process:
+with several API workers, a stream only sees events handled by its own worker.
+"""
+import asyncio
+import os
+import threading
+from collections import deque
+
+EVENT_BUFFER_SIZE = int(os.environ.get("EVENT_BUFFER_SIZE", "100")) # Per subscriber
+EVENT_KEEPALIVE_SECONDS = 15
+
+
+class Subscription:
+    """
+    One stream's buffer. `view(event)` returns the event as this subscriber may
+    see it (filtered by role) or None to skip it.
+    """
+
+    def __init__(self, loop, view=None, maxsize=EVENT_BUFFER_SIZE):
+        self.loop = loop
+        self.view = view or (lambda event: event)
+        self._events = deque(maxlen=maxsize)
+        self._ready = asyncio.Event()
+        self.dropped = 0
+
+    def _push(self, event):
+        # Runs on the subscriber's event loop
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(event)
+        self._ready.set()
+
+    async def get(self, timeout=None):
+        """Waits for events; returns them all (or [] after `timeout` seconds)."""
+        if not self._events:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        self._ready.clear()
+        events = list(self._events)
+        self._events.clear()
+        return events
+
+
+class EventBroker:
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    @property
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def subscribe(self, view=None, maxsize=EVENT_BUFFER_SIZE):
+        """Must be called from the event loop that will consume the subscription."""
+        subscription = Subscription(asyncio.get_running_loop(), view, maxsize)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event: dict):
+        """Thread-safe; callable from sync endpoints running in the threadpool."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            visible = subscription.view(event)
+            if visible is None:
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._push, visible)
+            except RuntimeError:
+                # Loop already closed: the stream is gone
+                self.unsubscribe(subscription)
+
+
+broker = EventBroker()
@@ -0,0 +1,494 @@
+"""
+Nearest-neighbour indexes over face encodings.
+
+Pure NumPy with no app imports, so the camera client can use the same code
+(it adds backend/app to sys.path). Every index answers `search(queries, k)`
+with (distances, indices) arrays of shape (M, k); missing neighbours are
+reported as distance inf / index -1.
+
+- BruteForceIndex: exact, one GEMM over the whole gallery.
+- IVFIndex: k-means coarse quantizer + inverted lists; only the `n_probe`
+  closest lists are scanned, with exact distances inside them (IVF-Flat).
+- CompactIndex: searches a few templates per user (centroids with outliers
+  dropped), then re-ranks the shortlisted users over their full encodings,
+  which it keeps as float16.
+
+Every index reports the bytes it holds as `memory_bytes` in `stats()`.
+
+`match_faces` is the per-frame recognition step on top of either index.
+"""
+import os
+import time
+
+import numpy as np
+
+# Below this many encodings brute force is already fast enough
+IVF_MIN_SIZE = int(os.environ.get("FACE_INDEX_IVF_MIN_SIZE", "20000"))
+# Compact gallery: templates per user, how far from the centroid an encoding is an outlier,
+# and how many users the template search shortlists for the exact re-rank
+TEMPLATES_PER_USER = int(os.environ.get("FACE_TEMPLATES_PER_USER", "1"))
+TEMPLATE_OUTLIER_DISTANCE = float(os.environ.get("FACE_TEMPLATE_OUTLIER_DISTANCE", "0.5"))
+COMPACT_SHORTLIST = 10
+# Neighbours fetched per face at first, so a face can fall back to its next user when its
+# best one is taken; more are fetched while a user's many photos crowd out other users
+MATCH_CANDIDATES = 8
+_CHUNK_ROWS = 8192
+
+
+def _as_matrix(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1) if matrix.size else matrix.reshape(0, 128)
+    return np.ascontiguousarray(matrix)
+
+
+def _sq_norms(matrix: np.ndarray) -> np.ndarray:
+    return np.einsum('ij,ij->i', matrix, matrix)
+
+
+def _nbytes(*arrays) -> int:
+    return int(sum(a.nbytes for a in arrays))
+
+
+def _sq_distances(queries, matrix, matrix_sq_norms):
+    """All-pairs squared L2 distances via ||q||^2 + ||g||^2 - 2 q.g."""
+    sq_dist = _sq_norms(queries)[:, None] + matrix_sq_norms[None, :] - 2.0 * (queries @ matrix.T)
+    np.maximum(sq_dist, 0.0, out=sq_dist)
+    return sq_dist
+
+
+def _top_k(sq_dist: np.ndarray, k: int):
+    """Row-wise k smallest of a distance matrix, sorted. Returns (distances, column indices)."""
+    n = sq_dist.shape[1]
+    k_eff = min(k, n)
+    if k_eff == 0:
+        return (np.full((len(sq_dist), k), np.inf, dtype=np.float32),
+                np.full((len(sq_dist), k), -1, dtype=np.int64))
+
+    if k_eff < n:
+        part = np.argpartition(sq_dist, k_eff - 1, axis=1)[:, :k_eff]
+    else:
+        part = np.broadcast_to(np.arange(n), sq_dist.shape)
+    part_dist = np.take_along_axis(sq_dist, part, axis=1)
+    order = np.argsort(part_dist, axis=1)
+    idx = np.take_along_axis(part, order, axis=1).astype(np.int64)
+    dist = np.sqrt(np.take_along_axis(part_dist, order, axis=1))
+
+    if k_eff < k:
+        pad = k - k_eff
+        dist = np.pad(dist, ((0, 0), (0, pad)), constant_values=np.inf)
+        idx = np.pad(idx, ((0, 0), (0, pad)), constant_values=-1)
+    return dist, idx
+
+
+class BruteForceIndex:
+    """Exact search over every encoding."""
+
+    kind = "exact"
+
+    def __init__(self, matrix):
+        start = time.perf_counter()
+        self.matrix = _as_matrix(matrix)
+        self.sq_norms = _sq_norms(self.matrix)
+        self.build_seconds = time.perf_counter() - start
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def search(self, queries, k: int = 1):
+        queries = _as_matrix(queries)
+        return _top_k(_sq_distances(queries, self.matrix, self.sq_norms), k)
+
+    @property
+    def nbytes(self):
+        return _nbytes(self.matrix, self.sq_norms)
+
+    def stats(self):
+        return {"kind": self.kind, "size": len(self), "build_ms": self.build_seconds * 1000, "memory_bytes": self.nbytes}
+
+
+class IVFIndex:
+    """
+    Inverted-file index: encodings are bucketed by their nearest k-means
+    centroid, and a query only scans the `n_probe` nearest buckets.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, matrix, n_lists: int = None, n_probe: int = 8, n_iter: int = 10, seed: int = 0):
+        start = time.perf_counter()
+        self.matrix = _as_matrix(matrix)
+        self.sq_norms = _sq_norms(self.matrix)
+        n = len(self.matrix)
+
+        if n_lists is None:
+            n_lists = int(np.sqrt(n))
+        self.n_lists = max(1, min(n_lists, n))
+        self.n_probe = max(1, min(n_probe, self.n_lists))
+
+        self.centroids = self._train(np.random.default_rng(seed), n_iter)
+        self.centroid_sq_norms = _sq_norms(self.centroids)
+
+        # Inverted lists as one permutation array + offsets (CSR layout)
+        assignments = self._assign(self.matrix)
+        self.list_members = np.argsort(assignments, kind="stable")
+        self.list_offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(assignments, minlength=self.n_lists))]
+        )
+        self.build_seconds = time.perf_counter() - start
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def _assign(self, vectors, centroids=None):
+        if centroids is None:
+            centroids = self.centroids
+        c_norms = _sq_norms(centroids)
+        out = np.empty(len(vectors), dtype=np.int64)
+        for lo in range(0, len(vectors), _CHUNK_ROWS):
+            chunk = vectors[lo:lo + _CHUNK_ROWS]
+            out[lo:lo + _CHUNK_ROWS] = np.argmin(_sq_distances(chunk, centroids, c_norms), axis=1)
+        return out
+
+    def _train(self, rng, n_iter):
+        n = len(self.matrix)
+        if n == 0:
+            return np.zeros((1, self.matrix.shape[1]), dtype=np.float32)
+
+        # k-means on a sample is plenty for a coarse quantizer
+        sample_size = min(n, self.n_lists * 64)
+        sample = self.matrix[rng.choice(n, sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, self.n_lists, replace=False)].copy()
+
+        for _ in range(n_iter):
+            assign = self._assign(sample, centroids)
+            counts = np.bincount(assign, minlength=self.n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+
+            empty = counts == 0
+            centroids[~empty] = sums[~empty] / counts[~empty, None]
+            if empty.any():
+                # Re-seed empty lists with random points
+                centroids[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+        return centroids
+
+    def search(self, queries, k: int = 1):
+        queries = _as_matrix(queries)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        if len(self.matrix) == 0:
+            return distances, indices
+
+        centroid_dist = _sq_distances(queries, self.centroids, self.centroid_sq_norms)
+        if self.n_probe < self.n_lists:
+            probes = np.argpartition(centroid_dist, self.n_probe - 1, axis=1)[:, :self.n_probe]
+        else:
+            probes = np.broadcast_to(np.arange(self.n_lists), centroid_dist.shape)
+
+        for i, query in enumerate(queries):
+            candidates = np.concatenate([
+                self.list_members[self.list_offsets[l]:self.list_offsets[l + 1]] for l in probes[i]
+            ])
+            if len(candidates) == 0:
+                continue
+            sq_dist = _sq_distances(query[None, :], self.matrix[candidates], self.sq_norms[candidates])
+            dist, local = _top_k(sq_dist, k)
+            found = local[0] >= 0
+            distances[i, found] = dist[0, found]
+            indices[i, found] = candidates[local[0, found]]
+        return distances, indices
+
+    @property
+    def nbytes(self):
+        return _nbytes(self.matrix, self.sq_norms, self.centroids, self.centroid_sq_norms, self.list_members, self.list_offsets)
+
+    def stats(self):
+        sizes = np.diff(self.list_offsets)
+        return {
+            "kind": self.kind,
+            "size": len(self),
+            "build_ms": self.build_seconds * 1000,
+            "memory_bytes": self.nbytes,
+            "n_lists": self.n_lists,
+            "n_probe": self.n_probe,
+            "max_list_size": int(sizes.max()) if len(sizes) else 0,
+        }
+
+
+def _user_templates(points, k, outlier_distance, rng):
+    """Up to `k` templates for one user's encodings: k-means centroids of the inliers."""
+    centroid = points.mean(axis=0)
+    inliers = points[np.linalg.norm(points - centroid, axis=1) <= outlier_distance]
+    if len(inliers) == 0:
+        # Nothing close to the mean: keep the encoding closest to it
+        inliers = points[[np.argmin(np.linalg.norm(points - centroid, axis=1))]]
+    if k <= 1 or len(inliers) <= 1:
+        return inliers.mean(axis=0, keepdims=True)
+    if len(inliers) <= k:
+        return inliers
+
+    centroids = inliers[rng.choice(len(inliers), k, replace=False)].copy()
+    assign = None
+    for _ in range(10):
+        new_assign = np.argmin(_sq_distances(inliers, centroids, _sq_norms(centroids)), axis=1)
+        if assign is not None and (new_assign == assign).all():
+            break
+        assign = new_assign
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, inliers)
+        centroids[counts > 0] = sums[counts > 0] / counts[counts > 0, None]
+    return centroids
+
+
+def compact_templates(matrix, user_ids, k: int = TEMPLATES_PER_USER,
+                      outlier_distance: float = TEMPLATE_OUTLIER_DISTANCE, seed: int = 0):
+    """
+    Per-user templates for a gallery with several encodings per user.
+    Returns (templates, template_user_ids).
+    """
+    matrix = _as_matrix(matrix)
+    user_ids = np.asarray(user_ids)
+    order = np.argsort(user_ids, kind="stable")
+    users, starts = np.unique(user_ids[order], return_index=True)
+    bounds = np.append(starts, len(order))
+    rng = np.random.default_rng(seed)
+
+    templates, owners = [], []
+    for u, user in enumerate(users):
+        points = matrix[order[bounds[u]:bounds[u + 1]]]
+        user_templates = _user_templates(points, k, outlier_distance, rng)
+        templates.append(user_templates)
+        owners.append(np.full(len(user_templates), user, dtype=user_ids.dtype))
+    if not templates:
+        return np.empty((0, matrix.shape[1]), dtype=np.float32), np.empty(0, dtype=user_ids.dtype)
+    return _as_matrix(np.concatenate(templates)), np.concatenate(owners)
+
+
+class CompactIndex:
+    """
+    Two-stage search for galleries with many encodings per user: the template
+    index (a few rows per user) shortlists users, then every encoding of those
+    users is re-scored. Results index the full matrix, like the other kinds.
+
+    The search set shrinks to the templates. The full encodings still have to
+    be kept for the re-rank, as float16: half the float32 matrix, with
+    distances off by about 1e-4, far below any match tolerance.
+    """
+
+    kind = "compact"
+
+    def __init__(self, matrix, user_ids, templates_per_user: int = TEMPLATES_PER_USER,
+                 shortlist: int = COMPACT_SHORTLIST, template_kind: str = "auto"):
+        start = time.perf_counter()
+        matrix = _as_matrix(matrix)
+        self.user_ids = np.asarray(user_ids)
+        self.shortlist = shortlist
+
+        templates, self.template_user_ids = compact_templates(matrix, self.user_ids, k=templates_per_user)
+        self.templates = build_index(templates, kind=template_kind)
+
+        # Re-rank store; norms of the stored (rounded) values keep distances consistent
+        self.encodings = matrix.astype(np.float16)
+        self.sq_norms = _sq_norms(self.encodings.astype(np.float32))
+
+        # Rows of each user as one permutation array + offsets (CSR layout)
+        self.user_rows = np.argsort(self.user_ids, kind="stable")
+        self.users, starts = np.unique(self.user_ids[self.user_rows], return_index=True)
+        self.user_offsets = np.append(starts, len(self.user_rows))
+        self.build_seconds = time.perf_counter() - start
+
+    def __len__(self):
+        return len(self.encodings)
+
+    def search(self, queries, k: int = 1):
+        queries = _as_matrix(queries)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        if len(self.encodings) == 0:
+            return distances, indices
+
+        # Over-fetch templates: a user can own several of them
+        _, template_idx = self.templates.search(queries, k=max(k, self.shortlist) * 2)
+        for i, query in enumerate(queries):
+            found = template_idx[i][template_idx[i] >= 0]
+            shortlisted = list(dict.fromkeys(self.template_user_ids[found]))[:max(k, self.shortlist)]
+            slots = np.searchsorted(self.users, shortlisted)
+            candidates = np.concatenate([
+                self.user_rows[self.user_offsets[s]:self.user_offsets[s + 1]] for s in slots
+            ]) if len(slots) else np.empty(0, dtype=np.int64)
+            if len(candidates) == 0:
+                continue
+            sq_dist = _sq_distances(query[None, :], self.encodings[candidates].astype(np.float32), self.sq_norms[candidates])
+            dist, local = _top_k(sq_dist, k)
+            hit = local[0] >= 0
+            distances[i, hit] = dist[0, hit]
+            indices[i, hit] = candidates[local[0, hit]]
+        return distances, indices
+
+    @property
+    def nbytes(self):
+        return self.templates.nbytes + _nbytes(
+            self.encodings, self.sq_norms, self.user_ids, self.template_user_ids,
+            self.user_rows, self.users, self.user_offsets
+        )
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "size": len(self),
+            "build_ms": self.build_seconds * 1000,
+            "memory_bytes": self.nbytes,
+            "users": len(self.users),
+            "templates": len(self.templates),
+            "template_index": self.templates.kind,
+            "compaction": len(self) / len(self.templates) if len(self.templates) else 1.0,
+        }
+
+
+INDEX_KINDS = {
+    "exact": BruteForceIndex,
+    "ivf": IVFIndex,
+    "compact": CompactIndex,
+}
+
+
+def build_index(matrix, kind: str = "auto", user_ids=None, **params):
+    """
+    Builds an index over `matrix` (N x 128).
+    kind="auto" uses brute force for small galleries and IVF from IVF_MIN_SIZE up.
+    kind="compact" needs `user_ids` (owner of each row) to build per-user templates.
+    """
+    if kind == "auto":
+        kind = "ivf" if len(matrix) >= IVF_MIN_SIZE else "exact"
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown index kind '{kind}'. Choose from: {', '.join(INDEX_KINDS)}")
+    if kind == "compact":
+        if user_ids is None:
+            raise ValueError("The compact index needs the user id of every encoding")
+        return CompactIndex(matrix, user_ids, **params)
+    return INDEX_KINDS[kind](matrix, **params)
+
+
+def _search_users(index, queries, user_ids, users_needed: int, tolerance: float):
+    """
+    Searches enough neighbours that every face sees `users_needed` distinct
+    users within `tolerance` (or all there are). One user with many photos
+    fills the first rows, so k grows until other users show up.
+    """
+    k = min(len(index), max(MATCH_CANDIDATES, users_needed))
+    while True:
+        distances, indices = index.search(queries, k=max(k, 1))
+        if k >= len(index):
+            return distances, indices
+        # A face may have more users within tolerance past its k-th row
+        cut_off = distances[:, -1] <= tolerance
+        if not any(
+            len(np.unique(user_ids[rows[rows >= 0]])) < users_needed
+            for rows in indices[cut_off]
+        ):
+            return distances, indices
+        k = min(len(index), k * 4)
+
+
+def match_faces(index, queries, user_ids, tolerance: float, unique: bool = True, exclude=()):
+    """
+    Recognizes all faces of one frame together.
+
+    One search covers every face (with brute force, a single faces x gallery
+    distance matrix). With `unique`, two faces can't be assigned the same user:
+    each face's candidates are reduced to its distance to every user (the
+    closest of that user's photos), then (face, user) pairs within `tolerance`
+    are taken closest first, and a face whose best user went to a closer face
+    falls back to its next user. Users in `exclude` (already identified in this
+    frame) are never assigned.
+
+    Returns (rows, distances, matched), each of length M: the matched gallery row
+    (or, when unmatched, the nearest one; -1 if none), its distance, and a flag.
+    """
+    queries = _as_matrix(queries)
+    user_ids = np.asarray(user_ids)
+    if unique and len(queries):
+        # Enough distinct users that a face still has one left after every other face and exclusion
+        distances, indices = _search_users(index, queries, user_ids, len(queries) + len(exclude), tolerance)
+    else:
+        distances, indices = index.search(queries, k=1)
+
+    rows = indices[:, 0].copy()
+    best = distances[:, 0].copy()
+    matched = (rows >= 0) & (best <= tolerance)
+    if not unique or not len(queries):
+        return rows, best, matched
+
+    # Candidate (face, row) pairs within tolerance, closest first
+    faces = np.repeat(np.arange(len(queries)), distances.shape[1])
+    flat_rows, flat_dist = indices.ravel(), distances.ravel()
+    keep = (flat_rows >= 0) & (flat_dist <= tolerance)
+    if len(exclude):
+        keep &= ~np.isin(user_ids[np.maximum(flat_rows, 0)], list(exclude))
+    order = np.argsort(flat_dist[keep], kind="stable")
+    faces, flat_rows, flat_dist = faces[keep][order], flat_rows[keep][order], flat_dist[keep][order]
+
+    # One pair per (face, user): that user's closest photo
+    _, first = np.unique(np.stack([faces, user_ids[flat_rows]], axis=1), axis=0, return_index=True)
+    first.sort()
+    faces, flat_rows, flat_dist = faces[first], flat_rows[first], flat_dist[first]
+
+    matched[:] = False
+    taken = set()
+    for face, row, dist in zip(faces, flat_rows, flat_dist):
+        user = user_ids[row]
+        if matched[face] or user in taken:
+            continue
+        rows[face], best[face], matched[face] = row, dist, True
+        taken.add(user)
+        if len(taken) == len(queries):
+            break
+    return rows, best, matched
+
+
+def _timed_search(index, queries, k):
+    """Searches one query at a time (as a kiosk does). Returns (indices, latencies in ms)."""
+    indices = np.empty((len(queries), k), dtype=np.int64)
+    latencies = np.empty(len(queries))
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, idx = index.search(query, k)
+        latencies[i] = (time.perf_counter() - start) * 1000
+        indices[i] = idx[0]
+    return indices, latencies
+
+
+def evaluate_index(index, queries, k: int = 1, matrix=None):
+    """
+    Compares `index` against exact search on the same gallery.
+    `matrix` is the float32 gallery behind `index`; without it the index's
+    own copy is used (the compact index only keeps float16 encodings).
+    Returns recall@k and single-query latency (mean / p95, ms) of both.
+    """
+    queries = _as_matrix(queries)
+    if isinstance(index, BruteForceIndex):
+        exact = index
+    else:
+        if matrix is None:
+            matrix = index.encodings if isinstance(index, CompactIndex) else index.matrix
+        exact = BruteForceIndex(matrix)
+
+    exact_idx, exact_ms = _timed_search(exact, queries, k)
+    approx_idx, index_ms = _timed_search(index, queries, k)
+
+    hits = sum(
+        len(set(e[e >= 0]) & set(a[a >= 0])) for e, a in zip(exact_idx, approx_idx)
+    )
+    expected = int((exact_idx >= 0).sum())
+    report = {
+        "kind": index.kind,
+        "queries": len(queries),
+        "k": k,
+        f"recall_at_{k}": hits / expected if expected else 1.0,
+    }
+    for name, latencies in (("exact", exact_ms), ("index", index_ms)):
+        report[f"{name}_ms_mean"] = float(latencies.mean()) if len(latencies) else 0.0
+        report[f"{name}_ms_p95"] = float(np.percentile(latencies, 95)) if len(latencies) else 0.0
+    return report
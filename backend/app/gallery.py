@@ -0,0 +1,159 @@
+import os
+import threading
+from collections import namedtuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import models, crud, encoding_format, face_index
+from .encoding_format import ENCODING_DIM
+
+# "auto", "exact", "ivf" or "compact" (see face_index.build_index)
+FACE_INDEX_KIND = os.environ.get("FACE_INDEX", "auto")
+
+# One consistent view of the gallery; `cursor` is the change-feed position it reflects
+GallerySnapshot = namedtuple("GallerySnapshot", "matrix index user_ids encoding_ids names cursor")
+
+
+class FaceGallery:
+    """
+    In-memory copy of every FaceEncoding row.
+
+    All encodings are kept as one contiguous float32 (N x 128) matrix with
+    parallel user-id / encoding-id arrays, and searched through a face_index
+    index (one GEMM for exact search, IVF for large galleries, or per-user
+    templates with an exact re-rank for galleries with many photos per user).
+    The matrix and its search index are rebuilt lazily from the DB after
+    `invalidate()`, i.e. on the first query following an enrollment change.
+    """
+
+    def __init__(self, index_kind: str = FACE_INDEX_KIND):
+        self.index_kind = index_kind
+        self._lock = threading.Lock()
+        self._stale = True
+        empty = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        self._snapshot = GallerySnapshot(
+            matrix=empty,
+            index=face_index.BruteForceIndex(empty),
+            user_ids=np.empty(0, dtype=np.int64),
+            encoding_ids=np.empty(0, dtype=np.int64),
+            names={},
+            cursor=0
+        )
+
+    def __len__(self):
+        return len(self._snapshot.user_ids)
+
+    def invalidate(self):
+        """Mark the gallery dirty; the next query reloads it from the DB."""
+        self._stale = True
+
+    def _load(self, db: Session):
+        # Read the cursor first: changes racing with the load are replayed, never missed
+        cursor = crud.get_latest_encoding_cursor(db)
+        rows = (
+            db.query(models.FaceEncoding.id, models.FaceEncoding.user_id, models.FaceEncoding.encoding, models.User.name)
+            .join(models.User, models.User.id == models.FaceEncoding.user_id)
+            .order_by(models.FaceEncoding.id)
+            .all()
+        )
+
+        matrix = np.empty((len(rows), ENCODING_DIM), dtype=np.float32)
+        user_ids = np.empty(len(rows), dtype=np.int64)
+        encoding_ids = np.empty(len(rows), dtype=np.int64)
+        names = {}
+
+        count = 0
+        for enc_id, user_id, enc_data, name in rows:
+            try:
+                matrix[count] = encoding_format.decode(enc_data)
+            except Exception as e:
+                print(f"Skipping bad encoding {enc_id}: {e}")
+                continue
+            user_ids[count] = user_id
+            encoding_ids[count] = enc_id
+            names[user_id] = name
+            count += 1
+
+        matrix = np.ascontiguousarray(matrix[:count])
+        self._snapshot = GallerySnapshot(
+            matrix=matrix,
+            index=face_index.build_index(matrix, kind=self.index_kind, user_ids=user_ids[:count]),
+            user_ids=user_ids[:count],
+            encoding_ids=encoding_ids[:count],
+            names=names,
+            cursor=cursor
+        )
+
+    def refresh(self, db: Session):
+        """
+        Reload from the DB if an enrollment change invalidated the gallery.
+        Returns the current GallerySnapshot.
+        """
+        with self._lock:
+            if self._stale:
+                # Clear the flag first: an invalidate() racing with the load wins
+                self._stale = False
+                self._load(db)
+            return self._snapshot
+
+    def export_records(self, db: Session):
+        """
+        Packs the gallery into EXPORT_DTYPE records for the bulk binary export.
+        Returns (records, cursor, names).
+        """
+        snap = self.refresh(db)
+        records = np.empty(len(snap.user_ids), dtype=encoding_format.EXPORT_DTYPE)
+        records["id"] = snap.encoding_ids
+        records["user_id"] = snap.user_ids
+        records["encoding"] = snap.matrix
+        return records, snap.cursor, snap.names
+
+    def match(self, db: Session, queries, tolerance: float = 0.5, unique: bool = True):
+        """
+        Match a batch of query embeddings (M x 128) against the gallery.
+        With `unique`, the queries are faces of one frame and no two of them
+        are matched to the same user (see face_index.match_faces).
+        Returns a list of dicts with user_id, name, distance and matched per query.
+        """
+        snap = self.refresh(db)
+        user_ids, names = snap.user_ids, snap.names
+
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        if len(user_ids) == 0:
+            return [{"user_id": None, "name": None, "distance": None, "matched": False} for _ in queries]
+
+        rows, distances, matched = face_index.match_faces(snap.index, queries, user_ids, tolerance, unique=unique)
+
+        results = []
+        for idx, dist, is_match in zip(rows, distances, matched):
+            if idx < 0:
+                # Approximate index found no candidate in the probed lists
+                results.append({"user_id": None, "name": None, "distance": None, "matched": False})
+                continue
+            user_id = int(user_ids[idx])
+            results.append({
+                "user_id": user_id,
+                "name": names.get(user_id),
+                "distance": float(dist),
+                "matched": bool(is_match),
+            })
+        return results
+
+    def index_report(self, db: Session, samples: int = 0, noise: float = 0.05, k: int = 1):
+        """
+        Index statistics; with `samples` > 0 also measures recall and latency
+        against exact search, using perturbed gallery encodings as queries.
+        """
+        snap = self.refresh(db)
+        report = snap.index.stats()
+        if samples > 0 and len(snap.matrix) > 0:
+            rng = np.random.default_rng(0)
+            picks = rng.choice(len(snap.matrix), min(samples, len(snap.matrix)), replace=False)
+            queries = snap.matrix[picks] + rng.normal(scale=noise, size=(len(picks), ENCODING_DIM)).astype(np.float32)
+            report["evaluation"] = face_index.evaluate_index(snap.index, queries, k=k, matrix=snap.matrix)
+        return report
+
+
+# Process-wide gallery shared by all requests
+face_gallery = FaceGallery()
@@ -0,0 +1,50 @@
+"""
+Server-side processing of attendance evidence before it is stored.
+
+Current kiosks already send a small face crop (client/evidence.py); older
+clients send full camera frames, which are downscaled here. Every stored
+image also gets a small JPEG thumbnail for dashboard lists.
+"""
+import os
+
+import cv2
+import numpy as np
+
+EVIDENCE_MAX_SIDE = int(os.environ.get("EVIDENCE_MAX_SIDE", "640"))
+EVIDENCE_QUALITY = int(os.environ.get("EVIDENCE_QUALITY", "80"))
+THUMBNAIL_SIDE = int(os.environ.get("THUMBNAIL_SIDE", "128"))
+THUMBNAIL_QUALITY = 70
+
+
+def _fit(image, max_side: int):
+    """Downscales so the longest side is at most `max_side` (never upscales)."""
+    height, width = image.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return image
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+def _encode_jpeg(image, quality: int):
+    ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes() if ok else None
+
+def process_evidence(data: bytes, content_type: str = None):
+    """
+    Returns (image bytes, content type, extension, thumbnail bytes or None).
+    Images within EVIDENCE_MAX_SIDE are kept byte-for-byte (no second lossy pass);
+    larger ones are downscaled and re-encoded as JPEG. Undecodable data is
+    stored as-is without a thumbnail.
+    """
+    ext = ".webp" if content_type == "image/webp" else ".jpg"
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return data, content_type or "image/jpeg", ext, None
+
+    if max(image.shape[:2]) > EVIDENCE_MAX_SIDE:
+        compressed = _encode_jpeg(_fit(image, EVIDENCE_MAX_SIDE), EVIDENCE_QUALITY)
+        if compressed is not None and len(compressed) < len(data):
+            data, content_type, ext = compressed, "image/jpeg", ".jpg"
+
+    thumbnail = _encode_jpeg(_fit(image, THUMBNAIL_SIDE), THUMBNAIL_QUALITY)
+    return data, content_type or "image/jpeg", ext, thumbnail
@@ -1,18 +1,17 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, sessionmaker
 from typing import List
-import shutil
 import os
-import face_recognition
-import pickle
-import numpy as np
-from pathlib import Path
+import json
 import base64
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
-from . import models, schemas, crud, database, security
-from .supabase_client import supabase # New: Import Supabase client
-import mimetypes
+from . import models, schemas, crud, database, security, encoding_format, storage, imaging
+from .gallery import face_gallery
+from .encoding_pool import encoding_pool, PoolOverloaded, UnreadableImage
+from .encoding_format import ENCODING_DIM
+from .cache import TTLCache
 
 # Create tables
 models.Base.metadata.create_all(bind=database.engine)
@@ -27,18 +26,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Response headers that browser clients on another origin may read
+    expose_headers=["X-Next-Cursor", "X-Gallery-Cursor", "X-Gallery-Count", "X-Attendance-Duplicate"],
 )
 
 
 # Include Routers
 # Include Routers
-from .routers import announcements
+from .routers import announcements, encodings, enrollment, events, reports
 app.include_router(announcements.router)
+app.include_router(encodings.router)
+app.include_router(enrollment.router)
+app.include_router(events.router)
+app.include_router(reports.router)
+
+# Locally stored photos/evidence (STORAGE_BACKEND=local)
+if storage.STORAGE_BACKEND == "local":
+    from fastapi.staticfiles import StaticFiles
+    os.makedirs(storage.LOCAL_STORAGE_DIR, exist_ok=True)
+    app.mount(storage.MEDIA_URL_PATH, StaticFiles(directory=storage.LOCAL_STORAGE_DIR), name="media")
 
 
 # --- DEBUGGING HANDLER ---
 from fastapi import Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import traceback
 
 @app.exception_handler(Exception)
@@ -58,6 +69,43 @@ def get_db():
     finally:
         db.close()
 
+# --- Upload Helpers ---
+# Uploads are read straight into memory (Starlette already spools very large
+# bodies to a temp file), so nothing is written under the working directory.
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 10 * 1024 * 1024))
+
+def _read_upload_bytes(file: UploadFile) -> bytes:
+    """Reads an upload into memory, enforcing MAX_UPLOAD_BYTES."""
+    file.file.seek(0)
+    data = file.file.read(MAX_UPLOAD_BYTES + 1)
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB).")
+    return data
+
+async def _encode_faces(file_bytes: bytes):
+    """
+    Runs face detection + encoding in the encoding process pool so the event
+    loop keeps serving other requests. 503 when the pool's queue is full.
+    """
+    try:
+        return await encoding_pool.encode(file_bytes)
+    except PoolOverloaded:
+        raise HTTPException(status_code=503, detail="Face encoding is busy, please retry shortly.", headers={"Retry-After": "5"})
+    except UnreadableImage:
+        raise HTTPException(status_code=400, detail="Could not read the uploaded image.")
+
+@app.on_event("startup")
+def load_auth_keys():
+    security.load_signing_keys()
+
+@app.on_event("shutdown")
+def shutdown_encoding_pool():
+    encoding_pool.shutdown()
+
+@app.on_event("shutdown")
+def drain_uploads():
+    storage.upload_worker.shutdown()
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Face Attendance System API"}
@@ -73,64 +121,59 @@ async def register_user(
     db: Session = Depends(get_db),
     admin_user = Depends(security.get_current_admin)
 ):
-    # 1. Save temp file
-    temp_filename = f"temp_{file.filename}"
-    with open(temp_filename, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    try:
-        # 2. Load image and get encoding
-        image = face_recognition.load_image_file(temp_filename)
-        encodings = face_recognition.face_encodings(image)
-        
-        if len(encodings) == 0:
-            raise HTTPException(status_code=400, detail="No face found in the image.")
-        if len(encodings) > 1:
-            raise HTTPException(status_code=400, detail="Multiple faces found. Please upload a photo with a single face.")
-            
-        # 3. Serialize encoding
-        encoding_bytes = pickle.dumps(encodings[0])
-        
-        # Validating Role
-        try:
-            user_role = models.UserRole(role)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid role specified")
+    # 1. Read the upload once; the same bytes feed decoding and storage
+    file_bytes = _read_upload_bytes(file)
 
-        # NEW: Upload to Supabase Storage
-        public_url = None
-        try:
-            # Re-read file from temp path
-            with open(temp_filename, "rb") as f:
-                file_bytes = f.read()
-            
-            # Create unique filename
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            safe_name = "".join(c for c in name if c.isalnum() or c in (' ', '_')).rstrip().replace(' ', '_')
-            file_ext = os.path.splitext(file.filename)[1]
-            storage_path = f"{safe_name}_{timestamp}{file_ext}"
-            
-            # Upload
-            supabase.storage.from_("faces").upload(storage_path, file_bytes, {"content-type": file.content_type})
-            public_url = supabase.storage.from_("faces").get_public_url(storage_path)
-        except Exception as e:
-            print(f"Supabase Upload Failed: {e}")
+    # 2. Load image and get encoding (off the event loop)
+    encodings = await _encode_faces(file_bytes)
+    
+    if len(encodings) == 0:
+        raise HTTPException(status_code=400, detail="No face found in the image.")
+    if len(encodings) > 1:
+        raise HTTPException(status_code=400, detail="Multiple faces found. Please upload a photo with a single face.")
         
-        # 4. Create user in DB
-        user_data = schemas.UserCreate(
-            name=name, 
-            email=email, 
-            department=department, 
-            roll_number=roll_number,
-            role=user_role,
-            profile_image_url=public_url
-        )
-        return crud.create_user(db=db, user=user_data, encoding_bytes=encoding_bytes)
+    # 3. Serialize encoding (raw float32, see encoding_format)
+    encoding_bytes = encoding_format.encode(encodings[0])
     
-    finally:
-        # Cleanup
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
+    # Validating Role
+    try:
+        user_role = models.UserRole(role)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid role specified")
+
+    # 4. Create user in DB (in the threadpool, like the sync handlers' DB work)
+    user_data = schemas.UserCreate(
+        name=name, 
+        email=email, 
+        department=department, 
+        roll_number=roll_number,
+        role=user_role
+    )
+
+    def save():
+        db_user = crud.create_user(db=db, user=user_data, encoding_bytes=encoding_bytes)
+        return schemas.User.model_validate(db_user) # Loaded here, not lazily on the event loop
+
+    db_user = await run_in_threadpool(save)
+    face_gallery.invalidate()
+
+    # 5. Upload the photo in the background; profile_image_url is set when it lands
+    safe_name = "".join(c for c in name if c.isalnum() or c in (' ', '_')).rstrip().replace(' ', '_')
+    make_session = _session_factory(db)
+    user_id, user_email = db_user.id, db_user.email
+
+    def record_profile_image(url):
+        with make_session() as session:
+            crud.set_profile_image_url(session, user_id, url)
+        security.invalidate_user(user_email)
+
+    # From the threadpool: with the upload queue full, submit() uploads inline
+    await run_in_threadpool(
+        storage.upload_worker.submit,
+        "faces", storage.object_name(safe_name, file.filename), file_bytes,
+        file.content_type, on_done=record_profile_image
+    )
+    return db_user
 
 @app.post("/users/{user_id}/faces/", response_model=schemas.FaceEncoding)
 async def add_face_to_user(
@@ -139,25 +182,23 @@ async def add_face_to_user(
     db: Session = Depends(get_db),
     admin_user = Depends(security.get_current_admin)
 ):
-    user = crud.get_user(db, user_id=user_id)
+    user = await run_in_threadpool(crud.get_user, db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    temp_filename = f"temp_{file.filename}"
-    with open(temp_filename, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    try:
-        image = face_recognition.load_image_file(temp_filename)
-        encodings = face_recognition.face_encodings(image)
-        if len(encodings) == 0:
-            raise HTTPException(status_code=400, detail="No face found.")
-            
-        encoding_bytes = pickle.dumps(encodings[0])
-        return crud.add_face_to_user(db=db, user_id=user_id, encoding_bytes=encoding_bytes)
-    finally:
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
+    encodings = await _encode_faces(_read_upload_bytes(file))
+    if len(encodings) == 0:
+        raise HTTPException(status_code=400, detail="No face found.")
+        
+    encoding_bytes = encoding_format.encode(encodings[0])
+
+    def save():
+        db_encoding = crud.add_face_to_user(db=db, user_id=user_id, encoding_bytes=encoding_bytes)
+        return schemas.FaceEncoding.model_validate(db_encoding)
+
+    db_encoding = await run_in_threadpool(save)
+    face_gallery.invalidate()
+    return db_encoding
 
 @app.delete("/users/{user_id}")
 def delete_user(user_id: int, db: Session = Depends(get_db), admin_user = Depends(security.get_current_admin)):
@@ -165,8 +206,11 @@ def delete_user(user_id: int, db: Session = Depends(get_db), admin_user = Depend
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    db.delete(user)
-    db.commit()
+    email = user.email
+    crud.delete_user(db, user)
+    face_gallery.invalidate()
+    security.invalidate_user(email)
+    _recent_attendance.pop(user_id)
     return {"message": f"User {user_id} deleted."}
 
 @app.get("/users/by_email/", response_model=schemas.User)
@@ -182,90 +226,320 @@ def update_user(user_id: int, name: str = Form(None), department: str = Form(Non
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if name:
-        user.name = name
-    if department:
-        user.department = department
-        
-    db.commit()
-    db.refresh(user)
+    user = crud.update_user(db, user, name=name, department=department)
+    face_gallery.invalidate()
+    security.invalidate_user(user.email)
     return user
 
+def _user_to_dict(u: models.User, include_encodings: bool):
+    u_dict = {
+        "id": u.id,
+        "name": u.name,
+        "department": u.department,
+        "role": u.role, # NEW: Include role
+        "profile_image_url": u.profile_image_url, # NEW: Include image URL
+        "created_at": u.created_at.isoformat() if u.created_at else None,
+    }
+    if not include_encodings:
+        return u_dict
+
+    # Serialize all face encodings for this user (already loaded with the page)
+    u_dict["encodings"] = []
+    for face in u.encodings:
+        try:
+            u_dict["encodings"].append({
+                "id": face.id,
+                "encoding": base64.b64encode(encoding_format.to_raw(face.encoding)).decode('utf-8')
+            })
+        except Exception as e:
+            print(f"Error encoding face {face.id}: {e}")
+    return u_dict
+
 @app.get("/users/")
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    users = crud.get_users(db, skip=skip, limit=limit)
-    results = []
-    
-    for u in users:
-        u_dict = {
-            "id": u.id,
-            "name": u.name,
-            "department": u.department,
-            "role": u.role, # NEW: Include role
-            "profile_image_url": u.profile_image_url, # NEW: Include image URL
-            "created_at": u.created_at.isoformat() if u.created_at else None,
-            "encodings": [] # NEW: List of encodings
-        }
-        
-        # Serialize all face encodings for this user
-        for face in u.encodings:
-            try:
-                enc_data = face.encoding
-                if isinstance(enc_data, str):
-                    enc_data = enc_data.encode('utf-8')
-                    
-                u_dict["encodings"].append({
-                    "id": face.id,
-                    "encoding": base64.b64encode(enc_data).decode('utf-8')
-                })
-            except Exception as e:
-                print(f"Error encoding face {face.id}: {e}")
-                
-        results.append(u_dict)
-    return results
+def read_users(
+    skip: int = 0,
+    limit: int = Query(None, ge=1),
+    after_id: int = None,
+    include_encodings: bool = True,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_db)
+):
+    """
+    Lists users ordered by id.
+    - json (default): one page of `limit` users (100 by default). Pass the
+      `X-Next-Cursor` response header back as `after_id` for the next page.
+    - ndjson: streams one user per line (every user after `after_id`, or
+      `limit` of them) with constant memory, for large exports.
+    Set `include_encodings=false` when the face data is not needed.
+    """
+    if format == "ndjson":
+        # The request session is closed once the handler returns; stream from our own
+        bind = db.get_bind()
+
+        def generate():
+            with Session(bind=bind) as stream_db:
+                users = crud.iter_users(stream_db, after_id=after_id, include_encodings=include_encodings)
+                for i, u in enumerate(users):
+                    if limit is not None and i >= limit:
+                        break
+                    yield json.dumps(_user_to_dict(u, include_encodings)) + "\n"
+
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+    page_size = limit or 100
+    users = crud.get_users(db, skip=skip, limit=page_size, after_id=after_id, include_encodings=include_encodings)
+    headers = {"X-Next-Cursor": str(users[-1].id)} if len(users) == page_size else {}
+    return JSONResponse([_user_to_dict(u, include_encodings) for u in users], headers=headers)
+
+@app.post("/recognize", response_model=schemas.RecognizeResponse)
+def recognize_faces(
+    request: schemas.RecognizeRequest,
+    db: Session = Depends(get_db),
+    current_user = Depends(security.get_current_user)
+):
+    """
+    Matches a batch of face embeddings against the server-side gallery.
+    Kiosks send their encodings here instead of downloading every user.
+    """
+    if any(len(enc) != ENCODING_DIM for enc in request.encodings):
+        raise HTTPException(status_code=400, detail=f"Each encoding must have {ENCODING_DIM} values.")
+    if not request.encodings:
+        return {"matches": []}
+
+    return {"matches": face_gallery.match(db, request.encodings, tolerance=request.tolerance, unique=request.unique)}
+
+@app.get("/recognize/index")
+def read_recognition_index(
+    samples: int = Query(0, ge=0, le=2000),
+    k: int = Query(1, ge=1, le=100),
+    db: Session = Depends(get_db),
+    admin_user = Depends(security.get_current_admin)
+):
+    """
+    Reports the gallery search index (kind, size, build time).
+    With `samples` > 0, also measures recall@k and latency against exact search.
+    """
+    return face_gallery.index_report(db, samples=samples, k=k)
+
+MAX_ATTENDANCE_BATCH = 500
+
+# Repeat sightings of a user within this many seconds (by capture time) return the
+# existing record instead of inserting, across kiosks and client restarts. 0 disables.
+ATTENDANCE_DEDUP_SECONDS = int(os.environ.get("ATTENDANCE_DEDUP_SECONDS", "300"))
+# user_id -> (log id, timestamp) of the last record seen; fronts the indexed DB check
+_recent_attendance = TTLCache(maxsize=50000, ttl=max(ATTENDANCE_DEDUP_SECONDS, 1))
+
+def _to_utc_naive(ts: datetime):
+    """Client timestamps may carry a timezone; the DB stores naive UTC like datetime.utcnow()."""
+    if ts is not None and ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+def _is_within_dedup_window(a: datetime, b: datetime):
+    return abs((a - b).total_seconds()) < ATTENDANCE_DEDUP_SECONDS
+
+def _find_duplicate_attendance(db: Session, user_id: int, timestamp: datetime):
+    """
+    Returns an existing log of `user_id` within the dedup window of `timestamp`, or None.
+    Callers hold the user's row lock (see log_attendance), so a concurrent request
+    for the same user waits here until this one has committed its log.
+    """
+    if ATTENDANCE_DEDUP_SECONDS <= 0:
+        return None
+
+    # 1. Recently seen by this process: a primary-key read
+    cached = _recent_attendance.get(user_id)
+    if cached is not None and _is_within_dedup_window(cached[1], timestamp):
+        log = crud.get_attendance_log(db, cached[0])
+        if log is not None and log.user_id == user_id:
+            return log
+
+    # 2. Another kiosk/worker may have logged it: (user_id, timestamp) index lookup
+    window = timedelta(seconds=ATTENDANCE_DEDUP_SECONDS)
+    for log in crud.get_attendance_in_window(db, [user_id], timestamp - window, timestamp + window):
+        if _is_within_dedup_window(log.timestamp, timestamp):
+            _recent_attendance.set(user_id, (log.id, log.timestamp))
+            return log
+    return None
+
+def _session_factory(db: Session):
+    """Sessions on the same database as `db`, for work that outlives the request."""
+    return sessionmaker(bind=db.get_bind(), autocommit=False, autoflush=False)
+
+def _queue_log_image(db: Session, log_ids: List[int], user_id: int, file_bytes: bytes, content_type: str):
+    """
+    In the background: compresses attendance evidence, uploads it and a thumbnail
+    to the 'logs' bucket, then sets screenshot_path / thumbnail_path.
+    """
+    make_session = _session_factory(db)
+    worker = storage.upload_worker
+
+    def task():
+        data, data_type, ext, thumbnail = imaging.process_evidence(file_bytes, content_type)
+        name = storage.object_name(user_id, default_ext="")
+        url = worker.upload("logs", f"{name}{ext}", data, data_type)
+        thumbnail_url = worker.upload("logs", f"thumbs/{name}.jpg", thumbnail, "image/jpeg") if thumbnail else None
+        with make_session() as session:
+            crud.set_screenshot_path(session, log_ids, url, thumbnail_url)
+
+    worker.run(task)
+
+@app.post("/attendance/batch", response_model=schemas.AttendanceBatchResult)
+def log_attendance_batch(
+    events: str = Form(...), # JSON list of AttendanceEvent
+    files: List[UploadFile] = File(None),
+    db: Session = Depends(get_db),
+    current_user = Depends(security.get_current_user) # AUTHENTICATED USERS ONLY
+):
+    """
+    Logs many attendance events in one request with a single bulk insert.
+    Evidence images are sent as `files` and referenced by each event's `file_index`.
+    Events for unknown users are reported in `rejected`; the rest are still saved.
+    Events within the dedup window of an existing (or earlier in-batch) record
+    are not inserted and come back in `duplicates`.
+    """
+    try:
+        parsed = [schemas.AttendanceEvent(**e) for e in json.loads(events)]
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Invalid events payload: {e}")
+    if len(parsed) > MAX_ATTENDANCE_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_ATTENDANCE_BATCH} events per batch.")
+
+    # Read every upload first: an oversized file fails the request before anything is saved
+    files = files or []
+    file_bytes = [_read_upload_bytes(upload) for upload in files]
+
+    # Lock the users until commit so concurrent requests for them dedup against this batch
+    known_ids = crud.get_existing_user_ids(db, [e.user_id for e in parsed], for_update=ATTENDANCE_DEDUP_SECONDS > 0)
+    now = datetime.utcnow()
+    timestamps = [_to_utc_naive(e.timestamp) or now for e in parsed]
+
+    # Existing logs near any event in the batch, per user, from one indexed query
+    recent = {}
+    if ATTENDANCE_DEDUP_SECONDS > 0 and known_ids:
+        window = timedelta(seconds=ATTENDANCE_DEDUP_SECONDS)
+        for log in crud.get_attendance_in_window(db, known_ids, min(timestamps) - window, max(timestamps) + window):
+            recent.setdefault(log.user_id, []).append(log)
+
+    rows, row_files, rejected = [], [], []
+    duplicate_of = [] # (event index, existing log or index into rows)
+    for i, event in enumerate(parsed):
+        if event.user_id not in known_ids:
+            rejected.append({"index": i, "user_id": event.user_id, "detail": "User not found"})
+            continue
+        if event.file_index is not None and not 0 <= event.file_index < len(files):
+            rejected.append({"index": i, "user_id": event.user_id, "detail": "file_index out of range"})
+            continue
+
+        existing = next((log for log in recent.get(event.user_id, []) if _is_within_dedup_window(log.timestamp, timestamps[i])), None)
+        if existing is None and ATTENDANCE_DEDUP_SECONDS > 0:
+            existing = next((j for j, row in enumerate(rows) if row["user_id"] == event.user_id and _is_within_dedup_window(row["timestamp"], timestamps[i])), None)
+        if existing is not None:
+            duplicate_of.append((i, existing))
+            continue
+
+        rows.append({
+            "user_id": event.user_id,
+            "timestamp": timestamps[i],
+            "device_id": event.device_id,
+        })
+        row_files.append(event.file_index)
+
+    created = crud.create_attendance_batch(db, rows) if rows else []
+
+    # Evidence uploads run after the commit; each file is uploaded once
+    logs_by_file = {}
+    for log, file_index in zip(created, row_files):
+        if file_index is not None:
+            logs_by_file.setdefault(file_index, []).append(log)
+    for file_index, logs in logs_by_file.items():
+        _queue_log_image(db, [log.id for log in logs], logs[0].user_id, file_bytes[file_index], files[file_index].content_type)
+
+    for log in created:
+        _recent_attendance.set(log.user_id, (log.id, log.timestamp))
+    duplicates = [
+        {"index": i, "existing": created[existing] if isinstance(existing, int) else existing}
+        for i, existing in duplicate_of
+    ]
+    return {"created": created, "rejected": rejected, "duplicates": duplicates}
 
 @app.post("/attendance/", response_model=schemas.Attendance)
 def log_attendance(
+    response: Response,
     user_id: int = Form(...), 
     file: UploadFile = File(None),
+    timestamp: datetime = Form(None), # Client capture time (offline spool); server time if omitted
+    device_id: str = Form(None),
     db: Session = Depends(get_db),
     current_user = Depends(security.get_current_user) # AUTHENTICATED USERS ONLY
 ):
-    user = crud.get_user(db, user_id=user_id)
+    # Validate the evidence before anything is saved; it is uploaded after the commit
+    file_bytes = _read_upload_bytes(file) if file else None
+
+    # The user's row stays locked until this request commits (or returns a duplicate),
+    # so two kiosks posting the same person at once cannot both pass the check below
+    user = crud.get_user(db, user_id=user_id, for_update=ATTENDANCE_DEDUP_SECONDS > 0)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+
+    # Already logged within the dedup window: return that record (before any upload)
+    timestamp = _to_utc_naive(timestamp) or datetime.utcnow()
+    existing = _find_duplicate_attendance(db, user_id, timestamp)
+    if existing is not None:
+        response.headers["X-Attendance-Duplicate"] = "true"
+        return existing
         
-    screenshot_path = None
+    # The row is committed now; screenshot_path is filled in once the upload completes
+    db_attendance = crud.create_attendance(
+        db=db, user_id=user_id, timestamp=timestamp, device_id=device_id
+    )
+    _recent_attendance.set(user_id, (db_attendance.id, db_attendance.timestamp))
     if file:
-        # Save temp file first
-        temp_filename = f"temp_log_{user_id}_{file.filename}"
-        with open(temp_filename, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        try:
-            # Upload to Supabase
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            file_ext = os.path.splitext(file.filename)[1]
-            storage_path = f"{user_id}_{timestamp}{file_ext}"
-            
-            with open(temp_filename, "rb") as f:
-                file_bytes = f.read()
-                
-            supabase.storage.from_("logs").upload(storage_path, file_bytes, {"content-type": file.content_type})
-            screenshot_path = supabase.storage.from_("logs").get_public_url(storage_path)
-            
-        except Exception as e:
-            print(f"Supabase Log Upload Failed: {e}")
-            
-        finally:
-            if os.path.exists(temp_filename):
-                os.remove(temp_filename)
+        _queue_log_image(db, [db_attendance.id], user_id, file_bytes, file.content_type)
+    return db_attendance
 
-    return crud.create_attendance(db=db, user_id=user_id, screenshot_path=screenshot_path)
+def _parse_attendance_cursor(cursor: str):
+    """Cursor format is '<ISO timestamp>_<id>' (see X-Next-Cursor)."""
+    try:
+        ts, log_id = cursor.rsplit("_", 1)
+        return _to_utc_naive(datetime.fromisoformat(ts)), int(log_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @app.get("/attendance/", response_model=List[schemas.Attendance])
-def read_attendance(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_attendance_logs(db, skip=skip, limit=limit)
+def read_attendance(
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    start: datetime = None,
+    end: datetime = None,
+    user_id: int = None,
+    department: str = None,
+    status: str = None,
+    device_id: str = None,
+    cursor: str = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Attendance logs, newest first. Filter by time range (`start` inclusive,
+    `end` exclusive), user, department, status and device. Pass the
+    `X-Next-Cursor` response header back as `cursor` for the next page.
+    """
+    logs = crud.get_attendance_logs(
+        db,
+        skip=skip,
+        limit=limit,
+        start=_to_utc_naive(start),
+        end=_to_utc_naive(end),
+        user_id=user_id,
+        department=department,
+        status=status,
+        device_id=device_id,
+        before=_parse_attendance_cursor(cursor) if cursor else None
+    )
+    if len(logs) == limit:
+        response.headers["X-Next-Cursor"] = f"{logs[-1].timestamp.isoformat()}_{logs[-1].id}"
+    return logs
 
 @app.delete("/reset/")
 def reset_database(db: Session = Depends(get_db), admin_user = Depends(security.get_current_admin)):
@@ -273,9 +547,10 @@ def reset_database(db: Session = Depends(get_db), admin_user = Depends(security.
     DANGER: Deletes all users and attendance logs.
     """
     try:
-        db.query(models.AttendanceLog).delete()
-        db.query(models.User).delete()
-        db.commit()
+        crud.reset_all(db)
+        face_gallery.invalidate()
+        _recent_attendance.clear()
+        security.clear_auth_caches()
         return {"message": "All data has been reset."}
     except Exception as e:
         db.rollback()
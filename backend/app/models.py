@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, LargeBinary, Enum as SqlEnum, Text, Boolean
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, LargeBinary, Enum as SqlEnum, Text, Boolean, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -25,6 +25,7 @@ class User(Base):
     # Relationships
     encodings = relationship("FaceEncoding", back_populates="user", cascade="all, delete-orphan")
     attendance_logs = relationship("AttendanceLog", back_populates="user", cascade="all, delete-orphan")
+    daily_attendance = relationship("DailyAttendance", cascade="all, delete-orphan")
     
 
 
@@ -37,6 +38,19 @@ class FaceEncoding(Base):
     
     user = relationship("User", back_populates="encodings")
 
+class EncodingChange(Base):
+    """
+    Append-only change feed of face encodings for camera clients.
+    The row id is the sync cursor. No FKs: tombstones must outlive the rows they describe.
+    """
+    __tablename__ = "encoding_changes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    op = Column(String, nullable=False) # "add", "remove", "rename" or "reset"
+    encoding_id = Column(Integer, nullable=True)
+    user_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class AttendanceLog(Base):
     __tablename__ = "attendance"
 
@@ -44,10 +58,52 @@ class AttendanceLog(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     timestamp = Column(DateTime, default=datetime.utcnow)
     screenshot_path = Column(String, nullable=True)
+    thumbnail_path = Column(String, nullable=True) # Small preview for dashboard lists
     status = Column(String, default="Present") # New: e.g. Present, Late
+    device_id = Column(String, nullable=True) # Camera/kiosk that captured the event
     
     user = relationship("User", back_populates="attendance_logs")
 
+    # Serve per-user history and time-range listings without a table scan
+    # (created for existing databases by verify_and_migrate_db.py)
+    __table_args__ = (
+        Index("ix_attendance_user_id_timestamp", "user_id", "timestamp"),
+        Index("ix_attendance_timestamp", "timestamp"),
+    )
+
+
+# --- Attendance Rollups (maintained by crud on every insert; see backfill_rollups.py) ---
+class DailyAttendance(Base):
+    """One row per user per UTC day with any attendance."""
+    __tablename__ = "attendance_daily"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    department = Column(String, nullable=True) # User's department when first seen that day
+    first_seen = Column(DateTime)
+    last_seen = Column(DateTime)
+    events = Column(Integer, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "day", name="uq_attendance_daily_user_day"),
+        Index("ix_attendance_daily_department_day", "department", "day"),
+        Index("ix_attendance_daily_day", "day"), # Today's live counters
+    )
+
+class DepartmentDailyAttendance(Base):
+    """Distinct users present per department per UTC day."""
+    __tablename__ = "attendance_department_daily"
+
+    id = Column(Integer, primary_key=True, index=True)
+    department = Column(String, nullable=False)
+    day = Column(Date, nullable=False)
+    present = Column(Integer, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("department", "day", name="uq_attendance_department_daily"),
+    )
+
 
 class Announcement(Base):
     __tablename__ = "announcements"
@@ -0,0 +1,86 @@
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy.orm import Session
+from typing import Dict
+import base64
+from .. import crud, schemas, database, encoding_format
+from ..gallery import face_gallery
+
+router = APIRouter(
+    prefix="/encodings",
+    tags=["Encodings"],
+)
+
+@router.get("/changes", response_model=schemas.EncodingChangeFeed)
+def read_encoding_changes(
+    since: int = 0,
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Incremental sync for camera clients.
+    Returns encodings added/removed (and users renamed) after cursor `since`;
+    start from 0 for a full sync.
+    """
+    if since > crud.get_latest_encoding_cursor(db):
+        # Cursor from before a DB rebuild: tell the client to start over
+        return {"cursor": 0, "has_more": True, "changes": [{"cursor": 0, "op": "reset"}]}
+
+    rows = crud.get_encoding_changes(db, since=since, limit=limit)
+
+    changes = []
+    for change, face, name in rows:
+        if change.op == "add":
+            if face is None:
+                # Deleted since; the matching 'remove' is later in the feed
+                continue
+            enc_data = encoding_format.to_raw(face.encoding)
+            changes.append({
+                "cursor": change.id,
+                "op": "add",
+                "encoding_id": face.id,
+                "user_id": face.user_id,
+                "name": name,
+                "encoding": base64.b64encode(enc_data).decode('utf-8')
+            })
+        elif change.op == "rename":
+            if name is None:
+                # User deleted since; their 'remove' changes are later in the feed
+                continue
+            changes.append({
+                "cursor": change.id,
+                "op": "rename",
+                "user_id": change.user_id,
+                "name": name
+            })
+        else:
+            changes.append({
+                "cursor": change.id,
+                "op": change.op,
+                "encoding_id": change.encoding_id,
+                "user_id": change.user_id
+            })
+
+    cursor = rows[-1][0].id if rows else since
+    return {"cursor": cursor, "has_more": len(rows) == limit, "changes": changes}
+
+@router.get("/export")
+def export_encodings(db: Session = Depends(database.get_db)):
+    """
+    Bulk binary export of the whole gallery for bootstrapping a client.
+    The body is packed encoding_format.EXPORT_DTYPE records (id, user_id, 128 x float32),
+    readable with a single np.frombuffer. Continue with /changes?since=<X-Gallery-Cursor>.
+    """
+    records, cursor, _ = face_gallery.export_records(db)
+    return Response(
+        content=records.tobytes(),
+        media_type="application/octet-stream",
+        headers={
+            "X-Gallery-Cursor": str(cursor),
+            "X-Gallery-Count": str(len(records)),
+        }
+    )
+
+@router.get("/names", response_model=Dict[int, str])
+def read_encoding_names(db: Session = Depends(database.get_db)):
+    """Display names for every user in the gallery, keyed by user id."""
+    return face_gallery.refresh(db).names
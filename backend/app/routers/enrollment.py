@@ -0,0 +1,103 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, sessionmaker
+from typing import List
+import os
+import tempfile
+import zipfile
+from .. import schemas, security, database, enrollment
+
+router = APIRouter(
+    prefix="/enrollment",
+    tags=["Enrollment"],
+)
+
+def _too_large(what: str, limit: int):
+    return HTTPException(status_code=413, detail=f"{what} too large (max {limit // (1024 * 1024)} MB).")
+
+def _save_archive(archive: UploadFile, limit: int):
+    """Copies the archive to a temp file of at most `limit` bytes and returns its path."""
+    fd, path = tempfile.mkstemp(suffix=".zip")
+    size = 0
+    with os.fdopen(fd, "wb") as out:
+        while chunk := archive.file.read(1024 * 1024):
+            size += len(chunk)
+            if size > limit:
+                break
+            out.write(chunk)
+    if size > limit:
+        os.remove(path)
+        raise _too_large("Upload", enrollment.MAX_ENROLLMENT_BYTES)
+    return path
+
+@router.post("/jobs", response_model=schemas.EnrollmentJob, status_code=202)
+async def create_enrollment_job(
+    background_tasks: BackgroundTasks,
+    roster: UploadFile = File(...),
+    archive: UploadFile = File(None),
+    files: List[UploadFile] = File(None),
+    db: Session = Depends(database.get_db),
+    admin_user = Depends(security.get_current_admin)
+):
+    """
+    Bulk-enrolls a class roster. Restricted to Admins.
+    `roster` is a CSV (name, email, roll_number, department, role, photo);
+    photos come as a ZIP `archive` and/or loose `files`, matched by the `photo`
+    column or by `<roll_number>.jpg`. Poll GET /enrollment/jobs/{id} for progress.
+    """
+    if archive is None and not files:
+        raise HTTPException(status_code=400, detail="Upload photos as a ZIP archive or as files")
+
+    # 1. Parse the roster up front so format errors are reported immediately
+    roster_bytes = await roster.read(enrollment.MAX_ROSTER_BYTES + 1)
+    if len(roster_bytes) > enrollment.MAX_ROSTER_BYTES:
+        raise _too_large("Roster", enrollment.MAX_ROSTER_BYTES)
+    try:
+        rows = enrollment.parse_roster(roster_bytes)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid roster: {e}")
+    if not rows:
+        raise HTTPException(status_code=400, detail="Roster is empty")
+
+    # 2. Loose photos, each and all together within the limits
+    loose, total = {}, 0
+    for f in files or []:
+        data = await f.read(enrollment.MAX_PHOTO_BYTES + 1)
+        if len(data) > enrollment.MAX_PHOTO_BYTES:
+            raise _too_large(f"Photo '{f.filename}'", enrollment.MAX_PHOTO_BYTES)
+        total += len(data)
+        if total > enrollment.MAX_ENROLLMENT_BYTES:
+            raise _too_large("Upload", enrollment.MAX_ENROLLMENT_BYTES)
+        loose[f.filename] = data
+
+    # 3. Keep the archive on disk (uploads are closed once the response is sent)
+    archive_path = None
+    if archive is not None:
+        archive_path = await run_in_threadpool(_save_archive, archive, enrollment.MAX_ENROLLMENT_BYTES - total)
+        if not zipfile.is_zipfile(archive_path):
+            os.remove(archive_path)
+            raise HTTPException(status_code=400, detail="Archive is not a valid ZIP file")
+
+    # Entry count and unpacked size come from the ZIP directory, before anything is extracted
+    try:
+        photos = enrollment.PhotoSource(
+            archive_path=archive_path, files=loose,
+            max_unpacked_bytes=enrollment.MAX_ENROLLMENT_BYTES - total
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    # 4. Run in the background with its own session on the same database
+    job = enrollment.EnrollmentJob(total=len(rows))
+    enrollment.register_job(job)
+    session_factory = sessionmaker(bind=db.get_bind(), autocommit=False, autoflush=False)
+    background_tasks.add_task(enrollment.run_job, job, session_factory, rows, photos)
+
+    return job.to_dict()
+
+@router.get("/jobs/{job_id}", response_model=schemas.EnrollmentJob)
+def read_enrollment_job(job_id: str, admin_user = Depends(security.get_current_admin)):
+    job = enrollment.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Enrollment job not found")
+    return job.to_dict()
@@ -0,0 +1,77 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+import json
+from .. import crud, models, security, database, events
+
+router = APIRouter(
+    prefix="/events",
+    tags=["Events"],
+)
+
+def _is_student(user: models.User):
+    return user.role == models.UserRole.STUDENT
+
+def _view_for(user: models.User):
+    """
+    Students only see their own attendance, without the campus-wide counters;
+    every other role sees all of it.
+    """
+    if not _is_student(user):
+        return None
+    user_id = user.id
+
+    def view(event):
+        logs = [log for log in event.get("logs", []) if log["user_id"] == user_id]
+        if not logs:
+            return None
+        scoped = {key: value for key, value in event.items() if key != "counters"}
+        scoped["logs"] = logs
+        return scoped
+    return view
+
+def _format(event_type: str, data: dict):
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+@router.get("/attendance")
+async def attendance_stream(
+    request: Request,
+    db: Session = Depends(database.get_db),
+    user = Depends(security.get_stream_user)
+):
+    """
+    Server-sent events for dashboards, instead of re-fetching tables:
+    - `counters`: totals from the daily rollups, sent on connect (a student's own only)
+    - `attendance.created`: new logs (joined with their user) plus fresh counters
+      (students get their own logs and no counters)
+    - `attendance.evidence`: screenshot/thumbnail URLs once a background upload lands
+    - `resync`: this client fell behind and missed events; re-fetch once
+    """
+    view = _view_for(user)
+    counters = await run_in_threadpool(crud.get_live_counters, db, user_id=user.id if _is_student(user) else None)
+    db.close() # Don't hold a pooled connection for the life of the stream
+    subscription = events.broker.subscribe(view)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            yield _format("counters", counters)
+            while not await request.is_disconnected():
+                batch = await subscription.get(timeout=events.EVENT_KEEPALIVE_SECONDS)
+                if not batch:
+                    yield ": keep-alive\n\n"
+                    continue
+                if subscription.dropped:
+                    yield _format("resync", {"dropped": subscription.dropped})
+                    subscription.dropped = 0
+                for event in batch:
+                    yield _format(event["type"], event)
+        finally:
+            events.broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
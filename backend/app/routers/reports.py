@@ -0,0 +1,88 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List
+from datetime import date
+from .. import crud, models, schemas, security, database
+
+router = APIRouter(
+    prefix="/reports",
+    tags=["Reports"],
+)
+
+def _percentage(part: int, whole: int):
+    return round(100.0 * part / whole, 1) if whole else 0.0
+
+@router.get("/users/{user_id}", response_model=schemas.UserAttendanceReport)
+def user_report(
+    user_id: int,
+    start: date = None,
+    end: date = None,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(security.get_current_db_user)
+):
+    """
+    Days present vs. days the user's department took attendance, within
+    [start, end] (inclusive). Reads the daily rollups, not the raw logs.
+    Students may only read their own report.
+    """
+    if current_user.role == models.UserRole.STUDENT and current_user.id != user_id:
+        raise HTTPException(status_code=403, detail="Students can only view their own attendance")
+
+    user = crud.get_user(db, user_id=user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    days = crud.get_user_daily_attendance(db, user_id, start=start, end=end)
+    working_days = crud.count_department_days(db, department=user.department, start=start, end=end)
+    return {
+        "user_id": user.id,
+        "name": user.name,
+        "department": user.department,
+        "days_present": len(days),
+        "working_days": working_days,
+        "percentage": _percentage(len(days), working_days),
+        "days": days
+    }
+
+@router.get("/departments", response_model=List[schemas.DepartmentDayReport])
+def department_report(
+    department: str = None,
+    start: date = None,
+    end: date = None,
+    db: Session = Depends(database.get_db),
+    current_user = Depends(security.get_current_user)
+):
+    """Per department, per day: users present out of users enrolled."""
+    rows, enrolled = crud.get_department_daily_counts(db, department=department, start=start, end=end)
+    return [
+        {
+            "department": row.department,
+            "day": row.day,
+            "present": row.present,
+            "enrolled": enrolled.get(row.department, 0),
+            "percentage": _percentage(row.present, enrolled.get(row.department, 0))
+        }
+        for row in rows
+    ]
+
+@router.get("/departments/{department}/students", response_model=List[schemas.StudentAttendanceSummary])
+def department_students_report(
+    department: str,
+    start: date = None,
+    end: date = None,
+    db: Session = Depends(database.get_db),
+    current_user = Depends(security.get_current_user)
+):
+    """Attendance percentage of every user in a department (e.g. for a semester)."""
+    working_days = crud.count_department_days(db, department=department, start=start, end=end)
+    return [
+        {
+            "user_id": user.id,
+            "name": user.name,
+            "roll_number": user.roll_number,
+            "days_present": days_present,
+            "working_days": working_days,
+            "percentage": _percentage(days_present, working_days)
+        }
+        for user, days_present in crud.get_department_student_days(db, department, start=start, end=end)
+    ]
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
 
 # --- Constants ---
@@ -37,11 +37,32 @@ class Attendance(AttendanceBase):
     id: int
     timestamp: datetime
     screenshot_path: Optional[str] = None
+    thumbnail_path: Optional[str] = None
     status: str = "Present"
+    device_id: Optional[str] = None
 
     class Config:
         from_attributes = True
 
+class AttendanceEvent(AttendanceBase):
+    timestamp: Optional[datetime] = None # Client capture time; server time if omitted
+    device_id: Optional[str] = None
+    file_index: Optional[int] = None # Index into the uploaded evidence files
+
+class AttendanceBatchError(BaseModel):
+    index: int
+    user_id: Optional[int] = None
+    detail: str
+
+class AttendanceDuplicate(BaseModel):
+    index: int
+    existing: Attendance # Record already logged within the dedup window
+
+class AttendanceBatchResult(BaseModel):
+    created: List[Attendance]
+    rejected: List[AttendanceBatchError] = []
+    duplicates: List[AttendanceDuplicate] = []
+
 # --- User Schemas ---
 class UserBase(BaseModel):
     name: str
@@ -70,3 +91,84 @@ class FaceEncoding(BaseModel):
 
 class UserWithEncodings(User):
     encodings: List[FaceEncoding] = []
+
+# --- Recognition Schemas ---
+class RecognizeRequest(BaseModel):
+    encodings: List[List[float]] # One 128-d face embedding per detected face
+    tolerance: float = 0.5
+    unique: bool = True # Faces of one frame: never match two of them to the same user
+
+class RecognizeMatch(BaseModel):
+    user_id: Optional[int] = None
+    name: Optional[str] = None
+    distance: Optional[float] = None
+    matched: bool = False
+
+class RecognizeResponse(BaseModel):
+    matches: List[RecognizeMatch]
+
+# --- Encoding Sync Schemas ---
+class EncodingChange(BaseModel):
+    cursor: int
+    op: str # "add", "remove", "rename" or "reset"
+    encoding_id: Optional[int] = None
+    user_id: Optional[int] = None
+    name: Optional[str] = None # For "add" and "rename"
+    encoding: Optional[str] = None # base64, only for "add"
+
+class EncodingChangeFeed(BaseModel):
+    cursor: int # Pass back as `since` on the next call
+    has_more: bool
+    changes: List[EncodingChange]
+
+# --- Bulk Enrollment Schemas ---
+class EnrollmentRowError(BaseModel):
+    row: int # 1-based roster row (0 = the whole job)
+    roll_number: Optional[str] = None
+    email: Optional[str] = None
+    detail: str
+
+class EnrollmentJob(BaseModel):
+    id: str
+    status: str # "queued", "running", "completed" or "failed"
+    total: int
+    processed: int
+    succeeded: int
+    failed: int
+    errors: List[EnrollmentRowError] = []
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+# --- Attendance Report Schemas ---
+class DailyPresence(BaseModel):
+    day: date
+    first_seen: datetime
+    last_seen: datetime
+    events: int
+
+    class Config:
+        from_attributes = True
+
+class UserAttendanceReport(BaseModel):
+    user_id: int
+    name: str
+    department: Optional[str] = None
+    days_present: int
+    working_days: int # Days the user's department took attendance
+    percentage: float
+    days: List[DailyPresence] = []
+
+class DepartmentDayReport(BaseModel):
+    department: str
+    day: date
+    present: int
+    enrolled: int
+    percentage: float
+
+class StudentAttendanceSummary(BaseModel):
+    user_id: int
+    name: str
+    roll_number: Optional[str] = None
+    days_present: int
+    working_days: int
+    percentage: float
@@ -1,32 +1,101 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
+import os
+import time
+import jwt
 from .supabase_client import supabase
+from .cache import TTLCache
 from . import crud, database, models
 
 # Scheme for "Bearer <token>" header
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+# --- Local Token Verification ---
+# With SUPABASE_JWT_SECRET (HS256 project secret) or SUPABASE_JWKS_URL (asymmetric
+# signing keys) set, tokens are verified in-process instead of calling Supabase Auth.
+SUPABASE_JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET")
+SUPABASE_JWKS_URL = os.environ.get("SUPABASE_JWKS_URL")
+SUPABASE_JWT_AUDIENCE = os.environ.get("SUPABASE_JWT_AUDIENCE", "authenticated")
+AUTH_CACHE_SECONDS = int(os.environ.get("AUTH_CACHE_SECONDS", "60"))
+
+# token -> (user, expiry epoch or None)
+_token_cache = TTLCache(maxsize=10000, ttl=AUTH_CACHE_SECONDS)
+# email -> User column values; invalidated by invalidate_user() on update/delete
+_db_user_cache = TTLCache(maxsize=10000, ttl=AUTH_CACHE_SECONDS * 5)
+_jwks_client = None
+
+
+class TokenUser:
+    """Identity from a locally verified JWT (the fields we use from Supabase's User)."""
+
+    def __init__(self, claims: dict):
+        self.id = claims.get("sub")
+        self.email = claims.get("email")
+        self.role = claims.get("role")
+        self.claims = claims
+
+
+def _get_jwks_client():
+    global _jwks_client
+    if _jwks_client is None:
+        _jwks_client = jwt.PyJWKClient(SUPABASE_JWKS_URL, cache_keys=True)
+    return _jwks_client
+
+def load_signing_keys():
+    """Fetches the JWKS at startup so the first request doesn't pay for it."""
+    if SUPABASE_JWT_SECRET or not SUPABASE_JWKS_URL:
+        return
+    try:
+        _get_jwks_client().get_jwk_set()
+        print("[INFO] Loaded JWT signing keys")
+    except Exception as e:
+        print(f"[WARN] Could not load JWT signing keys: {e}")
+
+def _verify_token(token: str):
+    """Returns (user, expiry) for a valid token; raises on an invalid one."""
+    if SUPABASE_JWT_SECRET:
+        claims = jwt.decode(token, SUPABASE_JWT_SECRET, algorithms=["HS256"], audience=SUPABASE_JWT_AUDIENCE)
+        return TokenUser(claims), claims.get("exp")
+    if SUPABASE_JWKS_URL:
+        key = _get_jwks_client().get_signing_key_from_jwt(token).key
+        claims = jwt.decode(token, key, algorithms=["RS256", "ES256"], audience=SUPABASE_JWT_AUDIENCE)
+        return TokenUser(claims), claims.get("exp")
+
+    # No local key configured: Supabase-py 'get_user' verifies the token against the project
+    user_response = supabase.auth.get_user(token)
+    if not user_response or not user_response.user:
+        raise ValueError("Invalid authentication credentials")
+    return user_response.user, None
+
+def invalidate_user(email: str):
+    """Drops a cached DB user after it is updated or deleted."""
+    if email:
+        _db_user_cache.pop(email)
+
+def clear_auth_caches():
+    _token_cache.clear()
+    _db_user_cache.clear()
+
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """
     Validates the JWT token sent in the Authorization header.
-    Returns the user object from Supabase Auth if valid.
+    Returns the authenticated user (Supabase User or TokenUser) if valid.
     """
-    token = credentials.credentials
+    return authenticate_token(credentials.credentials)
+
+def authenticate_token(token: str):
+    cached = _token_cache.get(token)
+    if cached is not None:
+        user, expires_at = cached
+        if expires_at is None or expires_at > time.time():
+            return user
+        _token_cache.pop(token)
     
     try:
-        # Supabase-py 'get_user' verifies the token against the project
-        user_response = supabase.auth.get_user(token)
-        
-        if not user_response or not user_response.user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-            
-        return user_response.user
-        
+        user, expires_at = _verify_token(token)
     except Exception as e:
         print(f"Auth Error: {e}")
         raise HTTPException(
@@ -35,6 +104,9 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    _token_cache.set(token, (user, expires_at))
+    return user
+
 def get_current_db_user(
     token_user = Depends(get_current_user), 
     db: Session = Depends(database.get_db)
@@ -44,12 +116,38 @@ def get_current_db_user(
     """
     if not token_user.email:
         raise HTTPException(status_code=400, detail="Token missing email")
+
+    cached = _db_user_cache.get(token_user.email)
+    if cached is not None:
+        # Re-attach a copy to this session without a SELECT
+        user = models.User(**cached)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
         
     user = crud.get_user_by_email(db, email=token_user.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found in local DB")
+    _db_user_cache.set(token_user.email, {c.key: getattr(user, c.key) for c in models.User.__table__.columns})
     return user
 
+def get_stream_user(
+    access_token: str = None,
+    credentials: HTTPAuthorizationCredentials = Depends(optional_security),
+    db: Session = Depends(database.get_db)
+):
+    """
+    DB user for event streams. Browsers' EventSource can't set headers, so the
+    token may also come as the `access_token` query parameter.
+    """
+    token = credentials.credentials if credentials else access_token
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return get_current_db_user(token_user=authenticate_token(token), db=db)
+
 def get_current_faculty(user: models.User = Depends(get_current_db_user)):
     if user.role not in [models.UserRole.FACULTY, models.UserRole.ADMIN]:
         raise HTTPException(
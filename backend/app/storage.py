@@ -0,0 +1,154 @@
+"""
+Image storage for profile photos ("faces") and attendance evidence ("logs").
+
+Two backends, picked with STORAGE_BACKEND:
+- "supabase": Supabase Storage buckets (default when Supabase is configured)
+- "local": files under LOCAL_STORAGE_DIR, served by the API at /media
+
+Requests hand uploads to `upload_worker` and return right away; the worker
+uploads with retries and calls `on_done(url)` so the caller can fill the URL
+into its DB row once the object actually exists.
+"""
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from .supabase_client import supabase
+
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "supabase" if supabase is not None else "local")
+LOCAL_STORAGE_DIR = os.environ.get("LOCAL_STORAGE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "media"))
+MEDIA_URL_PATH = "/media"
+PUBLIC_BASE_URL = os.environ.get("PUBLIC_BASE_URL", "http://127.0.0.1:8000").rstrip("/")
+STORAGE_UPLOAD_WORKERS = int(os.environ.get("STORAGE_UPLOAD_WORKERS", "2"))
+STORAGE_QUEUE_SIZE = int(os.environ.get("STORAGE_QUEUE_SIZE", "1000"))
+STORAGE_MAX_ATTEMPTS = 3
+
+
+class LocalStorage:
+    def __init__(self, root: str = LOCAL_STORAGE_DIR, base_url: str = PUBLIC_BASE_URL + MEDIA_URL_PATH):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def upload(self, bucket: str, path: str, data: bytes, content_type: str = None):
+        full_path = os.path.join(self.root, bucket, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # Write then rename so a reader never sees a partial file
+        tmp_path = f"{full_path}.part"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, full_path)
+        return f"{self.base_url}/{bucket}/{path}"
+
+
+class SupabaseStorage:
+    def __init__(self, client):
+        self.client = client
+
+    def upload(self, bucket: str, path: str, data: bytes, content_type: str = None):
+        self.client.storage.from_(bucket).upload(path, data, {"content-type": content_type or "image/jpeg"})
+        return self.client.storage.from_(bucket).get_public_url(path)
+
+
+def make_storage(backend: str = STORAGE_BACKEND):
+    if backend == "local":
+        return LocalStorage()
+    if backend == "supabase":
+        if supabase is None:
+            raise ValueError("STORAGE_BACKEND=supabase needs SUPABASE_URL and SUPABASE_KEY")
+        return SupabaseStorage(supabase)
+    raise ValueError(f"Unknown STORAGE_BACKEND '{backend}'")
+
+def object_name(prefix, filename: str = None, default_ext: str = ".jpg"):
+    """Unique object name: <prefix>_<YYYYmmddHHMMSS>_<8 hex><ext>."""
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    file_ext = os.path.splitext(filename or "")[1] or default_ext
+    return f"{prefix}_{timestamp}_{uuid.uuid4().hex[:8]}{file_ext}"
+
+
+class UploadWorker:
+    """Background uploader: a bounded queue of tasks drained by a few daemon threads."""
+
+    def __init__(self, storage, workers: int = STORAGE_UPLOAD_WORKERS, queue_size: int = STORAGE_QUEUE_SIZE):
+        self.storage = storage
+        self.workers = max(1, workers)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Started lazily so importing the app (tests, scripts) doesn't spawn threads
+        with self._lock:
+            if self._threads:
+                return
+            for _ in range(self.workers):
+                thread = threading.Thread(target=self._run, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def upload(self, bucket: str, path: str, data: bytes, content_type: str = None):
+        """Uploads with retries (call from a task). Returns the URL; raises after the last attempt."""
+        for attempt in range(STORAGE_MAX_ATTEMPTS):
+            try:
+                return self.storage.upload(bucket, path, data, content_type)
+            except Exception:
+                if attempt == STORAGE_MAX_ATTEMPTS - 1:
+                    raise
+                time.sleep(0.5 * 2 ** attempt)
+
+    def run(self, task):
+        """
+        Queues `task()` (which typically calls upload()) for a worker thread.
+        When the queue is full the task runs in the caller's thread, so async
+        endpoints must call this through run_in_threadpool.
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            # Backpressure: storage can't keep up, so this request pays for its own upload
+            self._execute(task)
+
+    def submit(self, bucket: str, path: str, data: bytes, content_type: str = None, on_done=None):
+        """Queues one upload; `on_done(url)` runs on the worker after it succeeds."""
+        def task():
+            url = self.upload(bucket, path, data, content_type)
+            if on_done is not None:
+                on_done(url)
+        self.run(task)
+
+    def _execute(self, task):
+        try:
+            task()
+        except Exception as e:
+            print(f"[ERROR] Background upload failed: {e}")
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    return
+                self._execute(task)
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """Blocks until every queued upload has finished."""
+        self._queue.join()
+
+    def shutdown(self, timeout: float = 10.0):
+        """Finishes queued uploads (up to `timeout`), then stops the threads."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
+
+
+storage = make_storage()
+upload_worker = UploadWorker(storage)
@@ -7,7 +7,10 @@ load_dotenv()
 url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")
 
-if not url or not key:
-    raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env")
-
-supabase: Client = create_client(url, key)
+# Optional: without credentials the API runs offline (local storage, local JWT
+# verification via SUPABASE_JWT_SECRET); anything needing Supabase then fails.
+supabase: Client = None
+if url and key:
+    supabase = create_client(url, key)
+else:
+    print("[WARN] SUPABASE_URL/SUPABASE_KEY not set; running without Supabase")
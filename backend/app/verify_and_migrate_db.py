@@ -2,6 +2,12 @@ from sqlalchemy import create_engine, text, inspect
 import os
 from dotenv import load_dotenv
 
+try:
+    from .encoding_format import is_legacy, to_raw
+except ImportError:
+    # Run directly as a script
+    from encoding_format import is_legacy, to_raw
+
 # Load env vars
 load_dotenv()
 
@@ -55,6 +61,97 @@ def run_migration():
                 
         # 5. Add 'email' if missing (it was added in previous session, but good to double check)
 
+    # 6. Add 'device_id' to attendance if missing
+    if inspector.has_table("attendance"):
+        attendance_columns = [col['name'] for col in inspector.get_columns("attendance")]
+        if 'device_id' not in attendance_columns:
+            print("Adding 'attendance.device_id' column...")
+            with engine.connect() as conn:
+                try:
+                    if 'sqlite' in DATABASE_URL:
+                        conn.execute(text("ALTER TABLE attendance ADD COLUMN device_id VARCHAR"))
+                    else:
+                        conn.execute(text("ALTER TABLE attendance ADD COLUMN IF NOT EXISTS device_id VARCHAR"))
+                    conn.commit()
+                    print("Added 'device_id'.")
+                except Exception as e:
+                    print(f"Failed to add 'device_id': {e}")
+
+    # 7. Seed the encoding change feed with encodings enrolled before it existed
+    if inspector.has_table("encoding_changes") and inspector.has_table("face_encodings"):
+        with engine.connect() as conn:
+            try:
+                result = conn.execute(text(
+                    "INSERT INTO encoding_changes (op, encoding_id, user_id, created_at) "
+                    "SELECT 'add', f.id, f.user_id, CURRENT_TIMESTAMP FROM face_encodings f "
+                    "WHERE NOT EXISTS (SELECT 1 FROM encoding_changes c WHERE c.op = 'add' AND c.encoding_id = f.id) "
+                    "ORDER BY f.id"
+                ))
+                conn.commit()
+                print(f"Backfilled {result.rowcount} encoding change(s).")
+            except Exception as e:
+                print(f"Failed to backfill encoding changes: {e}")
+
+    # 8. Convert pickled face encodings to the raw float32 format
+    if inspector.has_table("face_encodings"):
+        converted, failed = 0, 0
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT id, encoding FROM face_encodings")).fetchall()
+            for enc_id, data in rows:
+                if data is None or not is_legacy(bytes(data)):
+                    continue
+                try:
+                    conn.execute(
+                        text("UPDATE face_encodings SET encoding = :enc WHERE id = :id"),
+                        {"enc": to_raw(bytes(data)), "id": enc_id}
+                    )
+                    converted += 1
+                except Exception as e:
+                    print(f"Failed to convert encoding {enc_id}: {e}")
+                    failed += 1
+            conn.commit()
+        print(f"Converted {converted} legacy encoding(s) to float32 ({failed} failed).")
+
+    # 9. Indexes for filtered attendance queries (per-user history, time ranges)
+    if inspector.has_table("attendance"):
+        with engine.connect() as conn:
+            for name, columns in [
+                ("ix_attendance_user_id_timestamp", "user_id, timestamp"),
+                ("ix_attendance_timestamp", "timestamp"),
+            ]:
+                try:
+                    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON attendance ({columns})"))
+                    conn.commit()
+                    print(f"Verified index '{name}'.")
+                except Exception as e:
+                    print(f"Failed to create index '{name}': {e}")
+
+    # 10. Add 'thumbnail_path' to attendance if missing
+    if inspector.has_table("attendance"):
+        attendance_columns = [col['name'] for col in inspector.get_columns("attendance")]
+        if 'thumbnail_path' not in attendance_columns:
+            print("Adding 'attendance.thumbnail_path' column...")
+            with engine.connect() as conn:
+                try:
+                    if 'sqlite' in DATABASE_URL:
+                        conn.execute(text("ALTER TABLE attendance ADD COLUMN thumbnail_path VARCHAR"))
+                    else:
+                        conn.execute(text("ALTER TABLE attendance ADD COLUMN IF NOT EXISTS thumbnail_path VARCHAR"))
+                    conn.commit()
+                    print("Added 'thumbnail_path'.")
+                except Exception as e:
+                    print(f"Failed to add 'thumbnail_path': {e}")
+
+    # 11. Index for the live counters (today's rollup rows)
+    if inspector.has_table("attendance_daily"):
+        with engine.connect() as conn:
+            try:
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_attendance_daily_day ON attendance_daily (day)"))
+                conn.commit()
+                print("Verified index 'ix_attendance_daily_day'.")
+            except Exception as e:
+                print(f"Failed to create index 'ix_attendance_daily_day': {e}")
+
     # Check for new tables
     all_tables = inspector.get_table_names()
     print(f"All tables in DB: {all_tables}")
@@ -0,0 +1,314 @@
+"""
+Offline load test for the API hot paths.
+
+    python backend/scripts/load_test.py --requests 500 --concurrency 16
+    python backend/scripts/load_test.py --check          # exit 1 if a query budget is exceeded
+
+The app runs in-process (httpx ASGI transport) against a throwaway SQLite
+file, with auth stubbed out and storage writing to a temp directory, so no
+Supabase or network is needed. Per endpoint it reports throughput, latency
+percentiles, SQL statements per request (an N+1 shows up as a count that
+grows with the seeded data) and event-loop lag (blocking work inside an
+async endpoint shows up as lag spikes).
+"""
+import argparse
+import asyncio
+import contextvars
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Most SQL statements one request may run, whatever the data size
+QUERY_BUDGETS = {
+    "POST /attendance/": 16, # 9, or 15 when a concurrent rollup insert forces the one retry
+    "GET /users/": 2,
+    "POST /users/": 5,
+    "GET /announcements/": 1,
+}
+
+# The request a statement belongs to (propagates into threadpool endpoints)
+_request_queries = contextvars.ContextVar("request_queries", default=None)
+
+
+class QueryCounter:
+    """Counts SQL statements per request on an engine."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.unattributed = 0 # Background work, e.g. upload callbacks
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        counter = _request_queries.get()
+        if counter is None:
+            self.unattributed += 1
+        else:
+            counter[0] += 1
+
+    def __enter__(self):
+        from sqlalchemy import event
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic timer fires: the event loop was blocked meanwhile."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.lags_ms = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags_ms.append(max(0.0, (time.perf_counter() - start - self.interval) * 1000))
+
+    def start(self):
+        self.lags_ms = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return self.lags_ms
+
+
+def _percentiles(values):
+    if not values:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    values = np.asarray(values)
+    return {
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+class Scenario:
+    """One endpoint under load. `make_request(i)` returns httpx request kwargs."""
+
+    def __init__(self, name, method, url, make_request, requests):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.make_request = make_request
+        self.requests = requests
+
+
+async def run_scenario(client, scenario, concurrency):
+    latencies, queries, statuses = [], [], {}
+    next_index = iter(range(scenario.requests))
+
+    async def worker():
+        for i in next_index:
+            counter = [0]
+            token = _request_queries.set(counter)
+            start = time.perf_counter()
+            try:
+                response = await client.request(scenario.method, scenario.url, **scenario.make_request(i))
+            finally:
+                _request_queries.reset(token)
+            latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(counter[0])
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(max(1, concurrency))])
+    elapsed = time.perf_counter() - start
+    lags = await monitor.stop()
+
+    return {
+        "requests": scenario.requests,
+        "concurrency": concurrency,
+        "throughput_rps": scenario.requests / elapsed if elapsed else 0.0,
+        "latency_ms": _percentiles(latencies),
+        "queries_per_request": {"mean": float(np.mean(queries)) if queries else 0.0, "max": max(queries, default=0)},
+        "loop_lag_ms": _percentiles(lags),
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+async def run_load_test(app, engine, scenarios, concurrency):
+    import httpx
+
+    report = {}
+    with QueryCounter(engine) as counter:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            for scenario in scenarios:
+                print(f"[INFO] {scenario.name}: {scenario.requests} requests, concurrency {concurrency}...")
+                report[scenario.name] = await run_scenario(client, scenario, concurrency)
+    report["_background_queries"] = counter.unattributed
+    return report
+
+
+def check_budgets(report, budgets=QUERY_BUDGETS):
+    """Returns a list of violations: endpoints whose worst request ran too many statements."""
+    violations = []
+    for name, budget in budgets.items():
+        result = report.get(name)
+        if result and result["queries_per_request"]["max"] > budget:
+            violations.append(f"{name}: {result['queries_per_request']['max']} queries per request (budget {budget})")
+    return violations
+
+
+# --- Environment: stubs, seed data and scenarios ---
+def _face_image_bytes(side=256):
+    import cv2
+    image = cv2.imread(os.path.join(ROOT, "test_face.jpg"))
+    if image is None:
+        raise SystemExit("[ERROR] test_face.jpg not found (needed for POST /users/)")
+    return cv2.imencode(".jpg", cv2.resize(image, (side, side)))[1].tobytes()
+
+
+def install_stubs(app, session_factory, media_dir):
+    """
+    Points the app at `session_factory`, replaces auth with fixed users and
+    storage with a local directory. Returns a function that undoes it.
+    """
+    from backend.app import main, database, security, storage, models
+
+    def get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    admin = type("User", (), {"id": 0, "email": "loadtest-admin@example.com", "role": models.UserRole.ADMIN})()
+    overrides = {
+        main.get_db: get_db,
+        database.get_db: get_db,
+        security.get_current_user: lambda: admin,
+        security.get_current_db_user: lambda: admin,
+        security.get_current_admin: lambda: admin,
+    }
+    saved = dict(app.dependency_overrides)
+    saved_storage = storage.upload_worker.storage
+    app.dependency_overrides.update(overrides)
+    storage.upload_worker.storage = storage.LocalStorage(media_dir, "http://loadtest/media")
+
+    def restore():
+        storage.upload_worker.join()
+        storage.upload_worker.storage = saved_storage
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(saved)
+    return restore
+
+
+def seed(session_factory, users, announcements=20):
+    """Adds `users` users (one encoding each) and some announcements. Returns their ids."""
+    from backend.app import crud, schemas, encoding_format
+
+    rng = np.random.default_rng(0)
+    run = time.time_ns()
+    entries = [
+        (schemas.UserCreate(name=f"Load Test {i}", email=f"load-{run}-{i}@example.com",
+                            roll_number=f"LT-{run}-{i}", department=f"Dept {i % 10}"),
+         encoding_format.encode(rng.normal(scale=0.1, size=128).astype(np.float32)))
+        for i in range(users)
+    ]
+    with session_factory() as db:
+        created = crud.bulk_create_users(db, entries)
+        user_ids = [u.id for u in created]
+        for i in range(announcements):
+            crud.create_announcement(db, schemas.AnnouncementCreate(title=f"Notice {i}", content="Load test"))
+    return user_ids
+
+
+def default_scenarios(user_ids, requests, enroll_requests):
+    face = _face_image_bytes()
+    run = time.time_ns()
+    return [
+        Scenario("POST /attendance/", "POST", "/attendance/",
+                 lambda i: {"data": {"user_id": user_ids[i % len(user_ids)], "device_id": "load-test"}}, requests),
+        Scenario("GET /users/", "GET", "/users/", lambda i: {"params": {"limit": 100}}, requests),
+        Scenario("GET /announcements/", "GET", "/announcements/", lambda i: {}, requests),
+        Scenario("POST /users/", "POST", "/users/",
+                 lambda i: {"data": {"name": f"Enrolled {i}", "email": f"enrolled-{run}-{i}@example.com"},
+                            "files": {"file": ("face.jpg", io.BytesIO(face), "image/jpeg")}}, enroll_requests),
+    ]
+
+
+def print_report(report):
+    print(f"\n{'endpoint':<22}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'lag max':>9}  status")
+    for name, r in report.items():
+        if name.startswith("_"):
+            continue
+        print(f"{name:<22}{r['throughput_rps']:>9.1f}{r['latency_ms']['p50']:>9.1f}{r['latency_ms']['p95']:>9.1f}"
+              f"{r['latency_ms']['p99']:>9.1f}{r['queries_per_request']['max']:>9}{r['loop_lag_ms']['max']:>9.1f}  {r['status_codes']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--enroll-requests", type=int, default=20, help="POST /users/ requests (each encodes a face)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=1000, help="Users seeded before the run")
+    parser.add_argument("--check", action="store_true", help="Exit 1 when a query budget is exceeded")
+    parser.add_argument("--max-loop-lag-ms", type=float, default=0, help="With --check, also fail above this lag (0 = off)")
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+
+    # A throwaway database and media directory, set before the app is imported
+    workdir = tempfile.mkdtemp(prefix="loadtest_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'loadtest.db')}"
+    os.environ.setdefault("STORAGE_BACKEND", "local")
+    sys.path.insert(0, ROOT)
+
+    from sqlalchemy.orm import sessionmaker
+    from backend.app.main import app
+    from backend.app import database
+
+    session_factory = sessionmaker(bind=database.engine, autocommit=False, autoflush=False)
+    restore = install_stubs(app, session_factory, os.path.join(workdir, "media"))
+    try:
+        print(f"[INFO] Seeding {args.users} users into {os.environ['DATABASE_URL']}...")
+        user_ids = seed(session_factory, args.users)
+        scenarios = default_scenarios(user_ids, args.requests, args.enroll_requests)
+        report = asyncio.run(run_load_test(app, database.engine, scenarios, args.concurrency))
+    finally:
+        restore()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[SUCCESS] Report written to {args.output}")
+
+    if args.check:
+        violations = check_budgets(report)
+        if args.max_loop_lag_ms:
+            violations += [
+                f"{name}: event loop blocked for {r['loop_lag_ms']['max']:.0f}ms"
+                for name, r in report.items()
+                if not name.startswith("_") and r["loop_lag_ms"]["max"] > args.max_loop_lag_ms
+            ]
+        for violation in violations:
+            print(f"[ERROR] {violation}")
+        if violations:
+            sys.exit(1)
+        print("[SUCCESS] All endpoints within their query budgets.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,48 @@
 
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from datetime import datetime, timedelta
+from pathlib import Path
 import pytest
 import os
 import io
+import sys
+import json
+import time
+import queue
+import threading
+import base64
+import pickle
+import asyncio
+import zipfile
 import cv2
+import jwt
 import numpy as np
 
 # Import app components 
 # (Adjust imports based on where this file is located relative to app)
 from backend.app.main import app, get_db
 from backend.app.database import Base
-from backend.app import security
+from backend.app import security, database
+from backend.app import crud, schemas, models, encoding_format, face_index, storage, imaging, enrollment
+from backend.app import main as app_main
+from backend.app import events as app_events
+from backend.app.gallery import face_gallery, FaceGallery
+from backend.app.encoding_pool import encoding_pool
+from backend.app.routers import events as events_router
+from backend.scripts import load_test
+
+# Client modules import each other by bare name (see client/pipeline.py)
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "client"))
+import detectors
+import motion
+import pipeline
+import tracker
+import uploader
 
 # --- SETUP MOCK DB (SQLite In-Memory) ---
 SQLALCHEMY_DATABASE_URL = "sqlite://"
@@ -41,6 +70,7 @@ def override_get_current_user():
 
 # Apply Overrides
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[database.get_db] = override_get_db
 app.dependency_overrides[security.get_current_admin] = override_get_current_admin
 app.dependency_overrides[security.get_current_user] = override_get_current_user
 
@@ -89,3 +119,1035 @@ def test_get_users_empty():
 # Note: We cannot test "Success" paths easily without a real face image 
 # and dlib installed. But testing the failure path confirms the 
 # logic (Auth -> Upload -> Face Check) is executing in order.
+
+# --- RECOGNITION ---
+def test_recognize_batch():
+    db = TestingSessionLocal()
+    rng = np.random.default_rng(0)
+    alice_enc = rng.normal(size=128)
+    bob_enc = rng.normal(size=128)
+    alice = crud.create_user(db, schemas.UserCreate(name="Alice", email="alice@example.com"), encoding_format.encode(alice_enc))
+    bob = crud.create_user(db, schemas.UserCreate(name="Bob", email="bob@example.com"), encoding_format.encode(bob_enc))
+    alice_id, bob_id = alice.id, bob.id
+    db.close()
+    face_gallery.invalidate()
+
+    queries = [bob_enc + 0.01, alice_enc, rng.normal(size=128)]
+    response = client.post("/recognize", json={"encodings": [q.tolist() for q in queries]})
+    assert response.status_code == 200
+    matches = response.json()["matches"]
+
+    assert [m["matched"] for m in matches] == [True, True, False]
+    assert matches[0]["user_id"] == bob_id and matches[0]["name"] == "Bob"
+    assert matches[1]["user_id"] == alice_id
+    assert matches[1]["distance"] < 1e-3
+
+    response = client.post("/recognize", json={"encodings": [[0.0] * 10]})
+    assert response.status_code == 400
+
+    client.delete(f"/users/{alice_id}")
+    client.delete(f"/users/{bob_id}")
+
+# --- ENCODING CHANGE FEED ---
+def test_encoding_changes_feed():
+    start = client.get("/encodings/changes", params={"since": 0}).json()["cursor"]
+
+    db = TestingSessionLocal()
+    carol = crud.create_user(db, schemas.UserCreate(name="Carol", email="carol@example.com"), encoding_format.encode(np.ones(128)))
+    carol_id = carol.id
+    extra = crud.add_face_to_user(db, carol_id, pickle.dumps(np.zeros(128))) # legacy row
+    extra_id = extra.id
+    db.close()
+
+    feed = client.get("/encodings/changes", params={"since": start}).json()
+    assert [c["op"] for c in feed["changes"]] == ["add", "add"]
+    assert feed["changes"][0]["name"] == "Carol"
+    # Legacy pickled rows are served in the raw float32 format
+    assert len(base64.b64decode(feed["changes"][1]["encoding"])) == encoding_format.ENCODING_NBYTES
+    cursor = feed["cursor"]
+
+    # Renames reach kiosks too, so their gallery labels stay current
+    client.put(f"/users/{carol_id}", data={"name": "Caroline"})
+    feed = client.get("/encodings/changes", params={"since": cursor}).json()
+    assert [(c["op"], c["user_id"], c["name"]) for c in feed["changes"]] == [("rename", carol_id, "Caroline")]
+    cursor = feed["cursor"]
+
+    client.delete(f"/users/{carol_id}")
+    feed = client.get("/encodings/changes", params={"since": cursor}).json()
+    removed = [c for c in feed["changes"] if c["op"] == "remove"]
+    assert {c["encoding_id"] for c in removed} >= {extra_id}
+    assert len(removed) == 2
+    assert not feed["has_more"]
+
+    # Replaying from an earlier cursor skips adds that have since been deleted
+    feed = client.get("/encodings/changes", params={"since": start}).json()
+    assert [c["op"] for c in feed["changes"]] == ["remove", "remove"]
+
+    client.delete("/reset/")
+    feed = client.get("/encodings/changes", params={"since": feed["cursor"]}).json()
+    assert [c["op"] for c in feed["changes"]] == ["reset"]
+
+    # A cursor from the future (e.g. after a DB rebuild) forces a full re-sync
+    feed = client.get("/encodings/changes", params={"since": feed["cursor"] + 100}).json()
+    assert feed["cursor"] == 0 and feed["changes"][0]["op"] == "reset"
+
+
+# --- BINARY EXPORT ---
+def test_export_encodings_binary():
+    db = TestingSessionLocal()
+    dave = crud.create_user(db, schemas.UserCreate(name="Dave", email="dave@example.com"), encoding_format.encode(np.full(128, 0.25)))
+    dave_id = dave.id
+    db.close()
+    face_gallery.invalidate()
+
+    response = client.get("/encodings/export")
+    assert response.status_code == 200
+    records = np.frombuffer(response.content, dtype=encoding_format.EXPORT_DTYPE)
+    assert int(response.headers["X-Gallery-Count"]) == len(records) == 1
+    assert records["user_id"][0] == dave_id
+    assert np.allclose(records["encoding"][0], 0.25)
+
+    assert client.get("/encodings/names").json() == {str(dave_id): "Dave"}
+
+    # Nothing happened after the export cursor
+    cursor = response.headers["X-Gallery-Cursor"]
+    assert client.get("/encodings/changes", params={"since": cursor}).json()["changes"] == []
+
+    client.delete(f"/users/{dave_id}")
+
+
+# --- SEARCH INDEX ---
+def test_ivf_index_matches_exact_search():
+    rng = np.random.default_rng(1)
+    people = rng.normal(scale=0.1, size=(500, 128))
+    gallery = np.repeat(people, 4, axis=0) + rng.normal(scale=0.01, size=(2000, 128))
+    queries = people[:50] + rng.normal(scale=0.01, size=(50, 128))
+
+    ivf = face_index.build_index(gallery, kind="ivf", n_lists=32, n_probe=4)
+    exact = face_index.build_index(gallery, kind="exact")
+    assert ivf.kind == "ivf" and exact.kind == "exact"
+
+    _, exact_idx = exact.search(queries, k=1)
+    _, ivf_idx = ivf.search(queries, k=1)
+    assert (exact_idx // 4 == np.arange(50)[:, None]).all()
+    assert (ivf_idx == exact_idx).mean() >= 0.95
+
+    report = face_index.evaluate_index(ivf, queries, k=1)
+    assert report["recall_at_1"] >= 0.95
+
+    # Fewer candidates than k are padded
+    dist, idx = face_index.build_index(gallery[:2], kind="exact").search(queries[0], k=3)
+    assert idx[0, 2] == -1 and np.isinf(dist[0, 2])
+
+    # The report endpoint refuses unbounded k / samples
+    assert client.get("/recognize/index", params={"k": 10**9}).status_code == 422
+    assert client.get("/recognize/index", params={"samples": 10**6}).status_code == 422
+
+def test_compact_index_reranks_over_full_encodings():
+    rng = np.random.default_rng(2)
+    people = rng.normal(scale=0.1, size=(200, 128))
+    gallery = np.repeat(people, 5, axis=0) + rng.normal(scale=0.01, size=(1000, 128))
+    user_ids = np.repeat(np.arange(200), 5)
+    gallery[3] = rng.normal(scale=0.1, size=128) # A bad photo of user 0
+    queries = people[:50] + rng.normal(scale=0.01, size=(50, 128))
+
+    compact = face_index.build_index(gallery, kind="compact", user_ids=user_ids)
+    stats = compact.stats()
+    assert stats["templates"] == 200 and stats["compaction"] == 5.0
+
+    # Same neighbours as exact search, reported as rows of the full gallery
+    exact_dist, exact_idx = face_index.build_index(gallery, kind="exact").search(queries, k=3)
+    dist, idx = compact.search(queries, k=3)
+    assert (idx == exact_idx).all() and np.allclose(dist, exact_dist, atol=1e-4)
+
+    # Templates plus float16 encodings hold less than the float32 gallery
+    exact_bytes = face_index.build_index(gallery, kind="exact").stats()["memory_bytes"]
+    assert stats["memory_bytes"] < 0.8 * exact_bytes
+
+    # Evaluated against exact search over its own encodings or the float32 gallery
+    assert face_index.evaluate_index(compact, queries, k=3)["recall_at_3"] == 1.0
+    assert face_index.evaluate_index(compact, queries, k=3, matrix=gallery)["recall_at_3"] == 1.0
+
+    # The outlier is left out of user 0's template
+    templates, owners = face_index.compact_templates(gallery, user_ids)
+    assert np.allclose(templates[owners == 0][0], gallery[[0, 1, 2, 4]].mean(axis=0), atol=1e-5)
+
+    with pytest.raises(ValueError):
+        face_index.build_index(gallery, kind="compact")
+
+def test_index_report_on_compact_gallery():
+    db = TestingSessionLocal()
+    rng = np.random.default_rng(3)
+    users = [
+        crud.create_user(db, schemas.UserCreate(name=f"Compact {i}", email=f"compact{i}@example.com"), encoding_format.encode(rng.normal(size=128)))
+        for i in range(3)
+    ]
+    user_ids = [u.id for u in users]
+    gallery = FaceGallery(index_kind="compact")
+    report = gallery.index_report(db, samples=3)
+    db.close()
+
+    assert report["kind"] == "compact"
+    assert report["evaluation"]["recall_at_1"] == 1.0
+
+    for user_id in user_ids:
+        client.delete(f"/users/{user_id}")
+
+def test_match_faces_assigns_each_user_once():
+    basis = np.eye(128, dtype=np.float32)
+    gallery = np.stack([np.zeros(128), basis[0] * 0.3, basis[1] * 5.0])
+    user_ids = np.array([10, 11, 12])
+    index = face_index.build_index(gallery, kind="exact")
+    faces = np.stack([basis[2] * 0.01, basis[0] * 0.02, basis[1] * 5.0])
+
+    # Both first faces are closest to user 10: the farther one falls back to user 11
+    rows, dist, matched = face_index.match_faces(index, faces, user_ids, tolerance=0.5)
+    assert list(user_ids[rows]) == [10, 11, 12] and matched.all()
+
+    rows, _, matched = face_index.match_faces(index, faces, user_ids, tolerance=0.5, exclude={12})
+    assert list(matched) == [True, True, False]
+
+    rows, _, matched = face_index.match_faces(index, faces, user_ids, tolerance=0.5, unique=False)
+    assert list(user_ids[rows]) == [10, 10, 12] and matched.all()
+
+def test_match_faces_falls_back_past_a_user_with_many_photos():
+    rng = np.random.default_rng(3)
+    basis = np.eye(128, dtype=np.float32)
+    # User 10 has more photos than MATCH_CANDIDATES, user 11 has one
+    photos = rng.normal(scale=0.002, size=(face_index.MATCH_CANDIDATES + 4, 128))
+    gallery = np.vstack([photos, basis[0] * 0.15 + basis[1] * 0.2])
+    user_ids = np.array([10] * len(photos) + [11])
+    faces = np.stack([basis[2] * 0.01, basis[0] * 0.15])
+
+    for kind in ("exact", "compact"):
+        index = face_index.build_index(gallery, kind=kind, user_ids=user_ids)
+        rows, dist, matched = face_index.match_faces(index, faces, user_ids, tolerance=0.5)
+        assert list(user_ids[rows]) == [10, 11] and matched.all()
+        assert abs(dist[1] - 0.2) < 1e-3
+
+
+# --- BATCH ATTENDANCE ---
+def test_attendance_batch():
+    db = TestingSessionLocal()
+    erin = crud.create_user(db, schemas.UserCreate(name="Erin", email="erin@example.com"), encoding_format.encode(np.zeros(128)))
+    erin_id = erin.id
+    db.close()
+
+    events = [
+        {"user_id": erin_id, "timestamp": "2026-01-05T09:00:00+02:00", "device_id": "gate-1"},
+        {"user_id": 999999, "device_id": "gate-1"},
+        {"user_id": erin_id, "device_id": "gate-2", "file_index": 0},
+        {"user_id": erin_id, "file_index": 5},
+    ]
+    files = [("files", ("e.jpg", create_dummy_face_image(), "image/jpeg"))]
+    response = client.post("/attendance/batch", data={"events": json.dumps(events)}, files=files)
+    assert response.status_code == 200
+    body = response.json()
+
+    assert len(body["created"]) == 2
+    assert body["created"][0]["timestamp"].startswith("2026-01-05T07:00:00")
+    assert [c["device_id"] for c in body["created"]] == ["gate-1", "gate-2"]
+    assert [(r["index"], r["detail"]) for r in body["rejected"]] == [(1, "User not found"), (3, "file_index out of range")]
+
+    response = client.post("/attendance/batch", data={"events": "not json"})
+    assert response.status_code == 422
+
+    # 50 events cost a fixed number of statements, not one or more per row
+    events = [{"user_id": erin_id, "timestamp": f"2026-01-{6 + i // 10:02d}T{8 + i % 10:02d}:00:00"} for i in range(50)]
+    statements = []
+    listener = lambda conn, cursor, stmt, *args: statements.append(stmt)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        response = client.post("/attendance/batch", data={"events": json.dumps(events)})
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert len(response.json()["created"]) == 50
+    # Users, dedup window, one INSERT, rollup reads and one INSERT for the new daily rows
+    assert len(statements) <= 6
+    assert sum(stmt.lstrip().upper().startswith("INSERT INTO ATTENDANCE ") for stmt in statements) == 1
+
+    client.delete(f"/users/{erin_id}")
+
+
+# --- UPLOAD LIMITS ---
+def test_upload_size_cap(monkeypatch):
+    monkeypatch.setattr(app_main, "MAX_UPLOAD_BYTES", 10)
+    files = {"file": ("big.jpg", create_dummy_face_image(), "image/jpeg")}
+    response = client.post("/users/", data={"name": "Too Big"}, files=files)
+    assert response.status_code == 413
+
+    # Oversized evidence is rejected before the attendance row is saved
+    db = TestingSessionLocal()
+    user_id = crud.create_user(db, schemas.UserCreate(name="Big Evidence"), encoding_format.encode(np.zeros(128))).id
+    db.close()
+    files = {"file": ("big.jpg", create_dummy_face_image(), "image/jpeg")}
+    assert client.post("/attendance/", data={"user_id": user_id}, files=files).status_code == 413
+    events = json.dumps([{"user_id": user_id, "file_index": 0}])
+    files = [("files", ("big.jpg", create_dummy_face_image(), "image/jpeg"))]
+    assert client.post("/attendance/batch", data={"events": events}, files=files).status_code == 413
+    assert client.get("/attendance/", params={"user_id": user_id}).json() == []
+    client.delete(f"/users/{user_id}")
+
+def test_register_user_rejects_non_image():
+    files = {"file": ("notes.txt", io.BytesIO(b"not an image"), "text/plain")}
+    response = client.post("/users/", data={"name": "Nobody"}, files=files)
+    assert response.status_code == 400
+
+def test_register_user_503_when_encoding_pool_full(monkeypatch):
+    monkeypatch.setattr(encoding_pool, "in_flight", encoding_pool.queue_limit)
+    files = {"file": ("test.jpg", create_dummy_face_image(), "image/jpeg")}
+    response = client.post("/users/", data={"name": "Busy"}, files=files)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+
+
+# --- BULK ENROLLMENT ---
+def test_bulk_enrollment_job():
+    face_bytes = (Path(__file__).resolve().parents[2] / "test_face.jpg").read_bytes()
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("photos/R001.jpg", face_bytes)
+        zf.writestr("photos/blank.jpg", create_dummy_face_image().getvalue())
+    archive.seek(0)
+
+    roster = (
+        "name,email,roll_number,department,photo\n"
+        "Frank,frank@example.com,R001,CS,\n"
+        "Grace,grace@example.com,R002,CS,blank.jpg\n"
+        "Heidi,heidi@example.com,R003,EE,\n"
+        "Ivan,frank@example.com,R004,EE,\n"
+    )
+    files = [
+        ("roster", ("roster.csv", io.BytesIO(roster.encode()), "text/csv")),
+        ("archive", ("photos.zip", archive, "application/zip")),
+    ]
+    response = client.post("/enrollment/jobs", files=files)
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    # TestClient runs background tasks before returning, so the job is done
+    job = client.get(f"/enrollment/jobs/{job_id}").json()
+    assert job["status"] == "completed"
+    assert (job["total"], job["processed"], job["succeeded"], job["failed"]) == (4, 4, 1, 3)
+    errors = {e["row"]: e["detail"] for e in job["errors"]}
+    assert errors == {
+        2: "No face found in photo",
+        3: "Photo not found",
+        4: "Email already registered",
+    }
+
+    users = client.get("/users/").json()
+    frank = next(u for u in users if u["name"] == "Frank")
+    assert len(frank["encodings"]) == 1
+    assert not any(u["name"] in ("Grace", "Heidi", "Ivan") for u in users)
+    client.delete(f"/users/{frank['id']}")
+
+    assert client.get("/enrollment/jobs/unknown").status_code == 404
+    response = client.post("/enrollment/jobs", files=[("roster", ("roster.csv", io.BytesIO(b"x"), "text/csv"))])
+    assert response.status_code == 400
+
+def test_bulk_enrollment_limits(monkeypatch):
+    roster = ("roster", ("roster.csv", io.BytesIO(b"name,roll_number\nJudy,R010\n"), "text/csv"))
+    def post(*uploads):
+        roster[1][1].seek(0)
+        return client.post("/enrollment/jobs", files=[roster, *uploads])
+
+    monkeypatch.setattr(enrollment, "MAX_PHOTO_BYTES", 1000)
+    monkeypatch.setattr(enrollment, "MAX_ENROLLMENT_BYTES", 5000)
+    monkeypatch.setattr(enrollment, "MAX_ARCHIVE_ENTRIES", 3)
+
+    assert post(("files", ("R010.jpg", io.BytesIO(b"x" * 1001), "image/jpeg"))).status_code == 413
+    small = [("files", (f"{i}.jpg", io.BytesIO(b"x" * 1000), "image/jpeg")) for i in range(6)]
+    assert post(*small).status_code == 413
+
+    def zipped(entries):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, data in entries:
+                zf.writestr(name, data)
+        return ("archive", ("photos.zip", io.BytesIO(archive.getvalue()), "application/zip"))
+
+    # Too many entries, or a small archive that unpacks past the total: rejected from the ZIP directory
+    assert post(zipped([(f"{i}.jpg", b"x") for i in range(4)])).status_code == 413
+    assert post(zipped([("a.jpg", b"\0" * 3000), ("b.jpg", b"\0" * 3000)])).status_code == 413
+
+    # An oversized entry fails only its row
+    response = post(zipped([("R010.jpg", b"\0" * 2000)]))
+    assert response.status_code == 202
+    job = client.get(f"/enrollment/jobs/{response.json()['id']}").json()
+    assert job["failed"] == 1 and job["errors"][0]["detail"].startswith("Photo larger than")
+
+
+# --- USER LISTING ---
+def test_users_keyset_pagination_and_ndjson():
+    db = TestingSessionLocal()
+    ids = [
+        crud.create_user(db, schemas.UserCreate(name=f"Page {i}"), encoding_format.encode(np.full(128, i, dtype=np.float32))).id
+        for i in range(3)
+    ]
+    db.close()
+
+    statements = []
+    listener = lambda conn, cursor, stmt, *args: statements.append(stmt)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        first = client.get("/users/", params={"limit": 2})
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    # One query for the page, one for all of its encodings
+    assert len(statements) == 2
+    assert [u["id"] for u in first.json()] == ids[:2]
+    assert all(len(u["encodings"]) == 1 for u in first.json())
+
+    second = client.get("/users/", params={"limit": 2, "after_id": first.headers["X-Next-Cursor"]})
+    assert [u["id"] for u in second.json()] == ids[2:]
+    assert "X-Next-Cursor" not in second.headers
+
+    # Dashboards on another origin can read the cursor
+    cross_origin = client.get("/users/", params={"limit": 2}, headers={"Origin": "http://dashboard.example"})
+    assert "x-next-cursor" in cross_origin.headers["Access-Control-Expose-Headers"].lower()
+
+    slim = client.get("/users/", params={"include_encodings": "false"}).json()
+    assert "encodings" not in slim[0]
+
+    streamed = client.get("/users/", params={"format": "ndjson", "after_id": ids[0]})
+    assert streamed.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    assert [u["id"] for u in lines] == ids[1:]
+    assert lines[0]["encodings"][0]["encoding"]
+
+    for user_id in ids:
+        client.delete(f"/users/{user_id}")
+
+
+# --- ATTENDANCE QUERIES ---
+def test_attendance_filters_and_cursor():
+    db = TestingSessionLocal()
+    cs = crud.create_user(db, schemas.UserCreate(name="Judy", department="CS"), encoding_format.encode(np.zeros(128, dtype=np.float32)))
+    ee = crud.create_user(db, schemas.UserCreate(name="Karl", department="EE"), encoding_format.encode(np.ones(128, dtype=np.float32)))
+    day = datetime(2026, 3, 2, 9, 0)
+    crud.create_attendance_batch(db, [
+        {"user_id": cs.id, "timestamp": day, "device_id": "cam-1"},
+        {"user_id": cs.id, "timestamp": day + timedelta(hours=1), "device_id": "cam-2"},
+        {"user_id": cs.id, "timestamp": day + timedelta(days=1), "device_id": "cam-1"},
+        {"user_id": ee.id, "timestamp": day + timedelta(minutes=5), "device_id": "cam-1"},
+    ])
+    cs_id, ee_id = cs.id, ee.id
+    db.close()
+
+    today = {"start": "2026-03-02T00:00:00", "end": "2026-03-03T00:00:00"}
+    logs = client.get("/attendance/", params={**today, "department": "CS"}).json()
+    assert [(l["user_id"], l["timestamp"]) for l in logs] == [
+        (cs_id, "2026-03-02T10:00:00"),
+        (cs_id, "2026-03-02T09:00:00"),
+    ]
+
+    logs = client.get("/attendance/", params={**today, "device_id": "cam-1"}).json()
+    assert {l["user_id"] for l in logs} == {cs_id, ee_id}
+    assert client.get("/attendance/", params={"user_id": ee_id}).json()[0]["device_id"] == "cam-1"
+    assert client.get("/attendance/", params={"user_id": cs_id, "status": "Late"}).json() == []
+
+    # Keyset pages over the same user's history, newest first
+    first = client.get("/attendance/", params={"user_id": cs_id, "limit": 2}, headers={"Origin": "http://dashboard.example"})
+    assert "x-next-cursor" in first.headers["Access-Control-Expose-Headers"].lower()
+    second = client.get("/attendance/", params={"user_id": cs_id, "limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+    timestamps = [l["timestamp"] for l in first.json() + second.json()]
+    assert timestamps == ["2026-03-03T09:00:00", "2026-03-02T10:00:00", "2026-03-02T09:00:00"]
+    assert client.get("/attendance/", params={"cursor": "garbage"}).status_code == 400
+
+    client.delete(f"/users/{cs_id}")
+    client.delete(f"/users/{ee_id}")
+
+
+# --- ATTENDANCE REPORTS ---
+def _rollup_snapshot(db):
+    daily = sorted((r.user_id, str(r.day), r.events) for r in db.query(models.DailyAttendance))
+    departments = sorted((r.department, str(r.day), r.present) for r in db.query(models.DepartmentDailyAttendance))
+    return daily, departments
+
+def test_attendance_rollups_and_reports(monkeypatch):
+    db = TestingSessionLocal()
+    a = crud.create_user(db, schemas.UserCreate(name="Liam", department="ME", roll_number="ME01"), encoding_format.encode(np.zeros(128, dtype=np.float32)))
+    b = crud.create_user(db, schemas.UserCreate(name="Mia", department="ME", roll_number="ME02"), encoding_format.encode(np.ones(128, dtype=np.float32)))
+    a_id, b_id = a.id, b.id
+    day = datetime(2026, 4, 6, 9, 0)
+    crud.create_attendance_batch(db, [
+        {"user_id": a_id, "timestamp": day},
+        {"user_id": a_id, "timestamp": day + timedelta(hours=2)},
+        {"user_id": b_id, "timestamp": day + timedelta(minutes=3)},
+    ])
+    crud.create_attendance(db, user_id=a_id, timestamp=day + timedelta(days=1))
+    crud.create_attendance(db, user_id=a_id, timestamp=day + timedelta(days=1, hours=1))
+
+    incremental = _rollup_snapshot(db)
+    assert ("ME", "2026-04-06", 2) in incremental[1]
+    assert ("ME", "2026-04-07", 1) in incremental[1]
+    assert (a_id, "2026-04-06", 2) in incremental[0]
+
+    # The backfill reproduces exactly what the incremental path maintained
+    crud.rebuild_attendance_rollups(db)
+    assert _rollup_snapshot(db) == incremental
+    db.close()
+
+    viewer = type('User', (), {'id': 0, 'role': models.UserRole.FACULTY})()
+    monkeypatch.setitem(app.dependency_overrides, security.get_current_db_user, lambda: viewer)
+    report = client.get(f"/reports/users/{b_id}", params={"start": "2026-04-01", "end": "2026-04-30"}).json()
+    assert (report["days_present"], report["working_days"], report["percentage"]) == (1, 2, 50.0)
+    assert report["days"][0]["first_seen"] == "2026-04-06T09:03:00"
+
+    days = client.get("/reports/departments", params={"department": "ME"}).json()
+    assert [(d["day"], d["present"], d["enrolled"], d["percentage"]) for d in days] == [
+        ("2026-04-06", 2, 2, 100.0),
+        ("2026-04-07", 1, 2, 50.0),
+    ]
+
+    students = client.get("/reports/departments/ME/students", params={"start": "2026-04-07"}).json()
+    assert [(s["roll_number"], s["days_present"], s["working_days"]) for s in students] == [("ME01", 1, 1), ("ME02", 0, 1)]
+    assert client.get("/reports/users/999999").status_code == 404
+
+    # Students only see their own report
+    student = type('User', (), {'id': a_id, 'role': models.UserRole.STUDENT})()
+    monkeypatch.setitem(app.dependency_overrides, security.get_current_db_user, lambda: student)
+    assert client.get(f"/reports/users/{a_id}").status_code == 200
+    assert client.get(f"/reports/users/{b_id}").status_code == 403
+
+    # Deleting a user takes them out of the department counts
+    client.delete(f"/users/{b_id}")
+    days = client.get("/reports/departments", params={"department": "ME"}).json()
+    assert days[0]["present"] == 1
+
+    # One UPDATE corrects every department-day, however many days the user attended
+    statements = []
+    listener = lambda conn, cursor, stmt, *args: statements.append(stmt)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        client.delete(f"/users/{a_id}")
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert sum(stmt.startswith("UPDATE attendance_department_daily") for stmt in statements) == 1
+    assert client.get("/reports/departments", params={"department": "ME"}).json() == []
+
+
+def test_attendance_commit_retries_after_rollup_conflict(monkeypatch):
+    db = TestingSessionLocal()
+    olga = crud.create_user(db, schemas.UserCreate(name="Olga", department="QA"), encoding_format.encode(np.zeros(128, dtype=np.float32)))
+    pete = crud.create_user(db, schemas.UserCreate(name="Pete", department="QA"), encoding_format.encode(np.ones(128, dtype=np.float32)))
+    olga_id, pete_id = olga.id, pete.id
+    day = datetime(2026, 6, 1, 9, 0)
+    crud.create_attendance(db, user_id=pete_id, timestamp=day)
+
+    apply_rollups = crud._apply_attendance_rollups
+    attempts = []
+    def racing(session, logs):
+        attempts.append(len(logs))
+        if len(attempts) == 1:
+            apply_rollups(session, logs)
+            # Another kiosk created Olga's daily row first: this commit fails
+            session.add(models.DailyAttendance(user_id=olga_id, day=day.date(), first_seen=day, last_seen=day, events=1))
+        else:
+            # Meanwhile another request took the key the rolled-back insert had used
+            session.execute(models.AttendanceLog.__table__.insert().values(user_id=pete_id, timestamp=day))
+            apply_rollups(session, logs)
+    monkeypatch.setattr(crud, "_apply_attendance_rollups", racing)
+    log = crud.create_attendance(db, user_id=olga_id, timestamp=day + timedelta(minutes=5))
+    monkeypatch.undo()
+
+    assert attempts == [1, 1]
+    assert db.query(models.AttendanceLog).filter(models.AttendanceLog.user_id == olga_id).one().id == log.id
+    daily, departments = _rollup_snapshot(db)
+    assert (olga_id, "2026-06-01", 1) in daily
+    assert ("QA", "2026-06-01", 2) in departments # Incremented in SQL on the existing row
+    db.close()
+
+    client.delete(f"/users/{olga_id}")
+    client.delete(f"/users/{pete_id}")
+
+
+# --- ATTENDANCE DEDUP ---
+def test_attendance_dedup_window():
+    db = TestingSessionLocal()
+    nina = crud.create_user(db, schemas.UserCreate(name="Nina"), encoding_format.encode(np.zeros(128, dtype=np.float32)))
+    nina_id = nina.id
+    db.close()
+
+    first = client.post("/attendance/", data={"user_id": nina_id, "timestamp": "2026-05-04T09:00:00", "device_id": "door-a"})
+    again = client.post("/attendance/", data={"user_id": nina_id, "timestamp": "2026-05-04T09:01:00", "device_id": "door-b"})
+    assert again.headers.get("X-Attendance-Duplicate") == "true"
+    assert again.json()["id"] == first.json()["id"]
+
+    # Forget the process cache: the indexed DB check still catches it
+    app_main._recent_attendance.clear()
+    again = client.post("/attendance/", data={"user_id": nina_id, "timestamp": "2026-05-04T08:58:00"})
+    assert again.json()["id"] == first.json()["id"]
+
+    later = client.post("/attendance/", data={"user_id": nina_id, "timestamp": "2026-05-04T10:00:00"})
+    assert "X-Attendance-Duplicate" not in later.headers
+    assert later.json()["id"] != first.json()["id"]
+
+    events = [
+        {"user_id": nina_id, "timestamp": "2026-05-04T09:02:00"}, # duplicate of the first record
+        {"user_id": nina_id, "timestamp": "2026-05-04T12:00:00"},
+        {"user_id": nina_id, "timestamp": "2026-05-04T12:00:30"}, # duplicate within this batch
+    ]
+    result = client.post("/attendance/batch", data={"events": json.dumps(events)}).json()
+    assert len(result["created"]) == 1
+    assert [(d["index"], d["existing"]["id"]) for d in result["duplicates"]] == [
+        (0, first.json()["id"]),
+        (2, result["created"][0]["id"]),
+    ]
+    assert len(client.get("/attendance/", params={"user_id": nina_id}).json()) == 3
+
+    client.delete(f"/users/{nina_id}")
+
+
+# --- LOCAL TOKEN VERIFICATION ---
+def _bearer(token):
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+def test_local_jwt_verification_and_caches(monkeypatch):
+    secret = "local-test-secret-0123456789abcdef"
+    monkeypatch.setattr(security, "SUPABASE_JWT_SECRET", secret)
+    # Any call to Supabase Auth would mean the token was not verified locally
+    monkeypatch.setattr(security, "supabase", None)
+    security.clear_auth_caches()
+
+    claims = {"sub": "abc", "email": "olga@example.com", "aud": "authenticated", "exp": int(time.time()) + 600}
+    token = jwt.encode(claims, secret, algorithm="HS256")
+    token_user = security.get_current_user(_bearer(token))
+    assert (token_user.id, token_user.email) == ("abc", "olga@example.com")
+    assert security.get_current_user(_bearer(token)) is token_user
+
+    for bad in [jwt.encode(claims, "some-other-secret-0123456789abcdef", algorithm="HS256"), jwt.encode({**claims, "exp": int(time.time()) - 10}, secret, algorithm="HS256")]:
+        with pytest.raises(HTTPException) as exc:
+            security.get_current_user(_bearer(bad))
+        assert exc.value.status_code == 401
+
+    db = TestingSessionLocal()
+    olga = crud.create_user(db, schemas.UserCreate(name="Olga", email="olga@example.com"), encoding_format.encode(np.zeros(128, dtype=np.float32)))
+    olga_id = olga.id
+    db.close()
+
+    db = TestingSessionLocal()
+    assert security.get_current_db_user(token_user, db).id == olga_id
+    db.close()
+
+    # Cached: resolved without a query
+    statements = []
+    listener = lambda conn, cursor, stmt, *args: statements.append(stmt)
+    event.listen(engine, "before_cursor_execute", listener)
+    db = TestingSessionLocal()
+    try:
+        cached_user = security.get_current_db_user(token_user, db)
+        assert (cached_user.id, cached_user.name) == (olga_id, "Olga")
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+        db.close()
+    assert statements == []
+
+    client.put(f"/users/{olga_id}", data={"name": "Olga R."})
+    db = TestingSessionLocal()
+    assert security.get_current_db_user(token_user, db).name == "Olga R."
+    db.close()
+
+    client.delete(f"/users/{olga_id}")
+    db = TestingSessionLocal()
+    with pytest.raises(HTTPException) as exc:
+        security.get_current_db_user(token_user, db)
+    assert exc.value.status_code == 404
+    db.close()
+    security.clear_auth_caches()
+
+
+# --- CLIENT DETECTORS ---
+@pytest.mark.parametrize("kind", ["haar", "dnn"])
+def test_opencv_detectors_find_a_face(kind):
+    try:
+        detector = detectors.make_detector(kind)
+    except RuntimeError as e:
+        pytest.skip(str(e)) # No cascade / model file in this environment
+
+    rgb = cv2.cvtColor(cv2.imread(str(Path(__file__).resolve().parents[2] / "test_face.jpg")), cv2.COLOR_BGR2RGB)
+    faces, timings = detector.detect_timed(rgb)
+    assert len(faces) >= 1 and kind in timings
+    height, width = rgb.shape[:2]
+    for top, right, bottom, left in faces:
+        assert 0 <= top < bottom <= height and 0 <= left < right <= width
+    assert detector.detect(np.zeros_like(rgb)) == []
+
+def test_detector_requires_detect():
+    with pytest.raises(TypeError):
+        detectors.Detector()
+
+
+# --- CLIENT MOTION GATING ---
+def _frame(square=0, level=0):
+    """Synthetic 120x160 BGR frame at grey `level`, with a white `square` x `square` patch."""
+    frame = np.full((120, 160, 3), level, dtype=np.uint8)
+    frame[40:40 + square, 60:60 + square] = 255
+    return frame
+
+def test_motion_score_threshold():
+    gate = motion.MotionGate(threshold=0.01, pixel_delta=25)
+    assert gate.motion_score(_frame()) == 0.0 # First frame becomes the background
+    assert gate.motion_score(_frame()) == 0.0
+    assert gate.motion_score(_frame(level=10)) == 0.0 # Lighting drift under pixel_delta
+    assert 0 < gate.motion_score(_frame(square=6)) < 0.01 # A few pixels: below the threshold
+    assert gate.motion_score(_frame(square=40)) > 0.05
+
+    gate.should_process(_frame(square=6), now=100.0)
+    assert gate.last_score < gate.threshold and gate._active_until == 0.0
+
+def test_motion_gate_idle_and_active():
+    gate = motion.MotionGate(threshold=0.01, hold_seconds=3.0, active_every_n=1, idle_interval=2.0)
+    assert gate.should_process(_frame(), now=100.0) # Idle heartbeat on the first frame
+    assert not gate.should_process(_frame(), now=100.5) # Idle: nothing moved
+    assert gate.should_process(_frame(square=40), now=101.0) # Motion: active
+    assert gate.should_process(_frame(), now=103.5) # Still, but within the hold time
+    assert not gate.should_process(_frame(), now=104.5) # Hold expired: idle again
+    assert gate.should_process(_frame(), now=105.6) # Forced periodic check
+    assert gate.skipped == 2
+
+    # Faces keep the gate active while nobody moves
+    gate.keep_alive(now=106.0)
+    assert gate.should_process(_frame(), now=108.0)
+
+    # Active, every 2nd frame; with idle_interval=0 an idle gate never passes a frame
+    gate = motion.MotionGate(threshold=0.01, active_every_n=2, idle_interval=0)
+    assert not gate.should_process(_frame(), now=0.0)
+    assert [gate.should_process(_frame(square=40 + i), now=0.1 * i) for i in range(1, 5)] == [False, True, False, True]
+
+    every_third = motion.make_scheduler(motion_gating=False, process_every_n=3)
+    assert [every_third.should_process(None) for _ in range(6)] == [False, False, True, False, False, True]
+
+
+# --- CLIENT FACE TRACKING ---
+def test_tracker_follows_faces_by_overlap_and_expires_them():
+    faces = tracker.FaceTracker(iou_threshold=0.3, max_age=1.0)
+    alice, bob = (10, 60, 60, 10), (10, 160, 60, 110)
+    first = faces.update([alice, bob], now=0.0)
+    assert [t.id for t in first] == [1, 2]
+
+    # Small moves keep their tracks (order of the detections doesn't matter); a new face gets a new one
+    moved = faces.update([(12, 162, 62, 112), (12, 62, 62, 12), (200, 250, 250, 200)], now=0.5)
+    assert [t.id for t in moved] == [2, 1, 3]
+    assert tracker.iou(alice, (12, 62, 62, 12)) >= 0.3
+
+    # Stepping closer grows the box past the IoU threshold; the centre still matches
+    assert tracker.iou((12, 62, 62, 12), (0, 100, 100, 0)) < 0.3
+    assert faces.update([(0, 100, 100, 0)], now=0.6)[0].id == 1
+
+    # Tracks unseen for longer than max_age are forgotten
+    assert faces.update([], now=1.7) == [] and faces.tracks == []
+    assert faces.update([alice], now=1.8)[0].id == 4
+
+def test_tracker_confirms_before_reusing_an_identity():
+    faces = tracker.FaceTracker(reverify_seconds=2.0, confirm_matches=3)
+    box = (10, 60, 60, 10)
+    track = faces.update([box], now=0.0)[0]
+
+    # Attendance waits for CONFIRM_MATCHES consistent matches; a different match starts over
+    track.observe(7, "Alice", now=0.0)
+    track.observe(7, "Alice", now=0.1)
+    assert not track.confirmed and faces.stable_boxes(now=0.1) == []
+    track.observe(8, "Bob", now=0.2)
+    assert track.hits == 1
+    track.observe(None, "Unknown", now=0.3)
+    assert track.hits == 0
+    for now in (0.4, 0.5, 0.6):
+        track.observe(7, "Alice", now=now)
+    assert track.confirmed
+
+    # A confirmed track skips encoding until it is due for re-verification
+    assert faces.stable_boxes(now=1.0) == [box]
+    assert tracker.reusable([(11, 61, 61, 11), (100, 150, 150, 100)], faces.stable_boxes(now=1.0)) == [True, False]
+    assert faces.stable_boxes(now=2.6) == []
+
+    # With tracking off every face is encoded and the first match counts
+    untracked = tracker.make_tracker(face_tracking=False)
+    track = untracked.update([box], now=0.0)[0]
+    track.observe(7, "Alice", now=0.0)
+    assert track.confirmed and untracked.stable_boxes(now=0.0) == []
+
+def test_detect_and_encode_skips_faces_on_confirmed_tracks():
+    rgb = cv2.cvtColor(cv2.imread(str(Path(__file__).resolve().parents[2] / "test_face.jpg")), cv2.COLOR_BGR2RGB)
+    locations, encodings, timings = pipeline.detect_and_encode(rgb, "hog")
+    assert len(locations) == 1 and encodings[0] is not None and "encode" in timings
+
+    locations, encodings, timings = pipeline.detect_and_encode(rgb, "hog", stable_boxes=locations)
+    assert encodings == [None] and "encode" not in timings
+
+def test_frame_queue_drops_oldest():
+    frames = pipeline.FrameQueue(maxsize=2)
+    for frame in (1, 2, 3):
+        frames.put(frame)
+    assert frames.dropped == 1
+    assert [frames.get(timeout=0), frames.get(timeout=0)] == [2, 3]
+    assert frames.get(timeout=0.01) is None
+
+
+# --- CLIENT ATTENDANCE SPOOL ---
+def _http_error(status_code):
+    response = uploader.requests.Response()
+    response.status_code = status_code
+    return uploader.requests.HTTPError(f"{status_code} error", response=response)
+
+def test_spool_survives_restart_and_keeps_capture_time(monkeypatch, tmp_path):
+    spool = str(tmp_path / "spool.db")
+    monkeypatch.setattr(uploader.time, "time", lambda: 1767600000.0) # 2026-01-05T08:00:00Z
+    first = uploader.AttendanceUploader(spool_path=spool)
+    first.enqueue(7)
+    first.enqueue(8, frame=np.zeros((120, 160, 3), dtype=np.uint8))
+    first.stop() # Never started: the rows stay on disk
+    monkeypatch.undo()
+
+    second = uploader.AttendanceUploader(spool_path=spool)
+    assert second.pending_count() == 2
+
+    # The batch carries when each face was seen, not when the upload happened
+    posted = []
+    class Accepted:
+        def raise_for_status(self):
+            pass
+        def json(self):
+            return {"created": [{}, {}]}
+    def post(url, data=None, files=None, timeout=None):
+        posted.append((url, json.loads(data["events"]), files))
+        return Accepted()
+    monkeypatch.setattr(uploader.client_utils.requests, "post", post)
+
+    done, error = second._send_batch(second._next_batch())
+    second._delete(done)
+    assert error is None and second.pending_count() == 0
+    url, events, files = posted[0]
+    assert url.endswith("/attendance/batch")
+    assert [(e["user_id"], e["timestamp"]) for e in events] == [(7, "2026-01-05T08:00:00+00:00"), (8, "2026-01-05T08:00:00+00:00")]
+    assert "file_index" not in events[0] and events[1]["file_index"] == 0 and len(files) == 1
+    second.stop()
+
+def test_spool_backs_off_exponentially_while_offline(monkeypatch, tmp_path):
+    spooler = uploader.AttendanceUploader(spool_path=str(tmp_path / "spool.db"))
+    spooler.enqueue(7)
+    monkeypatch.setattr(uploader, "BACKOFF_MAX_SECONDS", 4.0)
+
+    def offline(records):
+        raise uploader.requests.ConnectionError("backend unreachable")
+    monkeypatch.setattr(uploader.client_utils, "post_attendance_batch", offline)
+
+    # Record the backoff sleeps instead of taking them; stop after the fifth
+    waits = []
+    class Clock(threading.Event):
+        def wait(self, timeout=None):
+            waits.append(timeout)
+            if len(waits) == 5:
+                self.set()
+            return self.is_set()
+    spooler._stop = Clock()
+    spooler._run()
+    assert waits == [1.0, 2.0, 4.0, 4.0, 4.0]
+    assert spooler.pending_count() == 1 # Nothing is lost while offline
+
+    # Back online: the spool drains and the backoff resets
+    monkeypatch.setattr(uploader.client_utils, "post_attendance_batch", lambda records: {"created": [{}]})
+    spooler._run()
+    assert spooler.pending_count() == 0 and spooler._backoff == 0.0
+    spooler.stop()
+
+def test_spool_drops_only_permanent_failures(monkeypatch, tmp_path):
+    spooler = uploader.AttendanceUploader(spool_path=str(tmp_path / "spool.db"))
+    for user_id in (1, 2, 3):
+        spooler.enqueue(user_id)
+
+    # Old backend without /attendance/batch: rows go one at a time
+    def no_batch(records):
+        raise _http_error(404)
+    sent = []
+    def post_one(user_id, image_bytes=None, captured_at=None):
+        sent.append(user_id)
+        if user_id == 1:
+            raise _http_error(404) # User deleted: retrying will never help
+        if user_id == 3:
+            raise _http_error(401) # Auth misconfigured: keep it for later
+    monkeypatch.setattr(uploader.client_utils, "post_attendance_batch", no_batch)
+    monkeypatch.setattr(uploader.client_utils, "post_attendance", post_one)
+
+    done, error = spooler._send_batch(spooler._next_batch())
+    spooler._delete(done)
+    assert sent == [1, 2, 3]
+    assert error.response.status_code == 401
+    assert [row[1] for row in spooler._next_batch()] == [3]
+    spooler.stop()
+
+
+# --- BACKGROUND EVIDENCE UPLOADS ---
+def test_evidence_uploaded_in_background(monkeypatch, tmp_path):
+    monkeypatch.setattr(storage.upload_worker, "storage", storage.LocalStorage(str(tmp_path), "http://testserver/media"))
+    db = TestingSessionLocal()
+    pia = crud.create_user(db, schemas.UserCreate(name="Pia"), encoding_format.encode(np.zeros(128, dtype=np.float32)))
+    pia_id = pia.id
+    db.close()
+
+    files = {"file": ("evidence.jpg", create_dummy_face_image(), "image/jpeg")}
+    response = client.post("/attendance/", data={"user_id": pia_id, "timestamp": "2026-06-01T09:00:00"}, files=files)
+    assert response.status_code == 200
+    log_id = response.json()["id"]
+    storage.upload_worker.join() # The test engine has one connection; don't share it across threads
+
+    # Two events sharing one evidence file: uploaded once, linked to both rows
+    events = [
+        {"user_id": pia_id, "timestamp": "2026-06-01T12:00:00", "file_index": 0},
+        {"user_id": pia_id, "timestamp": "2026-06-01T15:00:00", "file_index": 0},
+    ]
+    files = [("files", ("shared.jpg", create_dummy_face_image(), "image/jpeg"))]
+    batch = client.post("/attendance/batch", data={"events": json.dumps(events)}, files=files).json()
+    assert len(batch["created"]) == 2
+
+    storage.upload_worker.join()
+    logs = {l["id"]: l["screenshot_path"] for l in client.get("/attendance/", params={"user_id": pia_id}).json()}
+    assert logs[log_id].startswith("http://testserver/media/logs/")
+    batch_paths = {logs[l["id"]] for l in batch["created"]}
+    assert len(batch_paths) == 1 and None not in batch_paths
+    assert len(list((tmp_path / "logs").glob("*.jpg"))) == 2
+    assert len(list((tmp_path / "logs" / "thumbs").glob("*.jpg"))) == 2
+    thumbnails = {l["thumbnail_path"] for l in client.get("/attendance/", params={"user_id": pia_id}).json()}
+    assert all(t.startswith("http://testserver/media/logs/thumbs/") for t in thumbnails)
+
+    client.delete(f"/users/{pia_id}")
+
+def test_profile_upload_off_the_event_loop_when_queue_full(monkeypatch, tmp_path):
+    on_event_loop = []
+    class RecordingStorage(storage.LocalStorage):
+        def upload(self, *args):
+            try:
+                asyncio.get_running_loop()
+                on_event_loop.append(True)
+            except RuntimeError:
+                on_event_loop.append(False)
+            return super().upload(*args)
+
+    worker = storage.upload_worker
+    monkeypatch.setattr(worker, "storage", RecordingStorage(str(tmp_path), "http://testserver/media"))
+    worker._ensure_started() # The worker threads wait on the current queue...
+    monkeypatch.setattr(worker, "_queue", queue.Queue(maxsize=1))
+    worker._queue.put(lambda: None) # ...so nothing drains this one: it stays full
+
+    face_bytes = (Path(__file__).resolve().parents[2] / "test_face.jpg").read_bytes()
+    files = {"file": ("face.jpg", io.BytesIO(face_bytes), "image/jpeg")}
+    response = client.post("/users/", data={"name": "Uma", "email": "uma@example.com"}, files=files)
+    assert response.status_code == 200
+
+    # Uploaded before the response, in a threadpool thread rather than on the event loop
+    assert on_event_loop == [False]
+    user = next(u for u in client.get("/users/").json() if u["id"] == response.json()["id"])
+    assert user["profile_image_url"].startswith("http://testserver/media/faces/")
+
+    client.delete(f"/users/{user['id']}")
+
+
+def test_full_frame_evidence_is_downscaled():
+    frame = np.random.default_rng(0).integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+    frame_bytes = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 95])[1].tobytes()
+    data, content_type, ext, thumbnail = imaging.process_evidence(frame_bytes, "image/jpeg")
+    stored = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    assert max(stored.shape[:2]) == imaging.EVIDENCE_MAX_SIDE
+    assert len(data) < len(frame_bytes) / 2
+    assert max(cv2.imdecode(np.frombuffer(thumbnail, np.uint8), cv2.IMREAD_COLOR).shape[:2]) == imaging.THUMBNAIL_SIDE
+
+    # Not an image: stored untouched, no thumbnail
+    assert imaging.process_evidence(b"not an image", "image/jpeg") == (b"not an image", "image/jpeg", ".jpg", None)
+
+
+def test_attendance_event_stream():
+    db = TestingSessionLocal()
+    quinn = crud.create_user(db, schemas.UserCreate(name="Quinn", department="Physics"), encoding_format.encode(np.zeros(128, dtype=np.float32)))
+    rhea = crud.create_user(db, schemas.UserCreate(name="Rhea", department="Physics"), encoding_format.encode(np.zeros(128, dtype=np.float32)))
+    quinn_id, rhea_id = quinn.id, rhea.id
+    db.close()
+
+    class Connected:
+        async def is_disconnected(self):
+            return False
+
+    async def scenario():
+        admin = type('User', (), {'id': 0, 'role': models.UserRole.ADMIN})()
+        student = type('User', (), {'id': quinn_id, 'role': models.UserRole.STUDENT})()
+        response = await events_router.attendance_stream(Connected(), db=TestingSessionLocal(), user=admin)
+        stream = response.body_iterator
+        assert await anext(stream) == "retry: 3000\n\n"
+        assert (await anext(stream)).startswith("event: counters\n")
+
+        own = app_events.broker.subscribe(events_router._view_for(student))
+        tiny = app_events.broker.subscribe(maxsize=1)
+        await asyncio.to_thread(client.post, "/attendance/", data={"user_id": rhea_id})
+        await asyncio.to_thread(client.post, "/attendance/", data={"user_id": quinn_id})
+
+        chunk = await anext(stream)
+        assert chunk.startswith("event: attendance.created\n")
+        event = json.loads(chunk.split("data: ", 1)[1])
+        assert event["logs"][0]["users"]["name"] == "Rhea"
+        assert event["counters"]["present_today"] >= 1
+
+        # Students only get their own logs, without campus-wide counters; a full buffer keeps the newest and counts the rest
+        own_events = await own.get(timeout=1)
+        assert [e["logs"][0]["user_id"] for e in own_events] == [quinn_id]
+        assert "counters" not in own_events[0]
+        assert len(await tiny.get(timeout=1)) == 1 and tiny.dropped == 1
+
+        await stream.aclose()
+
+        response = await events_router.attendance_stream(Connected(), db=TestingSessionLocal(), user=student)
+        stream = response.body_iterator
+        await anext(stream)
+        counters = json.loads((await anext(stream)).split("data: ", 1)[1])
+        assert counters["events_today"] == 1 and "users" not in counters
+        await stream.aclose()
+
+        app_events.broker.unsubscribe(own)
+        app_events.broker.unsubscribe(tiny)
+        assert not app_events.broker.has_subscribers
+
+    asyncio.run(scenario())
+    client.delete(f"/users/{quinn_id}")
+    client.delete(f"/users/{rhea_id}")
+
+def test_live_counters_stay_cheap():
+    db = TestingSessionLocal()
+    sam = crud.create_user(db, schemas.UserCreate(name="Sam"), encoding_format.encode(np.zeros(128, dtype=np.float32)))
+    sam_id = sam.id
+    before = crud.get_live_counters(db)
+
+    # Once loaded, the all-time totals come from the cache: one query over today's rows
+    statements = []
+    listener = lambda conn, cursor, stmt, *args: statements.append(stmt)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        crud.create_attendance(db, user_id=sam_id)
+        counters = crud.get_live_counters(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert sum("attendance_daily" in stmt and "sum" in stmt.lower() for stmt in statements) == 1
+    assert counters["logs"] == before["logs"] + 1 and counters["users"] == before["users"]
+    assert counters["events_today"] == before["events_today"] + 1
+    db.close()
+
+    client.delete(f"/users/{sam_id}")
+    db = TestingSessionLocal()
+    assert crud.get_live_counters(db)["users"] == before["users"] - 1
+    db.close()
+
+
+def test_load_test_query_budgets(tmp_path):
+    restore = load_test.install_stubs(app, TestingSessionLocal, str(tmp_path))
+    try:
+        user_ids = load_test.seed(TestingSessionLocal, users=20, announcements=3)
+        scenarios = load_test.default_scenarios(user_ids, requests=10, enroll_requests=1)
+        report = asyncio.run(load_test.run_load_test(app, engine, scenarios, concurrency=1))
+    finally:
+        restore()
+
+    assert all(report[s.name]["status_codes"] == {"200": s.requests} for s in scenarios)
+    assert load_test.check_budgets(report) == []
+    # Listing a page of users costs the same however many users there are (no N+1)
+    assert report["GET /users/"]["queries_per_request"]["max"] <= 2
+
+    for user_id in user_ids:
+        client.delete(f"/users/{user_id}")
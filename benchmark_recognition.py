@@ -0,0 +1,347 @@
+"""
+Recognition benchmark: latency, throughput, gallery scaling and accuracy.
+
+    python benchmark_recognition.py --images photos/            # detection, encoding, matching, TAR/FAR
+    python benchmark_recognition.py --video door.mp4 --every 1,2,3,5
+    python benchmark_recognition.py --synthetic --sizes 1000,10000,100000
+    python benchmark_recognition.py --images photos/ --output run_a.json
+
+Images are labelled by folder: photos/<person>/<any>.jpg. The first photo of
+each person is enrolled; the others are probes. Every run writes a JSON report
+(--output) so runs with different settings can be compared.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+import cv2
+import numpy as np
+import face_recognition
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(ROOT, "client"))
+sys.path.append(os.path.join(ROOT, "backend", "app"))
+import detectors
+import face_index
+from pipeline import DETECTION_SCALE, detect_and_encode
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+DEFAULT_TOLERANCES = "0.4,0.45,0.5,0.55,0.6"
+
+
+def _csv(value, cast=float):
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+
+def summarize(latencies_ms):
+    """Mean and percentiles of a list of stage latencies (ms)."""
+    if not latencies_ms:
+        return {"count": 0}
+    values = np.asarray(latencies_ms)
+    return {
+        "count": len(values),
+        "mean": float(values.mean()),
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max()),
+    }
+
+
+class StageTimer:
+    """Collects per-stage latencies (ms) for one run."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, timings):
+        for stage, ms in timings.items():
+            self.samples.setdefault(stage, []).append(ms)
+
+    def report(self):
+        return {stage: summarize(values) for stage, values in self.samples.items()}
+
+
+# --- Accuracy ---
+def accuracy_report(genuine, impostor, tolerances, far_target):
+    """
+    TAR (genuine pairs within tolerance) and FAR (impostor pairs within tolerance)
+    per tolerance, plus the largest tolerance that keeps FAR <= far_target.
+    """
+    genuine, impostor = np.asarray(genuine), np.asarray(impostor)
+    rows = []
+    for tolerance in tolerances:
+        rows.append({
+            "tolerance": tolerance,
+            "tar": float((genuine <= tolerance).mean()) if len(genuine) else None,
+            "far": float((impostor <= tolerance).mean()) if len(impostor) else None,
+        })
+
+    recommended = None
+    if len(impostor):
+        # FAR only grows with the tolerance: keep the last one under the target
+        for tolerance in np.round(np.arange(0.30, 0.80, 0.01), 2):
+            if (impostor <= tolerance).mean() <= far_target:
+                recommended = float(tolerance)
+    return {
+        "genuine_pairs": int(len(genuine)),
+        "impostor_pairs": int(len(impostor)),
+        "genuine_distance_mean": float(genuine.mean()) if len(genuine) else None,
+        "impostor_distance_mean": float(impostor.mean()) if len(impostor) else None,
+        "by_tolerance": rows,
+        "far_target": far_target,
+        "recommended_tolerance": recommended,
+    }
+
+
+# --- Runs ---
+def run_images(args):
+    paths = sorted(p for p in glob.glob(os.path.join(args.images, "**", "*"), recursive=True)
+                   if p.lower().endswith(IMAGE_EXTENSIONS))
+    if not paths:
+        raise SystemExit(f"[ERROR] No images found under '{args.images}'")
+    scale = args.scale or 1.0
+    detectors.get_detector(args.detector) # Load models before timing starts
+    timer = StageTimer()
+
+    # 1. Detect + encode every image (largest face only for labelled photos)
+    labels, encodings, no_face = [], [], []
+    start = time.perf_counter()
+    for path in paths:
+        bgr = cv2.imread(path)
+        if bgr is None:
+            no_face.append(path)
+            continue
+        if scale != 1.0:
+            bgr = cv2.resize(bgr, (0, 0), fx=scale, fy=scale)
+        face_locations, face_encodings, timings = detect_and_encode(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB), args.detector)
+        timer.add(timings)
+        if not face_encodings:
+            no_face.append(path)
+            continue
+        areas = [(b - t) * (r - l) for t, r, b, l in face_locations]
+        labels.append(os.path.basename(os.path.dirname(path)))
+        encodings.append(face_encodings[int(np.argmax(areas))])
+    elapsed = time.perf_counter() - start
+
+    report = {
+        "images": len(paths),
+        "no_face": len(no_face),
+        "detector": args.detector,
+        "scale": scale,
+        "fps": len(paths) / elapsed if elapsed else None,
+    }
+
+    # 2. Enroll the first photo per person, match the rest
+    labels = np.asarray(labels)
+    encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, 128)
+    people = list(dict.fromkeys(labels))
+    enrolled = np.asarray([np.flatnonzero(labels == person)[0] for person in people], dtype=np.int64)
+    probes = np.setdiff1d(np.arange(len(labels)), enrolled)
+    report["people"] = len(people)
+    report["probes"] = int(len(probes))
+
+    if len(probes) and len(enrolled):
+        index = face_index.build_index(encodings[enrolled], kind="exact")
+        person_ids = np.arange(len(enrolled))
+        match_ms, correct = [], 0
+        for i in probes:
+            start = time.perf_counter()
+            rows, _, matched = face_index.match_faces(index, encodings[i], person_ids, args.tolerance)
+            match_ms.append((time.perf_counter() - start) * 1000)
+            correct += int(matched[0] and people[rows[0]] == labels[i])
+        timer.samples["match"] = match_ms
+        report["rank1_accuracy"] = correct / len(probes)
+
+        # Every probe against every enrolled person: one genuine pair, the rest impostors
+        distances = np.linalg.norm(encodings[probes][:, None, :] - encodings[enrolled][None, :, :], axis=2)
+        own = np.asarray([people.index(label) for label in labels[probes]])
+        genuine_mask = np.zeros_like(distances, dtype=bool)
+        genuine_mask[np.arange(len(probes)), own] = True
+        report["accuracy"] = accuracy_report(distances[genuine_mask], distances[~genuine_mask],
+                                             args.tolerances, args.far_target)
+    else:
+        print("[WARN] Need at least two photos of a person (photos/<person>/...) for accuracy metrics.")
+
+    report["stages_ms"] = timer.report()
+    return report
+
+
+def run_video(args):
+    video = cv2.VideoCapture(args.video)
+    if not video.isOpened():
+        raise SystemExit(f"[ERROR] Could not open video '{args.video}'")
+    video_fps = video.get(cv2.CAP_PROP_FPS) or 30.0
+    scale = args.scale or DETECTION_SCALE
+    detectors.get_detector(args.detector) # Load models before timing starts
+    timer = StageTimer()
+
+    # 1. Every frame through detection (+ encoding when faces are found)
+    has_face, frame_ms = [], []
+    while args.max_frames <= 0 or len(has_face) < args.max_frames:
+        ret, frame = video.read()
+        if not ret:
+            break
+        start = time.perf_counter()
+        small = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+        face_locations, _, timings = detect_and_encode(cv2.cvtColor(small, cv2.COLOR_BGR2RGB), args.detector)
+        frame_ms.append((time.perf_counter() - start) * 1000)
+        timer.add(timings)
+        has_face.append(bool(face_locations))
+    video.release()
+    if not has_face:
+        raise SystemExit("[ERROR] Video has no frames")
+
+    # 2. Frame-skip settings: load vs. face appearances never looked at
+    has_face = np.asarray(has_face)
+    frame_ms = np.asarray(frame_ms)
+    starts = np.flatnonzero(has_face & ~np.concatenate([[False], has_face[:-1]]))
+    ends = np.flatnonzero(has_face & ~np.concatenate([has_face[1:], [False]]))
+    skips = []
+    for every in args.every:
+        processed = np.arange(len(has_face)) % every == every - 1
+        missed = sum(1 for s, e in zip(starts, ends) if not processed[s:e + 1].any())
+        first_seen = [np.flatnonzero(processed[s:e + 1])[0] for s, e in zip(starts, ends) if processed[s:e + 1].any()]
+        skips.append({
+            "every_n_frames": every,
+            "processed_fps": video_fps / every,
+            "cpu_load": float(frame_ms[processed].mean() * video_fps / every / 1000) if processed.any() else 0.0,
+            "appearances_missed": missed,
+            "mean_first_detection_delay_ms": float(np.mean(first_seen) * 1000 / video_fps) if first_seen else None,
+        })
+
+    return {
+        "frames": int(len(has_face)),
+        "video_fps": video_fps,
+        "detector": args.detector,
+        "scale": scale,
+        "frames_with_faces": int(has_face.sum()),
+        "face_appearances": int(len(starts)),
+        "fps": float(1000 / frame_ms.mean()),
+        "frame_ms": summarize(frame_ms.tolist()),
+        "stages_ms": timer.report(),
+        "frame_skip": skips,
+    }
+
+
+def run_synthetic(args):
+    """Gallery-size scaling on synthetic embeddings (several photos per person)."""
+    rng = np.random.default_rng(args.seed)
+    results = []
+    for size in args.sizes:
+        users = max(1, size // args.photos_per_user)
+        people = rng.normal(scale=0.1, size=(users, 128)).astype(np.float32)
+        user_ids = np.repeat(np.arange(users), args.photos_per_user)[:size]
+        gallery = people[user_ids] + rng.normal(scale=0.02, size=(len(user_ids), 128)).astype(np.float32)
+        picks = rng.choice(users, min(args.queries, users), replace=False)
+        queries = people[picks] + rng.normal(scale=0.02, size=(len(picks), 128)).astype(np.float32)
+
+        exact_top = None
+        for kind in args.kinds:
+            index = face_index.build_index(gallery, kind=kind, user_ids=user_ids)
+            latencies = []
+            found = np.empty(len(queries), dtype=np.int64)
+            for i, query in enumerate(queries):
+                start = time.perf_counter()
+                _, idx = index.search(query, k=1)
+                latencies.append((time.perf_counter() - start) * 1000)
+                found[i] = idx[0, 0]
+            if exact_top is None:
+                exact_top = face_index.build_index(gallery, kind="exact").search(queries, k=1)[1][:, 0]
+            stats = index.stats()
+            results.append({
+                "size": int(len(gallery)),
+                "users": users,
+                "kind": kind,
+                "build_ms": stats["build_ms"],
+                "search_ms": summarize(latencies),
+                "recall_at_1": float((found == exact_top).mean()),
+                "identity_accuracy": float((user_ids[found] == picks).mean()),
+                "matrix_mb": gallery.nbytes / 2**20,
+                "index_mb": stats["memory_bytes"] / 2**20,
+            })
+            print(f"[STATS] {kind:>7} @ {len(gallery):>7}: search p50 {results[-1]['search_ms']['p50']:.3f}ms, "
+                  f"p99 {results[-1]['search_ms']['p99']:.3f}ms, recall {results[-1]['recall_at_1']:.3f}, "
+                  f"{results[-1]['index_mb']:.1f} MB")
+    return {"photos_per_user": args.photos_per_user, "queries": args.queries, "scaling": results}
+
+
+def print_summary(report):
+    for name in ("images", "video"):
+        section = report.get(name)
+        if not section:
+            continue
+        print(f"\n[STATS] {name}: {section['fps']:.1f} fps ({section['detector']}, scale {section['scale']})")
+        for stage, s in section["stages_ms"].items():
+            if s["count"]:
+                print(f"        {stage:>8}: p50 {s['p50']:.2f}ms  p90 {s['p90']:.2f}ms  p99 {s['p99']:.2f}ms  (n={s['count']})")
+        if "accuracy" in section:
+            acc = section["accuracy"]
+            print(f"        rank-1 accuracy {section['rank1_accuracy']:.3f} over {section['probes']} probes")
+            for row in acc["by_tolerance"]:
+                far = "n/a" if row["far"] is None else f"{row['far']:.4f}"
+                print(f"        tolerance {row['tolerance']:.2f}: TAR {row['tar']:.3f}  FAR {far}")
+            print(f"        recommended tolerance (FAR <= {acc['far_target']}): {acc['recommended_tolerance']}")
+        for row in section.get("frame_skip", []):
+            print(f"        every {row['every_n_frames']} frame(s): load {row['cpu_load']:.2f} cores, "
+                  f"missed {row['appearances_missed']}/{section['face_appearances']} appearances")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="Directory of photos, one sub-folder per person")
+    parser.add_argument("--video", help="Video file to run frame by frame")
+    parser.add_argument("--synthetic", action="store_true", help="Gallery scaling on synthetic embeddings")
+    parser.add_argument("--detector", default=detectors.FACE_DETECTOR, help="hog, haar, dnn or gated")
+    parser.add_argument("--scale", type=float, help=f"Resize before detection (images 1.0, video {DETECTION_SCALE})")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Match tolerance for rank-1 accuracy")
+    parser.add_argument("--tolerances", type=_csv, default=_csv(DEFAULT_TOLERANCES), help="TAR/FAR operating points")
+    parser.add_argument("--far-target", type=float, default=0.001, help="FAR for the recommended tolerance")
+    parser.add_argument("--every", type=lambda v: _csv(v, int), default=[1, 2, 3, 5], help="Frame-skip values to compare")
+    parser.add_argument("--max-frames", type=int, default=0, help="Stop the video after this many frames (0 = all)")
+    parser.add_argument("--sizes", type=lambda v: _csv(v, int), default=[1000, 10000, 50000], help="Synthetic gallery sizes")
+    parser.add_argument("--kinds", type=lambda v: _csv(v, str), default=["exact", "ivf", "compact"], help="Index kinds to compare")
+    parser.add_argument("--photos-per-user", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON report path")
+    args = parser.parse_args()
+
+    if not (args.images or args.video or args.synthetic):
+        parser.error("Choose at least one of --images, --video or --synthetic")
+
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "face_recognition": face_recognition.__version__,
+        },
+        "settings": {k: v for k, v in vars(args).items() if k != "output"},
+    }
+    if args.images:
+        print(f"[INFO] Benchmarking images in '{args.images}'...")
+        report["images"] = run_images(args)
+    if args.video:
+        print(f"[INFO] Benchmarking video '{args.video}'...")
+        report["video"] = run_video(args)
+    if args.synthetic:
+        print("[INFO] Benchmarking gallery scaling on synthetic embeddings...")
+        report["synthetic"] = run_synthetic(args)
+
+    print_summary(report)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n[SUCCESS] Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,114 +1,182 @@
 import cv2
-import face_recognition
-import numpy as np
 import time
 from datetime import datetime, timedelta
+import os
+import sys
 import client_utils
+from pipeline import CameraPipeline, DETECTION_SCALE
+from uploader import AttendanceUploader
+
+# The matching index is shared with the backend (pure NumPy, no app imports)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "app"))
+import face_index
+
+# Match against the server-side gallery (POST /recognize) instead of a local copy
+SERVER_MATCHING = os.environ.get("SERVER_MATCHING", "0") == "1"
+TOLERANCE = 0.5
+SYNC_INTERVAL_SECONDS = 30 # How often to pull gallery deltas from the server
+FACE_INDEX_KIND = os.environ.get("FACE_INDEX", "auto") # "auto", "exact", "ivf" or "compact"
+COOLDOWN_SECONDS = 60 # Only log once per minute per person
+
+
+class Recognizer:
+    """
+    Matching + attendance stage of the pipeline.
+    Owns the local gallery and its index, and keeps them in sync with the server.
+    """
+
+    def __init__(self, uploader):
+        self.uploader = uploader
+        self.gallery = client_utils.LocalGallery()
+        # Cooldown cache to prevent spamming the server
+        # user_id -> last_logged_time
+        self.attendance_cooldown = {}
+        self.last_sync = 0
+
+    def load(self):
+        if SERVER_MATCHING:
+            print("[INFO] Using server-side matching, skipping gallery sync.")
+        else:
+            print("[INFO] Syncing with server...")
+            self.gallery.load()
+            if self.gallery.cursor == 0:
+                client_utils.bootstrap_gallery(self.gallery)
+            client_utils.sync_gallery(self.gallery)
+        self._rebuild()
+        print(f"[INFO] Loaded {len(self.known_encodings)} encodings for {len(set(self.known_ids))} users ({self.index.kind} index).")
+        self.last_sync = time.time()
+
+    def _rebuild(self):
+        self.known_ids, self.known_encodings, self.known_names = self.gallery.arrays()
+        self.index = face_index.build_index(self.known_encodings, kind=FACE_INDEX_KIND, user_ids=self.known_ids)
+
+    def maybe_sync(self):
+        # Apply enrollment deltas without restarting
+        if SERVER_MATCHING or time.time() - self.last_sync <= SYNC_INTERVAL_SECONDS:
+            return
+        if client_utils.sync_gallery(self.gallery):
+            self._rebuild()
+            print(f"[INFO] Gallery updated: {len(self.known_encodings)} encodings.")
+        self.last_sync = time.time()
+
+    def identify(self, face_encodings, exclude=()):
+        """
+        Returns (user_id or None, name) for each encoding of one frame.
+        Locally, all faces are matched in one batch and never two to the same
+        user, nor to a user in `exclude` (already on a confirmed track here).
+        """
+        if SERVER_MATCHING:
+            # One round-trip for every face in the frame
+            matches = client_utils.recognize_on_server(face_encodings, tolerance=TOLERANCE)
+            if matches is None:
+                return [(None, "Unknown")] * len(face_encodings)
+            return [(m["user_id"], m["name"]) if m["matched"] else (None, "Unknown") for m in matches]
+
+        if len(self.known_encodings) == 0:
+            return [(None, "Unknown")] * len(face_encodings)
+        rows, _, matched = face_index.match_faces(self.index, face_encodings, self.known_ids, TOLERANCE, exclude=exclude)
+        return [
+            (int(self.known_ids[row]), self.known_names[row]) if is_match else (None, "Unknown")
+            for row, is_match in zip(rows, matched)
+        ]
+
+    def __call__(self, frame, face_locations, face_encodings, tracks):
+        """Identifies every face in a processed frame and logs attendance. Returns names."""
+        self.maybe_sync()
+        now = time.time()
+
+        # Faces on a confirmed track come without an encoding: the track keeps its identity
+        to_identify = [i for i, encoding in enumerate(face_encodings) if encoding is not None]
+        if to_identify:
+            on_tracks = {track.user_id for track, encoding in zip(tracks, face_encodings) if encoding is None and track.confirmed}
+            identities = self.identify([face_encodings[i] for i in to_identify], exclude=on_tracks)
+            for i, (user_id, name) in zip(to_identify, identities):
+                tracks[i].observe(user_id, name, now)
+
+        scale = int(round(1 / DETECTION_SCALE))
+        face_names = []
+        for face_location, track in zip(face_locations, tracks):
+            # Log Attendance once the track agreed on the same person enough times, if cooldown passed
+            if track.confirmed:
+                logged_at = datetime.now()
+                last_log = self.attendance_cooldown.get(track.user_id)
+
+                if last_log is None or (logged_at - last_log) > timedelta(seconds=COOLDOWN_SECONDS):
+                    # Spooled locally (face crop only); uploaded in the background
+                    self.uploader.enqueue(track.user_id, frame, tuple(v * scale for v in face_location))
+                    self.attendance_cooldown[track.user_id] = logged_at
+
+            face_names.append(track.name)
+        return face_names
+
+
+def draw_overlay(frame, face_locations, face_names):
+    scale = int(round(1 / DETECTION_SCALE))
+    for (top, right, bottom, left), name in zip(face_locations, face_names):
+        # Scale back up
+        top *= scale
+        right *= scale
+        bottom *= scale
+        left *= scale
+
+        # Aesthetic Colors (Cyan/Blue for known, Red for Unknown)
+        # Format: BGR
+        box_color = (255, 191, 0) if name != "Unknown" else (0, 0, 255) # Deep Sky Blue or Red
+
+        # Semi-transparent label background
+        overlay = frame.copy()
+        cv2.rectangle(overlay, (left, bottom - 40), (right, bottom), box_color, -1)
+        alpha = 0.6
+        cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
+
+        # Clean outline
+        cv2.rectangle(frame, (left, top), (right, bottom), box_color, 2)
+
+        # Typography
+        cv2.putText(frame, name.upper(), (left + 10, bottom - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+
 
 def run_camera():
     # 1. Sync with Server
-    print("[INFO] Syncing with server...")
-    known_ids, known_encodings, known_names = client_utils.get_known_faces()
-    print(f"[INFO] Loaded {len(known_names)} users.")
-    
+    uploader = AttendanceUploader()
+    uploader.start()
+    recognizer = Recognizer(uploader)
+    recognizer.load()
+
     video = cv2.VideoCapture(0)
-    
-    # Haarcascade for faster detection (optional, but good for pre-filtering)
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
-    
-    # Cooldown cache to prevent spamming the server
-    # user_id -> last_logged_time
-    attendance_cooldown = {}
-    COOLDOWN_SECONDS = 60 # Only log once per minute per person
-    
-    print("[INFO] Starting Camera... Press 'q' to quit.")
-    
-    process_this_frame = True
-    frame_count = 0
-    
-    while True:
-        ret, frame = video.read()
-        if not ret:
-            break
-            
-        # Optimization: Process only every 3rd frame
-        frame_count += 1
-        if frame_count % 3 != 0:
-            # Still display the frame, just don't re-process face recog
-            # But we need to use 'face_locations' from previous frame to keep drawing boxes
-            # For simplicity in this iteration, we just show the raw frame or 
-            # we could cache the last known locations. 
-            # Better UI approach: process every N frames, and linear interpolate or just hold rects.
-            pass
-        else:
-            # Resize frame for faster processing
-            small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-            rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-            
-            # Detect faces
-            face_locations = face_recognition.face_locations(rgb_small_frame)
-            face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
-            
-            face_names = []
-            
-            for face_encoding in face_encodings:
-                # Check for matches
-                matches = face_recognition.compare_faces(known_encodings, face_encoding, tolerance=0.5)
-                name = "Unknown"
-                user_id = None
-                
-                face_distances = face_recognition.face_distance(known_encodings, face_encoding)
-                if len(face_distances) > 0:
-                    best_match_index = np.argmin(face_distances)
-                    if matches[best_match_index]:
-                        name = known_names[best_match_index]
-                        user_id = known_ids[best_match_index]
-                        
-                        # Log Attendance if cooldown passed
-                        now = datetime.now()
-                        last_log = attendance_cooldown.get(user_id)
-                        
-                        if last_log is None or (now - last_log) > timedelta(seconds=COOLDOWN_SECONDS):
-                            client_utils.log_attendance_to_server(user_id, frame)
-                            attendance_cooldown[user_id] = now
-                
-                face_names.append(name)
-            
-        # Display results (UI Polish)
-        # We need a fallback if face_locations isn't defined yet (first few frames)
-        if 'face_locations' in locals():
-            for (top, right, bottom, left), name in zip(face_locations, face_names):
-                # Scale back up
-                top *= 4
-                right *= 4
-                bottom *= 4
-                left *= 4
-                
-                # Aesthetic Colors (Cyan/Blue for known, Red for Unknown)
-                # Format: BGR
-                box_color = (255, 191, 0) if name != "Unknown" else (0, 0, 255) # Deep Sky Blue or Red
-                
-                # Draw stylish corners instead of full box
-                # cv2.rectangle(frame, (left, top), (right, bottom), box_color, 2)
-                
-                # Semi-transparent label background
-                overlay = frame.copy()
-                cv2.rectangle(overlay, (left, bottom - 40), (right, bottom), box_color, -1)
-                alpha = 0.6
-                cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
-                
-                # Clean outline
-                cv2.rectangle(frame, (left, top), (right, bottom), box_color, 2)
-                
-                # Typography
-                cv2.putText(frame, name.upper(), (left + 10, bottom - 10), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            
-        cv2.imshow('Face Attendance Client', frame)
-        
+
+    # 2. Capture / detect+encode / recognize run on their own threads
+    pipeline = CameraPipeline(video, on_faces=recognizer)
+    pipeline.start()
+    print(f"[INFO] Starting Camera with {pipeline.workers} worker(s), '{pipeline.detector_kind}' detector... Press 'q' to quit.")
+
+    # 3. Render loop: always shows the newest frame with the last known boxes
+    last_frame = None
+    last_stats = time.time()
+    while pipeline.running:
+        frame, (face_locations, face_names) = pipeline.latest()
+        if frame is None or frame is last_frame:
+            if cv2.waitKey(5) & 0xFF == ord('q'):
+                break
+            continue
+        last_frame = frame
+
+        display = frame.copy() # The original may still be used as attendance evidence
+        draw_overlay(display, face_locations, face_names)
+        cv2.imshow('Face Attendance Client', display)
+
+        if time.time() - last_stats > 10:
+            stats = pipeline.stats()
+            timings = ", ".join(f"{stage} {ms:.1f}ms" for stage, ms in stats["timings_ms"].items())
+            print(f"[STATS] capture {stats['capture_fps']:.1f} fps, processed {stats['processed_fps']:.1f} fps, dropped {stats['dropped']}, skipped {stats['skipped']} ({'active' if stats['active'] else 'idle'}), {stats['tracks']} track(s), {stats['reused']} encodings reused | {stats['detector']}: {timings}")
+            last_stats = time.time()
+
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
-            
+
+    pipeline.stop()
+    uploader.stop()
     video.release()
     cv2.destroyAllWindows()
 
@@ -1,9 +1,30 @@
 import requests
-import pickle
 import base64
 import time
+import os
+import json
+import socket
+import numpy as np
+from datetime import datetime, timezone
 
 API_URL = "http://127.0.0.1:8000"
+DEVICE_ID = os.environ.get("DEVICE_ID", socket.gethostname())
+GALLERY_CACHE = os.environ.get("GALLERY_CACHE", "gallery_cache.npz")
+
+# Wire format of encodings (mirrors backend/app/encoding_format.py)
+ENCODING_DIM = 128
+ENCODING_DTYPE = np.dtype("<f4")
+EXPORT_DTYPE = np.dtype([
+    ("id", "<i8"),
+    ("user_id", "<i8"),
+    ("encoding", ENCODING_DTYPE, (ENCODING_DIM,)),
+])
+
+def decode_encoding(data):
+    """Raw float32 bytes -> (128,) array. Server data is never unpickled."""
+    if len(data) != ENCODING_DIM * ENCODING_DTYPE.itemsize:
+        raise ValueError(f"Unexpected encoding size: {len(data)} bytes")
+    return np.frombuffer(data, dtype=ENCODING_DTYPE)
 
 def get_known_faces():
     """
@@ -31,8 +52,8 @@ def get_known_faces():
                     try:
                         # 1. Base64 decode
                         encoding_bytes = base64.b64decode(face["encoding"])
-                        # 2. Unpickle
-                        encoding_np = pickle.loads(encoding_bytes)
+                        # 2. Raw float32 -> numpy
+                        encoding_np = decode_encoding(encoding_bytes)
                         
                         known_ids.append(user["id"])
                         known_encodings.append(encoding_np)
@@ -46,24 +67,220 @@ def get_known_faces():
         print(f"[ERROR] Failed to sync with server: {e}")
         return [], [], []
 
-import cv2
+class LocalGallery:
+    """
+    The kiosk's copy of the face gallery, kept in sync through the backend's
+    /encodings/changes feed and cached on disk together with its cursor,
+    so a restart only downloads what changed while it was off.
+    Encodings live in one (N x 128) float32 array, never as per-row objects.
+    """
+
+    def __init__(self, cache_path=GALLERY_CACHE):
+        self.cache_path = cache_path
+        self.cursor = 0
+        self.encoding_ids = np.empty(0, dtype=np.int64)
+        self.user_ids = np.empty(0, dtype=np.int64)
+        self.encodings = np.empty((0, ENCODING_DIM), dtype=ENCODING_DTYPE)
+        self.names = {} # user_id -> name
+
+    def __len__(self):
+        return len(self.encoding_ids)
+
+    def load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with np.load(self.cache_path, allow_pickle=False) as data:
+                self.cursor = int(data["cursor"])
+                self.encoding_ids = data["encoding_ids"]
+                self.user_ids = data["user_ids"]
+                self.encodings = data["encodings"].astype(ENCODING_DTYPE, copy=False)
+                self.names = dict(zip(data["name_user_ids"].tolist(), data["names"].tolist()))
+        except Exception as e:
+            print(f"[WARN] Ignoring unreadable gallery cache: {e}")
+            self.__init__(self.cache_path)
+
+    def save(self):
+        np.savez(
+            self.cache_path,
+            cursor=np.int64(self.cursor),
+            encoding_ids=self.encoding_ids,
+            user_ids=self.user_ids,
+            encodings=self.encodings,
+            name_user_ids=np.array(list(self.names.keys()), dtype=np.int64),
+            names=np.array(list(self.names.values()), dtype=str)
+        )
+
+    def load_export(self, payload, cursor, names):
+        """Replaces the gallery with a /encodings/export body (zero-copy view)."""
+        records = np.frombuffer(payload, dtype=EXPORT_DTYPE)
+        self.encoding_ids = records["id"]
+        self.user_ids = records["user_id"]
+        self.encodings = records["encoding"]
+        self.names = names
+        self.cursor = cursor
+
+    def apply_changes(self, changes):
+        added = {} # encoding_id -> (user_id, encoding)
+        removed = set()
+        for change in changes:
+            op = change["op"]
+            if op == "add":
+                try:
+                    encoding_np = decode_encoding(base64.b64decode(change["encoding"]))
+                except Exception as e:
+                    print(f"Skipping bad encoding {change['encoding_id']}: {e}")
+                    continue
+                added[change["encoding_id"]] = (change["user_id"], encoding_np)
+                self.names[change["user_id"]] = change["name"]
+            elif op == "remove":
+                added.pop(change["encoding_id"], None)
+                removed.add(change["encoding_id"])
+            elif op == "rename":
+                self.names[change["user_id"]] = change["name"]
+            elif op == "reset":
+                self.__init__(self.cache_path)
+                added.clear()
+                removed.clear()
+
+        # Apply the whole batch with one mask and one concatenate
+        drop = removed | set(added)
+        if drop:
+            keep = ~np.isin(self.encoding_ids, list(drop))
+            self.encoding_ids = self.encoding_ids[keep]
+            self.user_ids = self.user_ids[keep]
+            self.encodings = self.encodings[keep]
+        if added:
+            self.encoding_ids = np.concatenate([self.encoding_ids, np.fromiter(added.keys(), dtype=np.int64)])
+            self.user_ids = np.concatenate([self.user_ids, np.array([u for u, _ in added.values()], dtype=np.int64)])
+            self.encodings = np.concatenate([self.encodings, np.stack([e for _, e in added.values()])])
+
+    def arrays(self):
+        """Returns (ids, encodings, names) in the shape get_known_faces() uses."""
+        known_names = [self.names.get(int(u), "Unknown") for u in self.user_ids]
+        return self.user_ids, self.encodings, known_names
 
-def log_attendance_to_server(user_id, frame=None):
+def bootstrap_gallery(gallery):
+    """
+    Cold start: downloads the whole gallery as one binary blob.
+    Returns True on success; the caller continues with sync_gallery().
+    """
+    try:
+        response = requests.get(f"{API_URL}/encodings/export")
+        response.raise_for_status()
+        names_response = requests.get(f"{API_URL}/encodings/names")
+        names_response.raise_for_status()
+
+        names = {int(k): v for k, v in names_response.json().items()}
+        gallery.load_export(response.content, int(response.headers["X-Gallery-Cursor"]), names)
+        gallery.save()
+        return True
+    except Exception as e:
+        print(f"[ERROR] Failed to download gallery: {e}")
+        return False
+
+def sync_gallery(gallery):
+    """
+    Pulls every change after the gallery's cursor and applies it.
+    Returns True if the gallery changed.
+    """
+    changed = False
+    try:
+        while True:
+            response = requests.get(f"{API_URL}/encodings/changes", params={"since": gallery.cursor})
+            response.raise_for_status()
+            feed = response.json()
+
+            if feed["changes"]:
+                gallery.apply_changes(feed["changes"])
+                changed = True
+            if feed["cursor"] != gallery.cursor:
+                gallery.cursor = feed["cursor"]
+                changed = True
+            if not feed["has_more"]:
+                break
+    except Exception as e:
+        print(f"[ERROR] Failed to sync with server: {e}")
+
+    if changed:
+        gallery.save()
+    return changed
+
+def recognize_on_server(encodings, tolerance=0.5):
+    """
+    Sends all encodings from one frame to the backend's /recognize endpoint.
+    Returns one match dict (user_id, name, distance, matched) per encoding,
+    or None if the server could not be reached.
+    """
+    try:
+        payload = {
+            "encodings": [[float(x) for x in enc] for enc in encodings],
+            "tolerance": tolerance
+        }
+        response = requests.post(f"{API_URL}/recognize", json=payload)
+        response.raise_for_status()
+        return response.json()["matches"]
+    except Exception as e:
+        print(f"[ERROR] Server recognition failed: {e}")
+        return None
+
+import evidence
+
+def _iso_utc(epoch_seconds):
+    return datetime.fromtimestamp(epoch_seconds, tz=timezone.utc).isoformat()
+
+def post_attendance(user_id, image_bytes=None, captured_at=None):
+    """
+    Posts one attendance log (with optional JPEG evidence) to the backend.
+    Raises requests exceptions on failure so callers can decide whether to retry.
+    """
+    data = {"user_id": user_id, "device_id": DEVICE_ID}
+    if captured_at is not None:
+        data["timestamp"] = _iso_utc(captured_at)
+    files = None
+    if image_bytes is not None:
+        ext, content_type = evidence.image_type(image_bytes)
+        files = {"file": (f"evidence{ext}", image_bytes, content_type)}
+
+    response = requests.post(f"{API_URL}/attendance/", data=data, files=files, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+def post_attendance_batch(records):
+    """
+    Posts many attendance logs in one request to /attendance/batch.
+    `records` are (user_id, captured_at epoch seconds, image bytes or None).
+    Returns the server's {"created": [...], "rejected": [...]}; raises on failure.
+    """
+    events, files = [], []
+    for user_id, captured_at, image_bytes in records:
+        event = {"user_id": user_id, "timestamp": _iso_utc(captured_at), "device_id": DEVICE_ID}
+        if image_bytes is not None:
+            ext, content_type = evidence.image_type(image_bytes)
+            event["file_index"] = len(files)
+            files.append(("files", (f"evidence_{len(files)}{ext}", image_bytes, content_type)))
+        events.append(event)
+
+    response = requests.post(
+        f"{API_URL}/attendance/batch",
+        data={"events": json.dumps(events)},
+        files=files or None,
+        timeout=30
+    )
+    response.raise_for_status()
+    return response.json()
+
+def log_attendance_to_server(user_id, frame=None, face_location=None):
     """
     Sends an attendance log to the backend.
     """
     try:
-        data = {"user_id": user_id}
-        files = None
-        
+        image_bytes = None
         if frame is not None:
-            # Encode frame to jpg
-            ret, buffer = cv2.imencode('.jpg', frame)
-            if ret:
-                files = {"file": ("evidence.jpg", buffer.tobytes(), "image/jpeg")}
+            # Compact face crop instead of the full frame
+            image_bytes = evidence.encode_evidence(frame, face_location)
         
-        response = requests.post(f"{API_URL}/attendance/", data=data, files=files)
-        response.raise_for_status()
+        post_attendance(user_id, image_bytes)
         print(f"[SUCCESS] Logged attendance for User ID: {user_id}")
     except Exception as e:
         print(f"[ERROR] Failed to log attendance: {e}")
@@ -0,0 +1,141 @@
+import os
+import time
+from abc import ABC, abstractmethod
+
+import cv2
+import face_recognition
+
+# --- Detector Settings (override via env) ---
+FACE_DETECTOR = os.environ.get("FACE_DETECTOR", "hog") # "hog", "haar", "dnn" or "gated"
+GATE_DETECTOR = os.environ.get("GATE_DETECTOR", "haar") # Cheap check that must fire before "gated" runs HOG
+_default_cascade = os.path.join(getattr(getattr(cv2, "data", None), "haarcascades", ""), "haarcascade_frontalface_default.xml")
+HAAR_CASCADE_PATH = os.environ.get("HAAR_CASCADE", _default_cascade)
+# Local model file: YuNet (.onnx) or the res10 SSD (.caffemodel + deploy.prototxt as DNN_CONFIG)
+DNN_MODEL_PATH = os.environ.get("DNN_MODEL", "face_detection_yunet.onnx")
+DNN_CONFIG_PATH = os.environ.get("DNN_CONFIG", "")
+DNN_CONFIDENCE = float(os.environ.get("DNN_CONFIDENCE", "0.6"))
+
+
+class Detector(ABC):
+    """Finds faces in an RGB frame; returns (top, right, bottom, left) boxes like face_recognition."""
+    name = "detector"
+
+    @abstractmethod
+    def detect(self, rgb_frame):
+        ...
+
+    def detect_timed(self, rgb_frame):
+        """Returns (face_locations, {stage name: milliseconds})."""
+        start = time.perf_counter()
+        face_locations = self.detect(rgb_frame)
+        return face_locations, {self.name: (time.perf_counter() - start) * 1000}
+
+
+class HogDetector(Detector):
+    name = "hog"
+
+    def detect(self, rgb_frame):
+        return face_recognition.face_locations(rgb_frame)
+
+
+class HaarDetector(Detector):
+    name = "haar"
+
+    def __init__(self, cascade_path=HAAR_CASCADE_PATH):
+        if not hasattr(cv2, "CascadeClassifier"):
+            raise RuntimeError("This OpenCV build has no Haar cascade support (cv2.CascadeClassifier)")
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise RuntimeError(f"Could not load Haar cascade '{cascade_path}' (set HAAR_CASCADE)")
+
+    def detect(self, rgb_frame):
+        gray = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2GRAY)
+        boxes = self.cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5)
+        return [(int(y), int(x + w), int(y + h), int(x)) for (x, y, w, h) in boxes]
+
+
+class DnnDetector(Detector):
+    """OpenCV DNN face detector from a local model file: YuNet (.onnx) or the res10 SSD."""
+    name = "dnn"
+
+    def __init__(self, model_path=DNN_MODEL_PATH, config_path=DNN_CONFIG_PATH, confidence=DNN_CONFIDENCE):
+        if not os.path.exists(model_path):
+            raise RuntimeError(f"DNN face model '{model_path}' not found (set DNN_MODEL)")
+        self.confidence = confidence
+        self.yunet = None
+        self.net = None
+        if model_path.endswith(".onnx"):
+            self.yunet = cv2.FaceDetectorYN.create(model_path, "", (320, 320), confidence)
+        else:
+            self.net = cv2.dnn.readNet(model_path, config_path)
+
+    def detect(self, rgb_frame):
+        height, width = rgb_frame.shape[:2]
+        bgr = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2BGR)
+
+        if self.yunet is not None:
+            self.yunet.setInputSize((width, height))
+            _, faces = self.yunet.detect(bgr)
+            boxes = [] if faces is None else [face[:4] for face in faces]
+        else:
+            blob = cv2.dnn.blobFromImage(cv2.resize(bgr, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+            self.net.setInput(blob)
+            detections = self.net.forward()[0, 0]
+            boxes = []
+            for detection in detections:
+                if detection[2] < self.confidence:
+                    continue
+                x1, y1, x2, y2 = detection[3:7] * [width, height, width, height]
+                boxes.append((x1, y1, x2 - x1, y2 - y1))
+
+        locations = []
+        for x, y, w, h in boxes:
+            left, top = max(0, int(x)), max(0, int(y))
+            right, bottom = min(width, int(x + w)), min(height, int(y + h))
+            if right > left and bottom > top:
+                locations.append((top, right, bottom, left))
+        return locations
+
+
+class GatedDetector(Detector):
+    """
+    Runs a cheap detector first and the accurate one only when it finds something,
+    so empty frames cost a few ms instead of a full HOG pass.
+    """
+    name = "gated"
+
+    def __init__(self, gate, detector):
+        self.gate = gate
+        self.detector = detector
+
+    def detect(self, rgb_frame):
+        return self.detect_timed(rgb_frame)[0]
+
+    def detect_timed(self, rgb_frame):
+        candidates, timings = self.gate.detect_timed(rgb_frame)
+        if not candidates:
+            return [], timings
+        face_locations, detector_timings = self.detector.detect_timed(rgb_frame)
+        timings.update(detector_timings)
+        return face_locations, timings
+
+
+def make_detector(kind=FACE_DETECTOR):
+    if kind == "hog":
+        return HogDetector()
+    if kind == "haar":
+        return HaarDetector()
+    if kind == "dnn":
+        return DnnDetector()
+    if kind == "gated":
+        return GatedDetector(make_detector(GATE_DETECTOR), HogDetector())
+    raise ValueError(f"Unknown FACE_DETECTOR '{kind}' (use hog, haar, dnn or gated)")
+
+
+# One detector per process (pipeline workers build theirs on first use)
+_detectors = {}
+
+def get_detector(kind=FACE_DETECTOR):
+    if kind not in _detectors:
+        _detectors[kind] = make_detector(kind)
+    return _detectors[kind]
@@ -0,0 +1,47 @@
+import os
+
+import cv2
+
+# --- Evidence Settings (override via env) ---
+EVIDENCE_FORMAT = os.environ.get("EVIDENCE_FORMAT", "jpg") # "jpg" or "webp"
+EVIDENCE_MAX_SIDE = int(os.environ.get("EVIDENCE_MAX_SIDE", "320"))
+EVIDENCE_QUALITY = int(os.environ.get("EVIDENCE_QUALITY", "80"))
+EVIDENCE_MARGIN = float(os.environ.get("EVIDENCE_MARGIN", "0.6")) # Of the face size, added on each side
+
+
+def crop_face(frame, face_location, margin=EVIDENCE_MARGIN):
+    """Crops (top, right, bottom, left) plus a margin, clipped to the frame."""
+    top, right, bottom, left = face_location
+    pad_y = int((bottom - top) * margin)
+    pad_x = int((right - left) * margin)
+    height, width = frame.shape[:2]
+    return frame[max(0, top - pad_y):min(height, bottom + pad_y), max(0, left - pad_x):min(width, right + pad_x)]
+
+def encode_evidence(frame, face_location=None):
+    """
+    Attendance evidence as compact image bytes: the matched face plus margin
+    (whole frame without a location), downscaled to EVIDENCE_MAX_SIDE and
+    re-encoded at EVIDENCE_QUALITY. Returns None if encoding fails.
+    """
+    image = frame
+    if face_location is not None:
+        cropped = crop_face(frame, face_location)
+        if cropped.size:
+            image = cropped
+
+    height, width = image.shape[:2]
+    scale = EVIDENCE_MAX_SIDE / max(height, width)
+    if scale < 1:
+        image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+
+    if EVIDENCE_FORMAT == "webp":
+        ret, buffer = cv2.imencode('.webp', image, [cv2.IMWRITE_WEBP_QUALITY, EVIDENCE_QUALITY])
+    else:
+        ret, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, EVIDENCE_QUALITY])
+    return buffer.tobytes() if ret else None
+
+def image_type(image_bytes):
+    """(file extension, content type) of encoded evidence, from its magic bytes."""
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return ".webp", "image/webp"
+    return ".jpg", "image/jpeg"
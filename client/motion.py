@@ -0,0 +1,113 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+# --- Motion Gating Settings (override via env) ---
+MOTION_GATING = os.environ.get("MOTION_GATING", "1") == "1"
+MOTION_THRESHOLD = float(os.environ.get("MOTION_THRESHOLD", "0.01")) # Fraction of pixels that must change
+MOTION_PIXEL_DELTA = int(os.environ.get("MOTION_PIXEL_DELTA", "25")) # Grey-level change that counts as "changed"
+MOTION_HOLD_SECONDS = float(os.environ.get("MOTION_HOLD_SECONDS", "3.0")) # Stay active this long after motion/faces
+ACTIVE_EVERY_N_FRAMES = int(os.environ.get("ACTIVE_EVERY_N_FRAMES", "1"))
+IDLE_INTERVAL_SECONDS = float(os.environ.get("IDLE_INTERVAL_SECONDS", "2.0")) # Heartbeat while idle; 0 = never
+BACKGROUND_LEARNING_RATE = 0.05
+MOTION_WIDTH = 160 # Frames are compared at this width; costs well under a millisecond
+
+
+class EveryNthFrame:
+    """Fixed-rate scheduling: every Nth frame goes to detection."""
+
+    def __init__(self, n):
+        self.n = max(1, n)
+        self.frame_count = 0
+        self.skipped = 0
+
+    def should_process(self, frame, now=None):
+        self.frame_count += 1
+        if self.frame_count % self.n == 0:
+            return True
+        self.skipped += 1
+        return False
+
+    def keep_alive(self, now=None):
+        pass
+
+    @property
+    def active(self):
+        return True
+
+
+class MotionGate:
+    """
+    Adaptive scheduling: detection runs only while something is happening.
+
+    Each frame is shrunk, greyed and compared with a running-average background.
+    When enough pixels changed, the gate turns active and passes every
+    ACTIVE_EVERY_N_FRAMES-th frame. It stays active for MOTION_HOLD_SECONDS after
+    the last motion or detected face, so someone standing still at the kiosk is
+    still recognized. While idle only an occasional heartbeat frame is passed,
+    so an empty corridor costs almost nothing.
+    """
+
+    def __init__(self, threshold=MOTION_THRESHOLD, pixel_delta=MOTION_PIXEL_DELTA,
+                 hold_seconds=MOTION_HOLD_SECONDS, active_every_n=ACTIVE_EVERY_N_FRAMES,
+                 idle_interval=IDLE_INTERVAL_SECONDS):
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.hold_seconds = hold_seconds
+        self.active_every_n = max(1, active_every_n)
+        self.idle_interval = idle_interval
+
+        self._background = None
+        self._active_until = 0.0
+        self._last_processed = 0.0
+        self._active_count = 0
+        self.last_score = 0.0
+        self.skipped = 0
+
+    def motion_score(self, frame):
+        """Fraction of pixels that differ from the background (and updates the background)."""
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (MOTION_WIDTH, max(1, round(height * MOTION_WIDTH / width))), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0).astype(np.float32)
+
+        if self._background is None:
+            self._background = gray
+            return 0.0 # First frame; the idle heartbeat still looks at it
+
+        changed = np.count_nonzero(cv2.absdiff(gray, self._background) > self.pixel_delta)
+        cv2.accumulateWeighted(gray, self._background, BACKGROUND_LEARNING_RATE)
+        return changed / gray.size
+
+    def keep_alive(self, now=None):
+        """Called when faces were found: stay active even if they hold still."""
+        now = time.time() if now is None else now
+        self._active_until = max(self._active_until, now + self.hold_seconds)
+
+    @property
+    def active(self):
+        return time.time() < self._active_until
+
+    def should_process(self, frame, now=None):
+        now = time.time() if now is None else now
+        self.last_score = self.motion_score(frame)
+        if self.last_score >= self.threshold:
+            self.keep_alive(now)
+
+        if now < self._active_until:
+            self._active_count += 1
+            if self._active_count % self.active_every_n == 0:
+                self._last_processed = now
+                return True
+        elif self.idle_interval > 0 and now - self._last_processed >= self.idle_interval:
+            # Heartbeat: catches anything the motion check is blind to (e.g. very slow approach)
+            self._last_processed = now
+            return True
+
+        self.skipped += 1
+        return False
+
+
+def make_scheduler(motion_gating=MOTION_GATING, process_every_n=1):
+    return MotionGate() if motion_gating else EveryNthFrame(process_every_n)
@@ -0,0 +1,212 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+import face_recognition
+
+import detectors
+import motion
+import tracker
+
+# --- Pipeline Settings (override via env) ---
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+PIPELINE_EXECUTOR = os.environ.get("PIPELINE_EXECUTOR", "process") # "process" or "thread"
+FRAME_QUEUE_SIZE = int(os.environ.get("FRAME_QUEUE_SIZE", "2"))
+PROCESS_EVERY_N_FRAMES = int(os.environ.get("PROCESS_EVERY_N_FRAMES", "3")) # Only with MOTION_GATING=0
+DETECTION_SCALE = 0.25
+
+
+def detect_and_encode(rgb_small_frame, detector_kind=detectors.FACE_DETECTOR, stable_boxes=()):
+    """
+    Worker stage: face detection + 128-d encodings on a downscaled RGB frame.
+    Faces on a `stable_boxes` entry (a confirmed track) are not encoded; their
+    encoding comes back as None and the tracker supplies the identity.
+    Returns (face_locations, face_encodings, {stage: ms}).
+    Module-level so it can run in a process pool (each worker keeps its own warm models).
+    """
+    face_locations, timings = detectors.get_detector(detector_kind).detect_timed(rgb_small_frame)
+    face_encodings = [None] * len(face_locations)
+    to_encode = [i for i, reuse in enumerate(tracker.reusable(face_locations, stable_boxes)) if not reuse]
+    if to_encode:
+        start = time.perf_counter()
+        encodings = face_recognition.face_encodings(rgb_small_frame, [face_locations[i] for i in to_encode])
+        timings["encode"] = (time.perf_counter() - start) * 1000
+        for i, encoding in zip(to_encode, encodings):
+            face_encodings[i] = encoding
+    return face_locations, face_encodings, timings
+
+
+class FrameQueue:
+    """Bounded queue that drops the oldest frame instead of blocking the producer."""
+
+    def __init__(self, maxsize=FRAME_QUEUE_SIZE):
+        self._items = deque()
+        self._maxsize = maxsize
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self._maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._items and not self._cond.wait_for(lambda: self._items, timeout=timeout):
+                return None
+            return self._items.popleft()
+
+
+class CameraPipeline:
+    """
+    Staged capture -> detect/encode -> recognize pipeline.
+
+    - capture thread: reads the camera and publishes the latest frame for display;
+      frames the scheduler picks (motion-gated, or every Nth) go into a small
+      drop-oldest queue for processing
+    - dispatch thread: feeds queued frames to a pool of detection/encoding workers
+    - collect thread: takes results in submission order, assigns each face a
+      track and calls `on_faces(frame, face_locations, face_encodings, tracks)`
+      -> list of names (encodings are None for faces on a confirmed track)
+    The render loop (main thread) draws the last known boxes on every frame,
+    so a slow encoding never stalls the preview.
+    """
+
+    def __init__(self, video, on_faces, workers=PIPELINE_WORKERS, executor=PIPELINE_EXECUTOR,
+                 queue_size=FRAME_QUEUE_SIZE, process_every_n=PROCESS_EVERY_N_FRAMES,
+                 detector=detectors.FACE_DETECTOR, motion_gating=motion.MOTION_GATING,
+                 face_tracking=tracker.FACE_TRACKING):
+        self.video = video
+        self.on_faces = on_faces
+        self.scheduler = motion.make_scheduler(motion_gating, process_every_n)
+        # Only the collect thread updates tracks; dispatch reads a snapshot of stable boxes
+        self.tracker = tracker.make_tracker(face_tracking)
+        self.detector_kind = detector
+        detectors.get_detector(detector) # Fail fast on a missing model/cascade
+        self.workers = max(1, workers)
+        self.executor_kind = executor
+
+        self.frames = FrameQueue(queue_size)
+        # Bounds in-flight work: dispatch blocks once every worker is busy
+        self._pending = queue.Queue(maxsize=self.workers)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._executor = None
+
+        self._latest_frame = None
+        self._overlay = ([], []) # (face_locations, names) in small-frame coordinates
+        self.captured = 0
+        self.processed = 0
+        self.reused = 0 # Faces whose encoding was skipped thanks to tracking
+        self._timings = {} # stage -> [frames, total ms]
+        self._started_at = None
+
+    # --- Lifecycle ---
+    def start(self):
+        pool = ProcessPoolExecutor if self.executor_kind == "process" else ThreadPoolExecutor
+        self._executor = pool(max_workers=self.workers)
+        self._started_at = time.time()
+        for target in (self._capture_loop, self._dispatch_loop, self._collect_loop):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=2)
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def running(self):
+        return not self._stop.is_set()
+
+    # --- Stages ---
+    def _capture_loop(self):
+        while not self._stop.is_set():
+            ret, frame = self.video.read()
+            if not ret:
+                self._stop.set()
+                break
+
+            with self._lock:
+                self._latest_frame = frame
+                self.captured += 1
+
+            if self.scheduler.should_process(frame):
+                small_frame = cv2.resize(frame, (0, 0), fx=DETECTION_SCALE, fy=DETECTION_SCALE)
+                rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+                self.frames.put((frame, rgb_small_frame))
+
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            item = self.frames.get(timeout=0.1)
+            if item is None:
+                continue
+            frame, rgb_small_frame = item
+            future = self._executor.submit(detect_and_encode, rgb_small_frame, self.detector_kind,
+                                           self.tracker.stable_boxes())
+            while not self._stop.is_set():
+                try:
+                    self._pending.put((frame, future), timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def _collect_loop(self):
+        while not self._stop.is_set():
+            try:
+                frame, future = self._pending.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                face_locations, face_encodings, timings = future.result()
+                tracks = self.tracker.update(face_locations)
+                names = self.on_faces(frame, face_locations, face_encodings, tracks)
+                if face_locations:
+                    self.scheduler.keep_alive()
+            except Exception as e:
+                print(f"[ERROR] Frame processing failed: {e}")
+                continue
+            with self._lock:
+                self._overlay = (face_locations, names)
+                self.processed += 1
+                self.reused += sum(1 for e in face_encodings if e is None)
+                for stage, ms in timings.items():
+                    total = self._timings.setdefault(stage, [0, 0.0])
+                    total[0] += 1
+                    total[1] += ms
+
+    # --- Render side ---
+    def latest(self):
+        """Returns (latest frame or None, (face_locations, names)) for drawing."""
+        with self._lock:
+            return self._latest_frame, self._overlay
+
+    def stats(self):
+        elapsed = max(time.time() - (self._started_at or time.time()), 1e-6)
+        with self._lock:
+            timings_ms = {stage: total / count for stage, (count, total) in self._timings.items()}
+            stage_frames = {stage: count for stage, (count, _) in self._timings.items()}
+        return {
+            "capture_fps": self.captured / elapsed,
+            "processed_fps": self.processed / elapsed,
+            "dropped": self.frames.dropped,
+            "workers": self.workers,
+            "detector": self.detector_kind,
+            "skipped": self.scheduler.skipped, # Frames the scheduler kept away from detection
+            "active": self.scheduler.active,
+            "tracks": len(self.tracker.tracks),
+            "reused": self.reused,
+            "timings_ms": timings_ms, # Mean per frame that ran the stage
+            "stage_frames": stage_frames,
+        }
@@ -0,0 +1,127 @@
+import itertools
+import os
+import time
+
+# --- Tracking Settings (override via env) ---
+FACE_TRACKING = os.environ.get("FACE_TRACKING", "1") == "1"
+TRACK_IOU_THRESHOLD = float(os.environ.get("TRACK_IOU_THRESHOLD", "0.3")) # Box overlap that continues a track
+TRACK_MAX_AGE_SECONDS = float(os.environ.get("TRACK_MAX_AGE_SECONDS", "1.0")) # Forget tracks unseen this long
+REVERIFY_SECONDS = float(os.environ.get("REVERIFY_SECONDS", "2.0")) # Re-encode a known track this often
+CONFIRM_MATCHES = int(os.environ.get("CONFIRM_MATCHES", "3")) # Consistent matches before attendance is logged
+
+
+def iou(a, b):
+    """Intersection over union of two (top, right, bottom, left) boxes."""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    if bottom <= top or right <= left:
+        return 0.0
+    inter = (bottom - top) * (right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    return inter / float(area_a + area_b - inter)
+
+
+def centroid_distance(a, b):
+    """Distance between box centres, relative to the size of box `a`."""
+    dy = (a[0] + a[2]) / 2 - (b[0] + b[2]) / 2
+    dx = (a[1] + a[3]) / 2 - (b[1] + b[3]) / 2
+    size = max(a[2] - a[0], a[1] - a[3], 1)
+    return (dx * dx + dy * dy) ** 0.5 / size
+
+
+def reusable(face_locations, stable_boxes, iou_threshold=TRACK_IOU_THRESHOLD):
+    """
+    Worker-side check: True for each face that overlaps a box whose identity is
+    already confirmed, so its encoding can be skipped.
+    """
+    return [any(iou(loc, box) >= iou_threshold for box in stable_boxes) for loc in face_locations]
+
+
+class Track:
+    def __init__(self, track_id, box, now, confirm_matches=CONFIRM_MATCHES):
+        self.id = track_id
+        self.confirm_matches = confirm_matches
+        self.box = box
+        self.last_seen = now
+        self.last_encoded = 0.0
+        self.user_id = None
+        self.name = "Unknown"
+        self.hits = 0 # Consecutive encodings that agreed on user_id
+
+    @property
+    def confirmed(self):
+        return self.user_id is not None and self.hits >= self.confirm_matches
+
+    def observe(self, user_id, name, now):
+        """Records the identity an encoding of this face matched (user_id None = unknown)."""
+        if user_id is not None and user_id == self.user_id:
+            self.hits += 1
+        else:
+            self.hits = 1 if user_id is not None else 0
+        self.user_id = user_id
+        self.name = name
+        self.last_encoded = now
+
+
+class FaceTracker:
+    """
+    Follows faces across processed frames by box overlap (IoU, with a centroid
+    fallback for fast moves), so a person standing at the kiosk keeps one track.
+
+    A confirmed track reuses its identity: its box is handed to the workers as
+    "stable" and they skip the encoding for faces that land on it, until the
+    track is due for re-verification (REVERIFY_SECONDS). Attendance waits for
+    CONFIRM_MATCHES consistent matches on the same track.
+    """
+
+    def __init__(self, iou_threshold=TRACK_IOU_THRESHOLD, max_age=TRACK_MAX_AGE_SECONDS,
+                 reverify_seconds=REVERIFY_SECONDS, confirm_matches=CONFIRM_MATCHES):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.reverify_seconds = reverify_seconds
+        self.confirm_matches = max(1, confirm_matches)
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def stable_boxes(self, now=None):
+        """Boxes of confirmed tracks that don't need a fresh encoding yet."""
+        now = time.time() if now is None else now
+        return [t.box for t in self.tracks
+                if t.confirmed and now - t.last_encoded < self.reverify_seconds]
+
+    def update(self, face_locations, now=None):
+        """Assigns a track to every face (creating new ones) and returns them in order."""
+        now = time.time() if now is None else now
+        self.tracks = [t for t in self.tracks if now - t.last_seen <= self.max_age]
+
+        # Greedy matching: best overlapping pairs first, then nearest centres
+        pairs = []
+        for i, loc in enumerate(face_locations):
+            for j, track in enumerate(self.tracks):
+                overlap = iou(loc, track.box)
+                if overlap >= self.iou_threshold:
+                    pairs.append((1 + overlap, i, j))
+                elif centroid_distance(track.box, loc) < 0.5:
+                    pairs.append((0.5 - centroid_distance(track.box, loc), i, j))
+        pairs.sort(reverse=True)
+
+        assigned = [None] * len(face_locations)
+        used = set()
+        for _, i, j in pairs:
+            if assigned[i] is None and j not in used:
+                assigned[i] = self.tracks[j]
+                used.add(j)
+
+        for i, loc in enumerate(face_locations):
+            if assigned[i] is None:
+                assigned[i] = Track(next(self._ids), loc, now, self.confirm_matches)
+                self.tracks.append(assigned[i])
+            assigned[i].box = loc
+            assigned[i].last_seen = now
+        return assigned
+
+
+def make_tracker(face_tracking=FACE_TRACKING):
+    # Disabled = every face encoded on every processed frame, logged on the first match
+    return FaceTracker() if face_tracking else FaceTracker(reverify_seconds=0, confirm_matches=1)
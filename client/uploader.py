@@ -0,0 +1,163 @@
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+
+import client_utils
+import evidence
+
+# --- Uploader Settings (override via env) ---
+SPOOL_PATH = os.environ.get("ATTENDANCE_SPOOL", "attendance_spool.db")
+UPLOAD_BATCH_SIZE = int(os.environ.get("UPLOAD_BATCH_SIZE", "20"))
+UPLOAD_IDLE_SECONDS = 1.0
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+# Statuses that will never succeed on retry (e.g. user deleted). Auth errors
+# are retried: a misconfigured kiosk must not throw attendance away.
+PERMANENT_FAILURES = {400, 404, 422}
+# Batch responses that mean "send these one at a time instead"
+BATCH_FALLBACK = {404, 405, 422}
+
+
+class AttendanceUploader:
+    """
+    Background attendance uploader with a persistent SQLite spool.
+
+    `enqueue()` only encodes the evidence JPEG and writes a row locally, so
+    recognition never waits on the network. A worker thread drains the spool
+    in batches through /attendance/batch, backs off exponentially while the
+    backend is unreachable, and resumes from disk after a restart; nothing is
+    lost during an outage.
+    """
+
+    def __init__(self, spool_path=SPOOL_PATH, batch_size=UPLOAD_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._conn = sqlite3.connect(spool_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " user_id INTEGER NOT NULL,"
+            " captured_at REAL NOT NULL,"
+            " image BLOB)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._backoff = 0.0
+
+    # --- Producer side ---
+    def enqueue(self, user_id, frame=None, face_location=None):
+        """`face_location` (top, right, bottom, left) in frame pixels crops the evidence to that face."""
+        image = None
+        if frame is not None:
+            image = evidence.encode_evidence(frame, face_location)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO pending (user_id, captured_at, image) VALUES (?, ?, ?)",
+                (int(user_id), time.time(), image)
+            )
+            self._conn.commit()
+        self._wake.set()
+
+    def pending_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    # --- Lifecycle ---
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, drain_timeout=5.0):
+        """Stops the worker after one last drain attempt; leftovers stay spooled."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=drain_timeout)
+            if self._thread.is_alive():
+                return # Still mid-upload; the daemon thread dies with the process
+        with self._lock:
+            self._conn.close()
+
+    # --- Worker side ---
+    def _next_batch(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, user_id, captured_at, image FROM pending ORDER BY id LIMIT ?",
+                (self.batch_size,)
+            ).fetchall()
+
+    def _delete(self, row_ids):
+        if not row_ids:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM pending WHERE id = ?", [(i,) for i in row_ids])
+            self._conn.commit()
+
+    def _send_batch(self, rows):
+        """
+        Uploads rows with one /attendance/batch request. Returns (row ids done, error)
+        where error is set if the backend could not be reached and the rest should wait.
+        """
+        try:
+            result = client_utils.post_attendance_batch([(user_id, captured_at, image) for _, user_id, captured_at, image in rows])
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code in BATCH_FALLBACK:
+                # Older backend without the batch endpoint (or it refused the payload)
+                return self._send_one_by_one(rows)
+            return [], e
+        except requests.RequestException as e:
+            return [], e
+
+        for rejected in result.get("rejected", []):
+            print(f"[WARN] Dropping attendance for User ID {rejected.get('user_id')}: {rejected.get('detail')}")
+        if result.get("duplicates"):
+            print(f"[INFO] {len(result['duplicates'])} attendance record(s) were already logged")
+        print(f"[SUCCESS] Logged {len(result.get('created', []))} attendance record(s)")
+        return [row[0] for row in rows], None
+
+    def _send_one_by_one(self, rows):
+        done = []
+        for row_id, user_id, captured_at, image in rows:
+            try:
+                client_utils.post_attendance(user_id, image, captured_at=captured_at)
+            except requests.HTTPError as e:
+                if e.response is not None and e.response.status_code in PERMANENT_FAILURES:
+                    # Rejected for good (e.g. user deleted): retrying will not help
+                    print(f"[WARN] Dropping attendance for User ID {user_id}: {e}")
+                    done.append(row_id)
+                    continue
+                return done, e
+            except requests.RequestException as e:
+                return done, e
+            print(f"[SUCCESS] Logged attendance for User ID: {user_id}")
+            done.append(row_id)
+        return done, None
+
+    def _run(self):
+        while True:
+            rows = self._next_batch()
+            if not rows:
+                if self._stop.is_set():
+                    return
+                self._wake.wait(UPLOAD_IDLE_SECONDS)
+                self._wake.clear()
+                continue
+
+            done, error = self._send_batch(rows)
+            self._delete(done)
+
+            if error is None:
+                self._backoff = 0.0
+                continue
+            if self._stop.is_set():
+                return
+
+            self._backoff = min(max(self._backoff * 2, BACKOFF_BASE_SECONDS), BACKOFF_MAX_SECONDS)
+            print(f"[WARN] Attendance upload failed ({error}); {self.pending_count()} spooled, retrying in {self._backoff:.0f}s")
+            # Sleep through the backoff; new enqueues don't cut it short
+            self._stop.wait(self._backoff)
@@ -1,6 +1,5 @@
 import requests
 import base64
-import pickle
 import numpy as np
 
 BASE_URL = "http://127.0.0.1:8000"
@@ -32,7 +31,7 @@ def check_data():
                         continue
                         
                     data = base64.b64decode(b64)
-                    np_arr = pickle.loads(data)
+                    np_arr = np.frombuffer(data, dtype="<f4")
                     print(f"  - Encoding {i}: Valid Shape {np_arr.shape}")
                     total_encodings += 1
                 except Exception as e:
@@ -35,27 +35,36 @@ export function AdminDashboard() {
     const [registering, setRegistering] = useState(false);
 
     useEffect(() => {
-        checkAuth();
-
-        // Real-time subscription could go here
-        const subscription = supabase
-            .channel('public:attendance')
-            .on('postgres_changes', { event: 'INSERT', schema: 'public', table: 'attendance' }, (payload) => {
-                console.log('New Log!', payload);
-                fetchData(); // Refresh on new attendance
-            })
-            .subscribe();
-
-        return () => { supabase.removeChannel(subscription); };
+        let events: EventSource | null = null;
+        let closed = false;
+
+        checkAuth().then((token) => {
+            if (!token || closed) return;
+            // Live deltas from the backend instead of re-fetching both tables per event
+            events = new EventSource(`http://127.0.0.1:8000/events/attendance?access_token=${token}`);
+            events.addEventListener('attendance.created', (e) => {
+                const { logs: created } = JSON.parse((e as MessageEvent).data) as { logs: Log[] };
+                setLogs(prev => [...created.slice().reverse(), ...prev].slice(0, 50));
+            });
+            events.addEventListener('attendance.evidence', (e) => {
+                const { logs: updated } = JSON.parse((e as MessageEvent).data) as { logs: Log[] };
+                const byId = new Map(updated.map(u => [u.id, u]));
+                setLogs(prev => prev.map(log => byId.has(log.id) ? { ...log, screenshot_path: byId.get(log.id)!.screenshot_path } : log));
+            });
+            events.addEventListener('resync', () => fetchData()); // Missed events while we were behind
+        });
+
+        return () => { closed = true; events?.close(); };
     }, []);
 
     async function checkAuth() {
         const { data: { session } } = await supabase.auth.getSession();
         if (!session) {
             navigate('/login');
-            return;
+            return null;
         }
         fetchData();
+        return session.access_token;
     }
 
     async function fetchData() {
@@ -22,25 +22,38 @@ export function SupportDashboard() {
     const [loading, setLoading] = useState(false);
 
     useEffect(() => {
-        checkAuth();
+        let events: EventSource | null = null;
+        let closed = false;
+
+        checkAuth().then((token) => {
+            if (!token || closed) return;
+            // Live counters pushed by the backend instead of count: 'exact' queries
+            events = new EventSource(`http://127.0.0.1:8000/events/attendance?access_token=${token}`);
+            const applyCounters = (e: Event) => {
+                const data = JSON.parse((e as MessageEvent).data);
+                const counters = data.counters ?? data;
+                setStats({ users: counters.users, logs: counters.logs });
+            };
+            events.addEventListener('counters', applyCounters);
+            events.addEventListener('attendance.created', applyCounters);
+        });
+
+        return () => { closed = true; events?.close(); };
     }, []);
 
     async function checkAuth() {
         const { data: { session } } = await supabase.auth.getSession();
         if (!session) {
             navigate('/login');
-            return;
+            return null;
         }
         fetchData();
+        return session.access_token;
     }
 
     async function fetchData() {
         setLoading(true);
-        // Fetch Stats
-        const { count: userCount } = await supabase.from('users').select('*', { count: 'exact', head: true });
-        const { count: logCount } = await supabase.from('attendance').select('*', { count: 'exact', head: true });
-
-        setStats({ users: userCount || 0, logs: logCount || 0 });
+        // Stats arrive as live counters on the event stream
 
         // Fetch Recent Logs with User Data
         const { data, error } = await supabase
@@ -1,9 +1,8 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 import os
-import pickle
 import numpy as np
-from backend.app import models, schemas, crud
+from backend.app import models, schemas, crud, encoding_format
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -28,7 +27,7 @@ def seed_faculty():
         print("Creating Faculty user...")
         # Create dummy encoding (128-d vector)
         dummy_encoding = np.random.rand(128)
-        encoding_bytes = pickle.dumps(dummy_encoding)
+        encoding_bytes = encoding_format.encode(dummy_encoding)
 
         user_data = schemas.UserCreate(
             name="Dr. Severus Snape",